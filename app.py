@@ -1,16 +1,24 @@
-import streamlit as st
-import pandas as pd
 import os
-import PyPDF2
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.lib.colors import HexColor
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from io import BytesIO
-from zipfile import ZipFile
-from datetime import datetime
-from tempfile import NamedTemporaryFile
+
+import streamlit as st
+
+from certificados.render import AVISO_FUENTE
+from certificados.motor import MODOS_SALIDA, cargar_plantillas, nombre_zip_descarga
+from certificados.ingesta import procesar_planilla, FORMATOS_ADMITIDOS
+from certificados.clasificacion import clasificar_estudiantes_por_nota
+from certificados.paralelo import BACKENDS
+from certificados.variantes import VARIANTES, VARIANTE_POR_DEFECTO
+from certificados.empaquetado import (
+    COMPRESION, VOLUMEN_MB, VOLUMEN_POR_CARPETA, limpiar_archivos_vencidos, opciones_empaque, rutas_volumenes,
+    zip_disponible
+)
+from certificados.vista_previa import generar_vista_previa
+from certificados.trabajos import enviar_trabajo, estado_trabajo, cancelar_trabajo, reanudar_trabajo
+from certificados.reanudacion import ruta_fallidos
+from certificados.eventos import describir_avance, describir_fallas
+from certificados.perfil import MODOS_PERFIL
+from certificados.sesion import liberar_artefactos, registrar_artefactos
+from certificados import metricas
 
 if 'df_procesado' not in st.session_state:
     st.session_state.df_procesado = None
@@ -20,610 +28,162 @@ if 'plantillas' not in st.session_state:
     st.session_state.plantillas = None
 if 'certificados_generados' not in st.session_state:
     st.session_state.certificados_generados = False
-if 'zip_buffer' not in st.session_state:
-    st.session_state.zip_buffer = None
-
-# Registrar fuente personalizada
-def register_custom_font():
-    """Registra la fuente Trebuchet MS si está disponible"""
-    font_path = os.path.join("fonts", "trebuchet.ttf")
-    if os.path.exists(font_path):
-        try:
-            pdfmetrics.registerFont(TTFont('Trebuchet', font_path))
-            return True
-        except Exception as e:
-            st.warning(f"No se pudo cargar la fuente Trebuchet MS: {e}")
-            return False
-    else:
-        st.info("Fuente Trebuchet MS no encontrada. Usando fuente por defecto.")
-        return False
-
-TREBUCHET_AVAILABLE = register_custom_font()
-styles_config = None
-
-# Diccionario de meses
-def mes_en_espanol(fecha):
-    meses = {
-        'January': 'enero',
-        'February': 'febrero',
-        'March': 'marzo',
-        'April': 'abril',
-        'May': 'mayo',
-        'June': 'junio',
-        'July': 'julio',
-        'August': 'agosto',
-        'September': 'septiembre',
-        'October': 'octubre',
-        'November': 'noviembre',
-        'December': 'diciembre'
-    }
-
-    mes_ingles = fecha.strftime('%B')
-    mes_espanol = meses.get(mes_ingles, mes_ingles)
-    return fecha.strftime(f"%d de {mes_espanol} del %Y")
-
-# Función para agregar marca de agua (PDF)
-def agregar_marca_agua(pdf_bytes, watermark_path):
-    try:
-        pdf_reader = PyPDF2.PdfReader(pdf_bytes)
-        watermark_reader = PyPDF2.PdfReader(watermark_path)
-        
-        watermark_page = watermark_reader.pages[0]
-        
-        pdf_writer = PyPDF2.PdfWriter()
-        
-        for page_num in range(len(pdf_reader.pages)):
-            page = pdf_reader.pages[page_num]
-            
-            # Determinar orientación de la página
-            page_width = float(page.mediabox.width)
-            page_height = float(page.mediabox.height)
-            is_landscape = page_width > page_height
-            
-            # Crear una copia de la marca de agua para no modificar la original
-            if is_landscape:
-                landscape_watermark_path = os.path.join("watermarks", "marca_agua_landscape.pdf")
-                if os.path.exists(landscape_watermark_path):
-                    landscape_watermark_reader = PyPDF2.PdfReader(landscape_watermark_path)
-                    watermark = landscape_watermark_reader.pages[0]
+if 'ruta_zip' not in st.session_state:
+    st.session_state.ruta_zip = None
+if 'resumen_metricas' not in st.session_state:
+    st.session_state.resumen_metricas = None
+if 'vista_previa' not in st.session_state:
+    st.session_state.vista_previa = None
+if 'trabajo_id' not in st.session_state:
+    # Si la página se recargó, retomar el trabajo que quedó en la URL
+    st.session_state.trabajo_id = st.query_params.get('trabajo')
+if 'aviso_trabajo' not in st.session_state:
+    st.session_state.aviso_trabajo = None
+if 'trabajo_terminado' not in st.session_state:
+    # Último trabajo terminado, para reintentar las filas que fallaron
+    st.session_state.trabajo_terminado = None
+if 'descargados' not in st.session_state:
+    # Archivos del último ZIP que ya se descargaron; mientras no se pidan de nuevo no se cargan en memoria
+    st.session_state.descargados = set()
+
+# Borrar los ZIP de corridas anteriores que ya vencieron
+limpiar_archivos_vencidos()
+
+# Muestra en la página los mensajes del motor de generación
+def avisar_streamlit(nivel, mensaje):
+    getattr(st, nivel)(mensaje)
+
+# Avisar si la fuente Trebuchet MS no se pudo registrar
+if AVISO_FUENTE:
+    avisar_streamlit(*AVISO_FUENTE)
+
+# Tabla con el tiempo de cada etapa de la última corrida
+def mostrar_metricas(resumen):
+    with st.expander("⏱️ Tiempos de la generación"):
+        st.dataframe([{'etapa': etapa, **datos} for etapa, datos in resumen['etapas'].items()])
+        st.write(f"**Caché:** {resumen['cache']['aciertos']} reutilizados, {resumen['cache']['fallos']} generados")
+        if resumen.get('bytes_por_certificado'):
+            st.write(f"**Tamaño por certificado:** {resumen['bytes_por_certificado'] / 1024:.0f} KB")
+        certificado = resumen['certificado_segundos']
+        if certificado['p50'] is not None:
+            st.write(f"**Por certificado:** p50 {certificado['p50'] * 1000:.1f} ms, "
+                     f"p95 {certificado['p95'] * 1000:.1f} ms, máx {certificado['max'] * 1000:.1f} ms")
+
+# Miniaturas de la muestra de cada grupo, dos por fila
+def mostrar_vista_previa(miniaturas):
+    with st.expander("🔍 Vista previa de una muestra por grupo", expanded=not st.session_state.certificados_generados):
+        columnas = st.columns(2)
+        for i, miniatura in enumerate(miniaturas):
+            titulo = f"{miniatura['grupo']} ({miniatura['plantilla_key']})"
+            with columnas[i % 2]:
+                if 'error' in miniatura:
+                    st.error(f"{titulo}: {miniatura['nombre']} - {miniatura['error']}")
                 else:
-                    watermark = watermark_page
-            else:
-                watermark = watermark_page
-            
-            page.merge_page(watermark)
-            pdf_writer.add_page(page)
-        
-        result_pdf = BytesIO()
-        pdf_writer.write(result_pdf)
-        result_pdf.seek(0)
-        
-        return result_pdf
-    except Exception as e:
-        st.error(f"Error al aplicar marca de agua: {e}")
-        return pdf_bytes
-
-# Función para cargar plantillas
-def cargar_plantillas():
-    """Carga las plantillas de fondo desde la carpeta plantillas"""
-    plantillas = {}
-    plantillas_path = "plantillas"
-
-    if not os.path.exists(plantillas_path):
-        st.error(f"❌ La carpeta '{plantillas_path}' no existe. Créala y agrega las imágenes de fondo.")
-        return None
-
-    archivos_plantilla = {
-        'PROGRESIVO_1P_5S.jpg': 'fondo_1',
-        'PARTICIPACION_1P_5S.jpg': 'fondo_2',
-        'APROBADO_1P_3P.jpg': 'fondo_3',
-        'APROBADO_4P_5S.jpg': 'fondo_4'
-    }
-
-    for archivo, clave in archivos_plantilla.items():
-        ruta_completa = os.path.join(plantillas_path, archivo)
-        if os.path.exists(ruta_completa):
-            with open(ruta_completa, 'rb') as f:
-                plantillas[clave] = f.read()
-        else:
-            st.warning(f"⚠️ No se encontró {archivo} en la carpeta plantillas")
-
-    if len(plantillas) == 4:
-        return plantillas
-    else:
-        st.error(f"❌ Se necesitan 4 plantillas, solo se encontraron {len(plantillas)}")
-        return None
-
-# Función para clasificar estudiantes por criterios
-def clasificar_estudiantes_por_nota(df, nombre_archivo):
-    grupos = {
-        'grupo_1': pd.DataFrame(),  # Progresivo
-        'grupo_2': pd.DataFrame(),  # Nota < 13 / Participación
-        'grupo_3': pd.DataFrame(),  # Nota ≥ 13 y Grado = v1
-        'grupo_4': pd.DataFrame()   # Nota ≥ 13 y Grado = v2
-    }
-
-    if 'nota final' not in df.columns:
-        st.error("❌ No se encontró la columna 'NOTA FINAL' en el DataFrame")
-        return None
-
-    if 'grado' not in df.columns:
-        st.error("❌ No se encontró la columna 'GRADO' en el DataFrame")
-        return None
-
-    # Verificar si el archivo empieza con "P"
-    archivo_empieza_con_p = nombre_archivo.upper().startswith('P')
-
-    if archivo_empieza_con_p:
-        # Si el archivo empieza con "P", todos los estudiantes van al grupo 1 (Progresivo)
-        grupos['grupo_1'] = df.copy()
-        st.info(f"📋 **Archivo detectado con prefijo 'P'**: Todos los certificados usarán el formato Progresivo")
-
-    else:
-        df['nota_final_num'] = pd.to_numeric(df['nota final'], errors='coerce')
-
-        # Grupo 2: Nota < 13 - Participación
-        grupos['grupo_2'] = df[df['nota_final_num'] < 13].copy()
-
-        # Grupos 3 y 4: Nota ≥ 13
-        df_nota_alta = df[df['nota_final_num'] >= 13].copy()
-
-        grupos['grupo_3'] = df_nota_alta[df_nota_alta['grado'].str.lower().str.strip().isin(['1p', '2p', '3p'])].copy()
-        grupos['grupo_4'] = df_nota_alta[
-            df_nota_alta['grado'].str.lower().str.strip().isin(['4p', '5p', '1s', '2s', '3s', '4s', '5s'])].copy()
-
-    return grupos
-
-# Función para procesar el archivo Excel Base
-def procesar_excel_inicial(uploaded_file):
-    """
-    Procesa el archivo Excel eliminando las primeras 9 filas y columnas J-N y desde la T
-    """
-    try:
-        # Lista de columnas
-        columnas_requeridas = [
-            'nro', 'paterno', 'materno', 'nombre', 'grado', 'sección', 'curso', 
-            'nota lab', 'lista de asistencia', 'nota de examen cibertec', 'nota final', 
-            'observación sobre nota desaprobatoria', 'status', 'numeración', 'horas_progresivo'
-        ]
-        
-        df_original = pd.read_excel(uploaded_file)
-
-        # Eliminar las primeras 11 filas (índices 0-10, quedando la fila 12 como cabecera)
-        df_procesado = df_original.iloc[10:].copy()
-
-        # Resetear el índice para que la nueva primera fila sea el índice 0
-        df_procesado = df_procesado.reset_index(drop=True)
-
-        # Usar la primera fila como cabecera (Antigua fila 12)
-        df_procesado.columns = df_procesado.iloc[0].str.lower()
-        df_procesado = df_procesado.drop(df_procesado.index[0]).reset_index(drop=True)
-        
-        # Filtrar solo las columnas requeridas que existen en el dataframe
-        columnas_existentes = [col for col in columnas_requeridas if col in df_procesado.columns]
-        df_procesado = df_procesado[columnas_existentes]
-
-        # Reemplazar 'NP' por 0 en la columna 'nota final'
-        if 'nota final' in df_procesado.columns:
-            df_procesado['nota final'] = df_procesado['nota final'].apply(
-                lambda x: 0 if isinstance(x, str) and x.strip().upper() == 'NP' else x
-            )
-
-        # Crear columna nombre_certificado
-        df_procesado['nombre_certificado'] = df_procesado['nombre'].fillna('').str.strip() + ' ' + df_procesado[
-            'paterno'].fillna('').str.strip() + ' ' + df_procesado['materno'].fillna('').str.strip()
-
-        # Reordenar columnas para poner nombre_certificado después de nro
-        if 'nro' in df_procesado.columns:
-            columnas = df_procesado.columns.tolist()
-            columnas.remove('nombre_certificado')
-            posicion_nro = columnas.index('nro')
-            columnas.insert(posicion_nro + 1, 'nombre_certificado')
-            df_procesado = df_procesado[columnas]
-
-        return df_procesado, True, "Archivo procesado correctamente"
-
-    except Exception as e:
-        return None, False, f"Error al procesar el archivo: {str(e)}"
-
-# Acomodar el texto en múltiples líneas para que se ajuste al ancho máximo
-def wrap_text_to_width(canvas, text, font_name, font_size, max_width_mm):
-    max_width_points = max_width_mm * 2.83465
-    words = text.split()
-    lines = []
-    current_line = []
-
-    for word in words:
-        test_line = current_line + [word]
-        test_text = ' '.join(test_line)
-        text_width = canvas.stringWidth(test_text, font_name, font_size)
-
-        if text_width <= max_width_points:
-            current_line = test_line
-        else:
-            if current_line:
-                lines.append(' '.join(current_line))
-                current_line = [word]
-            else:
-                lines.append(word)
-
-    if current_line:
-        lines.append(' '.join(current_line))
-
-    return lines
-
-# Dibuja texto multilínea usando la configuración de estilos específica
-def draw_multiline_text(canvas, text, style_key, page_width, styles_config, max_width_mm=None):
-    style = styles_config[style_key]
-    font_name = style['font_family'] if TREBUCHET_AVAILABLE else 'Helvetica'
-
-    is_bold = style.get('bold', False)
-
-    if is_bold:
-        try:
-            bold_font_name = f"{font_name}-Bold"
-            canvas.setFont(bold_font_name, style['font_size'])
-            font_name = bold_font_name
-        except Exception as e:
-            try:
-                canvas.setFont(font_name, style['font_size'])
-            except Exception as e:
-                canvas.setFont('Helvetica-Bold' if is_bold else 'Helvetica', style['font_size'])
-                font_name = 'Helvetica-Bold' if is_bold else 'Helvetica'
-    else:
-        try:
-            canvas.setFont(font_name, style['font_size'])
-        except Exception as e:
-            canvas.setFont('Helvetica', style['font_size'])
-            font_name = 'Helvetica'
-
-    canvas.setFillColor(HexColor(style['color']))
-    x_points = style['x'] * 2.83465
-    y_points = style['y'] * 2.83465
-
-    if max_width_mm is None:
-        if style['x'] == 148 or style['x'] == 105:
-            text_width = canvas.stringWidth(text, font_name, style['font_size'])
-            x_points = (page_width - text_width) / 2
-        canvas.drawString(x_points, y_points, text)
-        return style['font_size']
-
-    lines = wrap_text_to_width(canvas, text, font_name, style['font_size'], max_width_mm)
-    line_height = style['font_size'] * 1.2
-    start_y = y_points
-
-    for i, line in enumerate(lines):
-        line_y = start_y - (i * line_height)
-        if style['x'] == 148 or style['x'] == 105:
-            text_width = canvas.stringWidth(line, font_name, style['font_size'])
-            line_x = (page_width - text_width) / 2
-        else:
-            line_x = x_points
-        canvas.drawString(line_x, line_y, line)
-
-    return line_height * len(lines)
-
-# Genera certificados para un grupo específico con su plantilla y estilos correspondientes
-def generar_certificados_grupo(grupo_df, plantilla_bytes, plantilla_key, nombre_grupo, zip_file, progress_bar,
-    estudiantes_base, total_estudiantes, styles_config_by_template):
-    certificados_generados = 0
-
-    # Aplicar marca de agua si la segunda letra es 'I' y si esta aprobado
-    nombre_archivo = st.session_state.get('nombre_archivo', '')
-    aplicar_marca_agua = len(nombre_archivo) >= 2 and nombre_archivo[1].upper() == 'I' and plantilla_key != 'fondo_2'
-    
-    # Ruta a la marca de agua
-    watermark_path = os.path.join("watermarks", "marca_agua.pdf")
-    if aplicar_marca_agua and not os.path.exists(watermark_path):
-        st.warning(f"⚠️ No se encontró el archivo de marca de agua en {watermark_path}. Se generarán PDFs sin marca de agua.")
-        aplicar_marca_agua = False
-
-    # Obtener la configuración de estilos para esta plantilla
-    styles_config = styles_config_by_template[plantilla_key]
-
-    # Determinar orientación de página según la plantilla
-    if styles_config.get('orientation') == 'portrait':
-        page_size = A4
-        page_width, page_height = A4
-    else:
-        page_size = landscape(A4)
-        page_width, page_height = landscape(A4)
-
-    for i, row in grupo_df.iterrows():
-        try:
-            nombre = str(row["nombre_certificado"]).strip().upper()
-            curso = str(row["curso"]).strip().upper()
-            fecha = mes_en_espanol(datetime.today())
-            numero = (
-                str(row["numeración"]).strip()
-                if "numeración" in row and pd.notnull(row["numeración"])
-                else f"GEN-{i + 1:03}"
-            )
-
-            # Extraer valores para la variable de horas, sólo si es para "Progresivos" (fondo_1)
-            horas = "horas_progresivo"
-            horas_progresivo = ""
-            if plantilla_key == 'fondo_1' and horas in row and pd.notnull(row[horas]):
-                horas_progresivo = str(row[horas])
-
-            # Crear archivo temporal con la plantilla
-            with NamedTemporaryFile(delete=False, suffix=".png") as tmp_img:
-                tmp_img.write(plantilla_bytes)
-                tmp_img.flush()
-                tmp_img_path = tmp_img.name
-
-            # Crear PDF con orientación específica
-            pdf_buffer = BytesIO()
-            c = canvas.Canvas(pdf_buffer, pagesize=page_size)
-
-            # Insertar imagen de fondo
-            c.drawImage(tmp_img_path, 0, 0, width=page_width, height=page_height)
-
-            # Dibujar texto usando los estilos específicos de la plantilla
-            draw_multiline_text(c, nombre, 'nombre', page_width, styles_config, styles_config['nombre']['max_width'])
-            draw_multiline_text(c, curso, 'curso', page_width, styles_config, styles_config['curso']['max_width'])
-            draw_multiline_text(c, f"Lima, {fecha}", 'fecha', page_width, styles_config)
-
-            # Se considera la variable horas si es para el fondo_1
-            if plantilla_key == 'fondo_1' and horas_progresivo:
-                draw_multiline_text(c, horas_progresivo, 'horas', page_width, styles_config)
-            
-            if plantilla_key != 'fondo_2':
-                draw_multiline_text(c, f"Certificado Nº {numero}", 'numero', page_width, styles_config)
-
-            c.save()
-            pdf_bytes = pdf_buffer.getvalue()
-
-            # Aplicar marca de agua si es necesario
-            if aplicar_marca_agua:
-                pdf_buffer = agregar_marca_agua(BytesIO(pdf_bytes), watermark_path)
-                pdf_bytes = pdf_buffer.getvalue()
-
-            # Añadir al ZIP
-            if plantilla_key == 'fondo_2':
-                pdf_name = f"Constancias/{nombre.strip().replace(' ', '_') + '_' + curso[0:11].replace(' ', '_')}.pdf"
-            else:
-                pdf_name = f"{nombre.strip().replace(' ', '_') + '_' + curso[0:11].replace(' ', '_')}.pdf"
-
-            zip_file.writestr(pdf_name, pdf_bytes)
-
-            certificados_generados += 1
-
-            # Actualizar progreso
-            progreso_actual = (estudiantes_base + certificados_generados) / total_estudiantes
-            progress_bar.progress(min(progreso_actual, 1.0))
-
-            # Limpiar archivo temporal
-            try:
-                if os.path.exists(tmp_img_path):
-                    os.unlink(tmp_img_path)
-            except:
-                pass
-
-        except Exception as e:
-            st.error(f"Error generando certificado para {nombre}: {e}")
-
-    return certificados_generados
+                    st.image(miniatura['png'], caption=titulo)
+
+# Identificador del usuario para el límite de trabajos: el del proxy si lo envía, si no su IP
+def usuario_actual():
+    return st.context.headers.get('X-Forwarded-User') or st.context.ip_address or 'local'
+
+# Perfil pedido para esta sesión con ?perfil=muestreo (o determinista) en la URL; sin él no se perfila
+def perfil_pedido():
+    perfil = st.query_params.get('perfil')
+    return perfil if perfil in MODOS_PERFIL else ''
+
+# El ZIP (o volumen) se lee en memoria para el botón sólo hasta que se descarga; después queda un botón que lo
+# vuelve a ofrecer, así una sesión abierta no guarda el ZIP entero mientras nadie lo necesita
+def marcar_descargado(ruta):
+    st.session_state.descargados.add(ruta)
+
+def volver_a_ofrecer(ruta):
+    st.session_state.descargados.discard(ruta)
+
+def boton_descarga_zip(ruta, etiqueta, nombre_descarga):
+    if ruta in st.session_state.descargados:
+        st.button(f"🔄 Descargar de nuevo {nombre_descarga}", key=f"de_nuevo_{ruta}", on_click=volver_a_ofrecer,
+                  args=(ruta,))
+        return
+    with open(ruta, 'rb') as zip_file:
+        st.download_button(label=etiqueta, data=zip_file, file_name=nombre_descarga, mime="application/zip",
+                           key=f"zip_{ruta}", on_click=marcar_descargado, args=(ruta,))
 
 # Función para generar todos los certificados
-def generar_todos_certificados():
+def generar_todos_certificados(corrida=None):
+    """Envía la generación como un trabajo en segundo plano; la página sólo consulta su avance"""
     if st.session_state.grupos and st.session_state.plantillas:
-        st.info("Generando certificados por grupos...")
-
-        total_estudiantes = sum(len(grupo) for grupo in st.session_state.grupos.values() if not grupo.empty)
-        progress_bar = st.progress(0)
-        estudiantes_procesados = 0
-
-        zip_buffer = BytesIO()
-
-        with ZipFile(zip_buffer, "a") as zip_file:
-            # Crear directorio para constancias
-            zip_file.writestr("Constancias/", "")
-
-            # Configuración de estilos
-            styles_config_by_template = {
-            "fondo_1": {
-                'curso': {
-                    'font_family': 'Trebuchet',
-                    'font_size': 32,
-                    'color': '#000000', #11959f
-                    'x': 52,
-                    'y': 129,
-                    'max_width': 220,
-                    'bold': True
-                },
-                'nombre': {
-                    'font_family': 'Trebuchet',
-                    'font_size': 25,
-                    'color': '#000000', #004064
-                    'x': 52,
-                    'y': 85,
-                    'max_width': 210
-                },
-                'fecha': {
-                    'font_family': 'Trebuchet',
-                    'font_size': 18,
-                    'color': '#004064',
-                    'x': 52,
-                    'y': 36,
-                    'max_width': None,
-                    'bold': True
-                },
-                'numero': {
-                    'font_family': 'Trebuchet',
-                    'font_size': 15.5,
-                    'color': '#004064',
-                    'x': 52,
-                    'y': 27,
-                    'max_width': None
-                },
-                'horas': {
-                    'font_family': 'Trebuchet',
-                    'font_size': 15.5,
-                    'color': '#004064',
-                    'x': 132.5,
-                    'y': 65.2,
-                    'max_width': None
-                },
-                'orientation': 'landscape'  # Orientación horizontal
-            },
-            "fondo_2": {  # Vertical
-                'curso': {
-                    'font_family': 'Trebuchet',
-                    'font_size': 30.5,
-                    'color': '#000000',
-                    'x': 105,
-                    'y': 185,
-                    'max_width': 160,
-                    'bold': True
-                },
-                'nombre': {
-                    'font_family': 'Trebuchet',
-                    'font_size': 29,
-                    'color': '#000000',
-                    'x': 105,
-                    'y': 133,
-                    'max_width': 160,
-                    'bold': True
-                },
-                'fecha': {
-                    'font_family': 'Trebuchet',
-                    'font_size': 18,
-                    'color': '#004064',
-                    'x': 105,
-                    'y': 78,
-                    'max_width': None
-                },
-                # No aparece en el certificado, sólo está para evitar errores en f()
-                'numero': {
-                    'font_family': 'Trebuchet',
-                    'font_size': 1,
-                    'color': '#ffffff',
-                    'x': 0,
-                    'y': 0,
-                    'max_width': None
-                },
-                'orientation': 'portrait'  # Orientación vertical
-            },
-            "fondo_3": {
-                'curso': {
-                    'font_family': 'Trebuchet',
-                    'font_size': 30.5,
-                    'color': '#000000',
-                    'x': 148,
-                    'y': 117,
-                    'max_width': 245,
-                    'bold': True
-                },
-                'nombre': {
-                    'font_family': 'Trebuchet',
-                    'font_size': 29,
-                    'color': '#000000',
-                    'x': 148,
-                    'y': 75,
-                    'max_width': 245,
-                    'bold': True
-                },
-                'fecha': {
-                    'font_family': 'Trebuchet',
-                    'font_size': 18,
-                    'color': '#004064',
-                    'x': 20,
-                    'y': 41,
-                    'max_width': None,
-                    'bold': True
-                },
-                'numero': {
-                    'font_family': 'Trebuchet',
-                    'font_size': 15.5,
-                    'color': '#004064',
-                    'x': 20,
-                    'y': 32,
-                    'max_width': None
-                },
-                'orientation': 'landscape'
-            },
-            "fondo_4": {
-                'curso': {
-                    'font_family': 'Trebuchet',
-                    'font_size': 30.5,
-                    'color': '#000000',
-                    'x': 148,
-                    'y': 117,
-                    'max_width': 245,
-                    'bold': True
-                },
-                'nombre': {
-                    'font_family': 'Trebuchet',
-                    'font_size': 29,
-                    'color': '#000000',
-                    'x': 148,
-                    'y': 75,
-                    'max_width': 245,
-                    'bold': True
-                },
-                'fecha': {
-                    'font_family': 'Trebuchet',
-                    'font_size': 18,
-                    'color': '#004064',
-                    'x': 20,
-                    'y': 41,
-                    'max_width': None,
-                    'bold': True
-                },
-                'numero': {
-                    'font_family': 'Trebuchet',
-                    'font_size': 15.5,
-                    'color': '#004064',
-                    'x': 20,
-                    'y': 32,
-                    'max_width': None
-                },
-                'orientation': 'landscape'
-            }
-        }
-
-            # Mapeo de grupos a plantillas
-            mapeo_plantillas = {
-                'grupo_1': 'fondo_1',  # Progresiva
-                'grupo_2': 'fondo_2',  # Participación Nota < 13
-                'grupo_3': 'fondo_3',  # Base - Nota ≥ 13 y Grado = 1P-3P
-                'grupo_4': 'fondo_4'   # Base - Nota ≥ 13 y Grado = 4P-5S
-            }
-
-            for grupo_nombre, grupo_df in st.session_state.grupos.items():
-                if not grupo_df.empty:
-                    plantilla_key = mapeo_plantillas[grupo_nombre]
-                    plantilla_bytes = st.session_state.plantillas[plantilla_key]
-
-                    st.write(f"Procesando {grupo_nombre} ({len(grupo_df)} estudiantes) con plantilla {plantilla_key}...")
-
-                    # Generar certificados pasando la configuración de estilos
-                    certificados_gen = generar_certificados_grupo(
-                        grupo_df,
-                        plantilla_bytes,
-                        plantilla_key,
-                        grupo_nombre,
-                        zip_file,
-                        progress_bar,
-                        estudiantes_procesados,
-                        total_estudiantes,
-                        styles_config_by_template
-                    )
-
-                    estudiantes_procesados += len(grupo_df)
-
-                    st.success(f"✅ {grupo_nombre}: {certificados_gen} certificados generados con estilo {plantilla_key}")
-
-        zip_buffer.seek(0)
-        st.success("🎉 Todos los certificados han sido generados correctamente y están listos para su descarga.")
-        
-        st.session_state.zip_buffer = zip_buffer
-        st.session_state.certificados_generados = True
-        
+        trabajo_id, mensaje = enviar_trabajo(usuario_actual(), st.session_state.get('nombre_archivo', ''),
+                                             st.session_state.grupos, st.session_state.plantillas,
+                                             backend=st.session_state.get('backend', 'reportlab'), corrida=corrida,
+                                             modo=st.session_state.get('modo_salida', 'individual'),
+                                             variante=st.session_state.get('variante', VARIANTE_POR_DEFECTO),
+                                             empaque=opciones_empaque(st.session_state.get('compresion'),
+                                                                      st.session_state.get('volumen_mb'),
+                                                                      st.session_state.get('volumen_por_carpeta')),
+                                             perfil=perfil_pedido() or None)
+        if trabajo_id is None:
+            st.error(mensaje)
+            return False
+
+        st.session_state.trabajo_id = trabajo_id
+        st.query_params['trabajo'] = trabajo_id
         return True
     return False
 
+# Avance del trabajo en curso; se vuelve a consultar cada segundo sin recargar toda la página
+@st.fragment(run_every=1.0)
+def seguir_trabajo():
+    trabajo = estado_trabajo(st.session_state.trabajo_id)
+    if trabajo is None:
+        st.session_state.trabajo_id = None
+        st.query_params.pop('trabajo', None)
+        return
+
+    for nivel, mensaje in trabajo['mensajes']:
+        avisar_streamlit(nivel, mensaje)
+    # Los certificados que fallaron llegan en un solo resumen, no un aviso por fila
+    if trabajo.get('fallas'):
+        st.error(describir_fallas(trabajo['fallas']))
+
+    # Si el servidor se reinició a mitad de camino, seguir desde el último punto de control
+    if trabajo['estado'] == 'interrumpido':
+        trabajo_id, mensaje = reanudar_trabajo(trabajo['id'], usuario_actual())
+        if trabajo_id:
+            st.info(mensaje)
+            return
+
+    if trabajo['estado'] in ('en_cola', 'procesando'):
+        st.info("En cola..." if trabajo['estado'] == 'en_cola' else "Generando certificados por grupos...")
+        st.progress(min(trabajo['procesados'] / trabajo['total'], 1.0) if trabajo['total'] else 0.0,
+                    text=describir_avance(trabajo))
+        if st.button("Cancelar generación"):
+            cancelar_trabajo(trabajo['id'], usuario_actual())
+        return
+
+    # El trabajo terminó: pasar el resultado a la sesión y recargar la página completa
+    st.session_state.trabajo_id = None
+    st.query_params.pop('trabajo', None)
+    if trabajo['estado'] == 'terminado':
+        st.session_state.nombre_archivo = trabajo['archivo']
+        st.session_state.ruta_zip = trabajo['ruta_zip']
+        st.session_state.resumen_metricas = trabajo['resumen_metricas']
+        st.session_state.certificados_generados = True
+        st.session_state.trabajo_terminado = trabajo
+        st.session_state.descargados = set()
+        if trabajo.get('fallidos'):
+            st.session_state.aviso_trabajo = ('warning', f"⚠️ {trabajo['fallidos']} certificados no se pudieron "
+                                                         "generar. El ZIP tiene el resto.")
+        else:
+            st.session_state.aviso_trabajo = ('success', "🎉 Todos los certificados han sido generados "
+                                                         "correctamente y están listos para su descarga.")
+    elif trabajo['estado'] == 'cancelado':
+        st.session_state.aviso_trabajo = ('warning', "La generación fue cancelada.")
+    elif trabajo['estado'] == 'interrumpido':
+        st.session_state.aviso_trabajo = ('warning', "La generación se interrumpió porque se reinició el servidor "
+                                                     "y no se pudo retomar. Vuelve a subir el archivo.")
+    else:
+        st.session_state.aviso_trabajo = ('error', f"Error al generar los certificados: {trabajo['error']}")
+    st.rerun()
+
 
 # Configuración de la web
 st.set_page_config(page_title="Generador de Certificados", layout="centered")
@@ -634,21 +194,37 @@ if 'archivo_procesado' not in st.session_state:
     st.session_state.archivo_procesado = False
 
 # Preprocesamiento del Excel
-st.header("📤 Subir y procesar archivo Excel")
-uploaded_file = st.file_uploader("Selecciona un archivo Excel", type=["xlsx"])
+st.header("📤 Subir y procesar archivo de notas")
+uploaded_file = st.file_uploader("Selecciona un archivo Excel, CSV o Parquet", type=FORMATOS_ADMITIDOS)
+st.selectbox("Motor de render", sorted(BACKENDS), key='backend')
+st.selectbox("Uso de los certificados", list(VARIANTES), key='variante',
+             format_func={'impresion': "Impresión (fondos originales)", 'correo': "Correo / LMS (PDFs más livianos)"}.get)
+st.selectbox("Formato de salida", MODOS_SALIDA, key='modo_salida',
+             format_func={'individual': "Un PDF por estudiante", 'grupo': "Un PDF por grupo",
+                          'archivo': "Un PDF para todo el archivo"}.get)
+with st.expander("📦 Empaquetado del ZIP"):
+    st.slider("Compresión (0 = sin comprimir)", 0, 9, COMPRESION, key='compresion')
+    st.number_input("Tamaño máximo de cada ZIP en MB (0 = sin límite)", min_value=0, value=VOLUMEN_MB, step=5,
+                    key='volumen_mb')
+    st.checkbox("Constancias en un ZIP aparte", value=VOLUMEN_POR_CARPETA, key='volumen_por_carpeta')
 
 if uploaded_file and not st.session_state.archivo_procesado:
-    st.subheader("📊 Vista previa del archivo original")
-    df_original = pd.read_excel(uploaded_file)
-    st.write(f"**Dimensiones originales:** {df_original.shape[0]} filas x {df_original.shape[1]} columnas")
-    st.write(f"**Nombre del archivo:** {uploaded_file.name}")
-    st.dataframe(df_original.head(15))
+    # Una sola lectura del archivo sirve para la vista previa y para el procesamiento
+    corrida = metricas.nueva_corrida(uploaded_file.name)
+    with st.spinner("Leyendo archivo"), metricas.cronometro(corrida, 'ingesta'):
+        planilla, exito, mensaje = procesar_planilla(uploaded_file)
+
+    if exito:
+        filas_originales, columnas_originales = planilla['dimensiones']
+        st.subheader("📊 Vista previa del archivo original")
+        st.write(f"**Dimensiones originales:** {filas_originales} filas x {columnas_originales} columnas")
+        st.write(f"**Nombre del archivo:** {uploaded_file.name}")
+        st.dataframe(planilla['vista_previa'])
 
     # Procesar automáticamente el archivo
     with st.spinner("Procesando archivo y generando certificados"):
-        df_procesado, exito, mensaje = procesar_excel_inicial(uploaded_file)
-        
         if exito:
+            df_procesado = planilla['df']
             st.session_state.df_procesado = df_procesado
             st.session_state.nombre_archivo = uploaded_file.name
             
@@ -656,7 +232,12 @@ if uploaded_file and not st.session_state.archivo_procesado:
             st.session_state.grupos = None
             st.session_state.plantillas = None
             st.session_state.certificados_generados = False
-            st.session_state.zip_buffer = None
+            st.session_state.ruta_zip = None
+            st.session_state.resumen_metricas = None
+            st.session_state.vista_previa = None
+            st.session_state.trabajo_terminado = None
+            st.session_state.descargados = set()
+            registrar_artefactos(st.session_state)
             
             st.success(mensaje)
             st.subheader("✅ Archivo procesado - Vista previa de datos limpios")
@@ -664,40 +245,96 @@ if uploaded_file and not st.session_state.archivo_procesado:
             st.dataframe(df_procesado)
             
             # Cargar plantillas automáticamente
-            st.session_state.plantillas = cargar_plantillas()
+            st.session_state.plantillas = cargar_plantillas(avisar_streamlit,
+                                                            st.session_state.get('variante', VARIANTE_POR_DEFECTO))
             
             # Clasificar estudiantes automáticamente
             nombre_archivo = st.session_state.nombre_archivo
-            st.session_state.grupos = clasificar_estudiantes_por_nota(st.session_state.df_procesado, nombre_archivo)
+            metricas.registrar(corrida, 'ingesta', cantidad=len(df_procesado))
+            with metricas.cronometro(corrida, 'clasificacion'):
+                st.session_state.grupos = clasificar_estudiantes_por_nota(st.session_state.df_procesado,
+                                                                          nombre_archivo, avisar_streamlit)
+
+            # Vista previa con los nombres y cursos más largos de cada grupo, antes de la generación completa
+            if st.session_state.grupos and st.session_state.plantillas:
+                with metricas.cronometro(corrida, 'vista_previa'):
+                    st.session_state.vista_previa = generar_vista_previa(
+                        st.session_state.grupos, st.session_state.plantillas, nombre_archivo,
+                        st.session_state.get('backend', 'reportlab'))
             
             # Generar certificados automáticamente
-            generar_todos_certificados()
+            generar_todos_certificados(corrida)
 
             # Variable de procesamiento activada
             st.session_state.archivo_procesado = True
         else:
             st.error(mensaje)
 
-elif uploaded_file and st.session_state.archivo_procesado:
+elif uploaded_file and st.session_state.archivo_procesado and st.session_state.certificados_generados:
     st.success("✅ Archivo ya procesado. Los certificados están listos para descargar.")
 
+if st.session_state.vista_previa:
+    mostrar_vista_previa(st.session_state.vista_previa)
+
+if st.session_state.trabajo_id:
+    seguir_trabajo()
+
+if st.session_state.aviso_trabajo:
+    avisar_streamlit(*st.session_state.aviso_trabajo)
+    st.session_state.aviso_trabajo = None
+
+# El ZIP pudo haber vencido y sido borrado desde la última ejecución
+if st.session_state.certificados_generados and not zip_disponible(st.session_state.ruta_zip):
+    st.warning("⚠️ El ZIP generado ya expiró. Vuelve a subir el archivo para generarlo de nuevo.")
+    st.session_state.certificados_generados = False
+    st.session_state.ruta_zip = None
+
 # Mostrar botón de descarga si los certificados fueron generados
-if st.session_state.certificados_generados and st.session_state.zip_buffer:
-    nombre_archivo = st.session_state.get('nombre_archivo', '')
-    nombre_base = os.path.splitext(nombre_archivo)[0] if nombre_archivo else "CERTIFICADOS"
+if st.session_state.certificados_generados and st.session_state.ruta_zip:
+    zip_filename = nombre_zip_descarga(st.session_state.get('nombre_archivo', ''))
+    volumenes = rutas_volumenes(st.session_state.ruta_zip)
     
-    if len(nombre_base) >= 2 and nombre_base[1].upper() == 'P':
-        zip_filename = f"{nombre_base}_PRELIMINAR.zip"
+    if volumenes == [st.session_state.ruta_zip]:
+        boton_descarga_zip(st.session_state.ruta_zip, "📥 Descargar todos los certificados (ZIP)", zip_filename)
     else:
-        zip_filename = f"{nombre_base}.zip"
-    
-    st.download_button(
-        label="📥 Descargar todos los certificados (ZIP)",
-        data=st.session_state.zip_buffer,
-        file_name=zip_filename,
-        mime="application/zip"
-    )
-elif not uploaded_file:
-    st.info("👆 Sube un archivo Excel para generar los certificados automáticamente.")
+        # Cada volumen se descarga con el nombre del ZIP y su sufijo (_Constancias, _2, ...)
+        base_interna = os.path.splitext(os.path.basename(st.session_state.ruta_zip))[0]
+        for ruta in volumenes:
+            sufijo = os.path.basename(ruta)[len(base_interna):]
+            boton_descarga_zip(ruta, f"📥 Descargar volumen {os.path.splitext(zip_filename)[0]}{sufijo}",
+                               os.path.splitext(zip_filename)[0] + sufijo)
+
+    # Filas que fallaron: la lista para revisarlas y la opción de reintentar sólo esas
+    terminado = st.session_state.trabajo_terminado
+    if terminado and terminado['ruta_zip'] == st.session_state.ruta_zip and terminado.get('fallidos'):
+        if os.path.exists(ruta_fallidos(terminado['ruta_zip'])):
+            with open(ruta_fallidos(terminado['ruta_zip']), 'rb') as archivo_fallidos:
+                st.download_button("📄 Descargar la lista de filas fallidas (JSON)", data=archivo_fallidos,
+                                   file_name="fallidos.json", mime="application/json")
+        if st.button(f"🔁 Reintentar los {terminado['fallidos']} certificados que fallaron"):
+            trabajo_id, mensaje = reanudar_trabajo(terminado['id'], usuario_actual())
+            if trabajo_id:
+                st.session_state.trabajo_id = trabajo_id
+                st.query_params['trabajo'] = trabajo_id
+                st.session_state.certificados_generados = False
+                st.session_state.trabajo_terminado = None
+                st.rerun()
+            st.error(mensaje)
+
+    # Perfil de la corrida, si se pidió
+    if terminado and terminado['ruta_zip'] == st.session_state.ruta_zip and terminado.get('perfil_archivos'):
+        for ruta in terminado['perfil_archivos']:
+            if os.path.exists(ruta):
+                with open(ruta, 'rb') as archivo_perfil:
+                    st.download_button(f"📈 Descargar perfil ({os.path.splitext(ruta)[1][1:]})", data=archivo_perfil,
+                                       file_name=f"perfil{os.path.splitext(ruta)[1]}", key=f"perfil_{ruta}")
+
+    if st.session_state.resumen_metricas:
+        mostrar_metricas(st.session_state.resumen_metricas)
+elif not uploaded_file and not st.session_state.trabajo_id:
+    st.info("👆 Sube un archivo Excel, CSV o Parquet para generar los certificados automáticamente.")
     # Resetear el estado
-    st.session_state.archivo_procesado = False
\ No newline at end of file
+    st.session_state.archivo_procesado = False
+
+# Liberar la planilla, los grupos, las plantillas y la vista previa que esta sesión ya no necesita
+liberar_artefactos(st.session_state, descargado=bool(st.session_state.descargados))
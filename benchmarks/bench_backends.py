@@ -0,0 +1,64 @@
+"""
+Compara los backends de render (reportlab y PyMuPDF): velocidad y tamaño de los PDFs.
+
+Uso:
+    python benchmarks/bench_backends.py [--filas 100] [--marca-agua]
+"""
+import argparse
+import os
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from certificados import motor, render  # noqa: E402
+from certificados.paralelo import BACKENDS, renderizar_lote  # noqa: E402
+
+
+def filas_sinteticas(filas):
+    return [
+        (f"ESTUDIANTE {i} APELLIDO PATERNO MATERNO", "PROGRAMACIÓN Y PENSAMIENTO COMPUTACIONAL", f"N-{i:05}", "40", "")
+        for i in range(filas)
+    ]
+
+
+def medir(contexto, filas):
+    renderizar_lote(contexto, filas[:2])  # calentar la caché de la página base
+    inicio = time.perf_counter()
+    resultados = renderizar_lote(contexto, filas)
+    duracion = time.perf_counter() - inicio
+    errores = [error for _pdf, error, _segundos in resultados if error]
+    if errores:
+        raise RuntimeError(errores[0])
+    return duracion, sum(len(pdf) for pdf, _error, _segundos in resultados)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--filas', type=int, default=100)
+    parser.add_argument('--marca-agua', action='store_true', help="Aplica la marca de agua a las plantillas aprobadas")
+    args = parser.parse_args()
+
+    plantillas = motor.cargar_plantillas()
+    filas = filas_sinteticas(args.filas)
+
+    print(f"{'plantilla':<10} {'backend':<10} {'cert/s':>9} {'KB/cert':>9}")
+    for plantilla_key in sorted(plantillas):
+        ruta_marca_agua = None
+        if args.marca_agua and plantilla_key != 'fondo_2':
+            orientacion = 'marca_agua.pdf' if render.styles_config_by_template[plantilla_key].get(
+                'orientation') == 'portrait' else 'marca_agua_landscape.pdf'
+            ruta_marca_agua = os.path.join(render.RAIZ_PROYECTO, "watermarks", orientacion)
+
+        for backend in sorted(BACKENDS):
+            contexto = render.crear_contexto_grupo(plantilla_key, plantillas[plantilla_key],
+                                                   render.styles_config_by_template, ruta_marca_agua,
+                                                   backend=backend)
+            duracion, total_bytes = medir(contexto, filas)
+            print(f"{plantilla_key:<10} {backend:<10} {args.filas / duracion:9.1f} "
+                  f"{total_bytes / args.filas / 1024:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
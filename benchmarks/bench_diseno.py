@@ -0,0 +1,53 @@
+"""
+Mide el tiempo de diseño (cortes de línea y posiciones) por certificado, sin dibujar.
+
+Uso:
+    python benchmarks/bench_diseno.py [--filas 1000] [--cursos 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from certificados import render  # noqa: E402
+
+
+def filas_sinteticas(filas, cursos):
+    return [
+        (f"ESTUDIANTE {i} APELLIDO PATERNO MATERNO",
+         f"DISEÑO GRÁFICO DIGITAL CON HERRAMIENTAS DE ADOBE CREATIVE CLOUD NIVEL {i % cursos}",
+         f"N-{i:05}", "40")
+        for i in range(filas)
+    ]
+
+
+def medir(contexto, filas):
+    page_width, _page_height = render.tamano_pagina(contexto['styles_config'])
+    estilos = contexto['estilos']
+    inicio = time.perf_counter()
+    for fila in filas:
+        for texto, style_key in render.textos_certificado(contexto, *fila):
+            render.posicionar_texto(texto, estilos[style_key], page_width)
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--filas', type=int, default=1000)
+    parser.add_argument('--cursos', type=int, default=5, help="Cursos distintos en la lista")
+    args = parser.parse_args()
+
+    filas = filas_sinteticas(args.filas, args.cursos)
+
+    print(f"{'plantilla':<10} {'us/cert':>9}")
+    for plantilla_key in sorted(render.styles_config_by_template):
+        contexto = render.crear_contexto_grupo(plantilla_key, b'', render.styles_config_by_template)
+        duracion = medir(contexto, filas)
+        print(f"{plantilla_key:<10} {duracion / args.filas * 1e6:9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Compara opciones de empaquetado del ZIP: sin comprimir y con deflate a distintos niveles, con uno o
+varios hilos de compresión. Los PDFs se renderizan una sola vez y se empaquetan con cada opción.
+
+Uso:
+    python benchmarks/bench_empaquetado.py [--filas 200] [--niveles 0 1 6] [--hilos 4] [--volumen-mb 25]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from certificados import empaquetado, motor, render  # noqa: E402
+from certificados.paralelo import renderizar_lote  # noqa: E402
+
+
+def pdfs_sinteticos(filas):
+    plantillas = motor.cargar_plantillas()
+    contexto = render.crear_contexto_grupo('fondo_3', plantillas['fondo_3'], render.styles_config_by_template,
+                                           None, "12 de marzo del 2025")
+    filas = [(f"ESTUDIANTE {i} APELLIDO PATERNO MATERNO", "PROGRAMACIÓN Y PENSAMIENTO COMPUTACIONAL", f"N-{i:05}",
+              "", f"ESTUDIANTE_{i}.pdf") for i in range(filas)]
+    return [(fila[4], pdf_bytes) for fila, (pdf_bytes, _error, _segundos) in zip(filas, renderizar_lote(contexto, filas))]
+
+
+def medir(pdfs, empaque, directorio):
+    ruta_zip = os.path.join(directorio, f"bench_{empaque['compresion']}.zip")
+    inicio = time.perf_counter()
+    with empaquetado.escribir_zip(ruta_zip, empaque) as zip_file:
+        for nombre, pdf_bytes in pdfs:
+            zip_file.writestr(nombre, pdf_bytes)
+    duracion = time.perf_counter() - inicio
+    volumenes = empaquetado.rutas_volumenes(ruta_zip)
+    return duracion, empaquetado.tamano_salida(ruta_zip), len(volumenes)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--filas', type=int, default=200)
+    parser.add_argument('--niveles', type=int, nargs='+', default=[0, 1, 6])
+    parser.add_argument('--hilos', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--volumen-mb', type=int, default=0)
+    args = parser.parse_args()
+
+    pdfs = pdfs_sinteticos(args.filas)
+    total = sum(len(pdf_bytes) for _nombre, pdf_bytes in pdfs)
+    print(f"{len(pdfs)} PDFs, {total / 1024 / 1024:.1f} MB sin empaquetar")
+
+    with tempfile.TemporaryDirectory() as directorio:
+        for hilos in args.hilos:
+            empaquetado.HILOS_COMPRESION = hilos
+            empaquetado._executor = None
+            for nivel in args.niveles:
+                empaque = empaquetado.opciones_empaque(nivel, args.volumen_mb, False)
+                duracion, tamano, volumenes = medir(pdfs, empaque, directorio)
+                print(f"nivel {nivel}  hilos {hilos:2}  {duracion:6.2f} s  {tamano / 1024 / 1024:7.1f} MB  "
+                      f"{volumenes} volumen(es)  {total / 1024 / 1024 / duracion:6.0f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Compara el costo de generar certificados con y sin marca de agua.
+
+Uso (desde la raíz del proyecto):
+    python benchmarks/bench_marca_agua.py [--filas 200] [--plantilla fondo_3]
+"""
+import argparse
+import os
+import sys
+import time
+from io import BytesIO
+from zipfile import ZipFile
+
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from certificados import motor, render  # noqa: E402
+
+
+def grupo_sintetico(filas):
+    return pd.DataFrame({
+        'nombre_certificado': [f"ESTUDIANTE {i} APELLIDO PATERNO MATERNO" for i in range(filas)],
+        'curso': ["Programación y pensamiento computacional" for _ in range(filas)],
+        'numeración': [f"N-{i:05}" for i in range(filas)],
+        'horas_progresivo': [40] * filas,
+    })
+
+
+def medir(grupo_df, plantilla_key, nombre_archivo, plantillas):
+    buffer = BytesIO()
+    inicio = time.perf_counter()
+    with ZipFile(buffer, "w") as zip_file:
+        motor.generar_certificados_grupo(grupo_df, plantillas[plantilla_key], plantilla_key, 'bench', zip_file,
+                                         lambda procesados, total: None, 0, len(grupo_df),
+                                         render.styles_config_by_template, nombre_archivo, usar_cache=False)
+    return time.perf_counter() - inicio, buffer
+
+
+def medir_fusion_pypdf2(buffer_sin_marca):
+    # Camino anterior: releer cada PDF terminado y fusionarlo con PyPDF2
+    watermark_path = os.path.join(render.RAIZ_PROYECTO, "watermarks", "marca_agua.pdf")
+    with ZipFile(buffer_sin_marca) as zip_file:
+        pdfs = [zip_file.read(nombre) for nombre in zip_file.namelist()]
+    inicio = time.perf_counter()
+    for pdf_bytes in pdfs:
+        render.agregar_marca_agua(BytesIO(pdf_bytes), watermark_path)
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--filas', type=int, default=200)
+    parser.add_argument('--plantilla', default='fondo_3', choices=['fondo_1', 'fondo_3', 'fondo_4'])
+    args = parser.parse_args()
+
+    plantillas = motor.cargar_plantillas()
+    grupo_df = grupo_sintetico(args.filas)
+
+    # Calentar cachés de fuentes, fondos y marcas de agua
+    medir(grupo_df.head(2), args.plantilla, "SI_calentamiento.xlsx", plantillas)
+
+    t_sin, buffer_sin = medir(grupo_df, args.plantilla, "S_bench.xlsx", plantillas)
+    t_con, _ = medir(grupo_df, args.plantilla, "SI_bench.xlsx", plantillas)
+    t_fusion = medir_fusion_pypdf2(buffer_sin)
+
+    print(f"Certificados: {args.filas} ({args.plantilla})")
+    print(f"  sin marca de agua:           {t_sin:8.3f} s  ({args.filas / t_sin:7.1f} cert/s)")
+    print(f"  con marca de agua (XObject): {t_con:8.3f} s  ({args.filas / t_con:7.1f} cert/s)  x{t_con / t_sin:.2f}")
+    print(f"  fusión PyPDF2 anterior:      {t_sin + t_fusion:8.3f} s  "
+          f"({args.filas / (t_sin + t_fusion):7.1f} cert/s)  x{(t_sin + t_fusion) / t_sin:.2f}")
+
+
+if __name__ == "__main__":
+    main()
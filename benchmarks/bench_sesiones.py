@@ -0,0 +1,230 @@
+"""
+Prueba de carga de la página con varias sesiones a la vez, usando el AppTest de Streamlit.
+
+Cada sesión sube una planilla, espera a que su trabajo termine y aparezca el botón de
+descarga, y (salvo con --sin-descarga) descarga el ZIP. Informa:
+
+    - por sesión: la latencia hasta poder descargar, cuánto subió el RSS al procesar su
+      archivo, cuánto ocupa su estado (st.session_state) antes y después de descargar, y los
+      MB que sus botones de descarga tienen en memoria
+    - en total: RSS del proceso y de los workers de render, al inicio, en el pico y al final
+    - lo que queda cuando las sesiones se cierran: RSS, trabajos en memoria, archivos en la
+      carpeta de salida e hilos vivos
+
+Los trabajos de las sesiones corren a la vez, pero las ejecuciones de la página van de a una:
+AppTest reemplaza el runtime global de Streamlit en cada ejecución. Como AppTest no sube archivos
+ni hace clic en botones de descarga, el selector de archivo se reemplaza por uno que devuelve la
+planilla de la sesión, y la descarga se simula marcando el ZIP como descargado igual que el botón.
+
+Uso:
+    python benchmarks/bench_sesiones.py [--sesiones 4] [--filas 400] [--archivo SI_400.xlsx]
+                                        [--sin-descarga] [--salida resultados.json]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Una carpeta de salida propia, para contar lo que queda de esta prueba y nada más
+os.environ.setdefault('CERTIFICADOS_SALIDA', tempfile.mkdtemp(prefix='certificados_sesiones_'))
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from certificados import trabajos  # noqa: E402
+from certificados.empaquetado import DIRECTORIO_SALIDA, rutas_volumenes  # noqa: E402
+from certificados.sesion import tamano_estado, tamano_objeto  # noqa: E402
+from planilla_sintetica import generar_planilla  # noqa: E402
+
+RUTA_APP = os.path.join(RAIZ, 'app.py')
+
+MB = 1024 * 1024
+
+
+def pagina(ruta_app):
+    # Script de cada sesión: la página con el selector de archivo reemplazado por la planilla de la sesión
+    import io
+    import os
+    import runpy
+
+    import streamlit as st
+
+    def archivo_de_la_sesion(*args, **kwargs):
+        ruta = st.session_state.get('carga_archivo')
+        if not ruta:
+            return None
+        with open(ruta, 'rb') as f:
+            archivo = io.BytesIO(f.read())
+        archivo.name = os.path.basename(ruta)
+        return archivo
+
+    st.file_uploader = archivo_de_la_sesion
+    runpy.run_path(ruta_app, run_name='__main__')
+
+
+def rss_mb(pid='self'):
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / MB
+    except (OSError, ValueError):
+        return 0.0
+
+
+def rss_workers_mb():
+    # Los workers de render son procesos hijos; /proc/<pid>/task/<tid>/children sólo existe en Linux
+    total = 0.0
+    try:
+        hilos = os.listdir('/proc/self/task')
+    except OSError:
+        return total
+    for hilo in hilos:
+        try:
+            with open(f"/proc/self/task/{hilo}/children") as f:
+                total += sum(rss_mb(pid) for pid in f.read().split())
+        except OSError:
+            continue
+    return total
+
+
+def estado_mb(app):
+    estado = app.session_state.filtered_state
+    return sum(tamano_estado(estado).values()) / MB
+
+
+def descargas_mb(app):
+    # Lo que los botones de descarga cargan en memoria: los volúmenes del ZIP que todavía no se descargaron
+    estado = app.session_state.filtered_state
+    if not estado.get('certificados_generados') or not estado.get('ruta_zip'):
+        return 0.0
+    pendientes = [ruta for ruta in rutas_volumenes(estado['ruta_zip']) if ruta not in estado.get('descargados', ())]
+    return sum(os.path.getsize(ruta) for ruta in pendientes if os.path.exists(ruta)) / MB
+
+
+def ejecutar(sesion, timeout):
+    sesion['app'].run(timeout=timeout)
+    if sesion['app'].exception:
+        sesion['error'] = sesion['app'].exception[0].value
+
+
+def revisar(sesion, descargar, timeout):
+    # Cuando aparece el botón de descarga se toman las medidas y, si corresponde, se descarga el ZIP
+    app = sesion['app']
+    if sesion['listo'] is not None or not app.get('download_button'):
+        return
+    sesion['listo'] = time.perf_counter() - sesion['inicio']
+    sesion['estado_listo_mb'] = estado_mb(app)
+    sesion['descargas_mb'] = descargas_mb(app)
+    if descargar:
+        app.session_state['descargados'] = set(rutas_volumenes(app.session_state['ruta_zip']))
+        ejecutar(sesion, timeout)
+    sesion['estado_final_mb'] = estado_mb(app)
+    sesion['descargas_final_mb'] = descargas_mb(app)
+
+
+def medir(archivo, cantidad, descargar, timeout, intervalo, espera_maxima):
+    trabajos.LIMITE_POR_USUARIO = cantidad  # todas las sesiones de AppTest son el mismo usuario ('local')
+    total_inicio = rss_mb()
+    sesiones = []
+    for i in range(cantidad):
+        app = AppTest.from_function(pagina, kwargs={'ruta_app': RUTA_APP}, default_timeout=timeout)
+        app.session_state['carga_archivo'] = archivo
+        sesiones.append({'numero': i + 1, 'app': app, 'listo': None, 'error': None})
+
+    pico = total_inicio
+    pico_workers = 0.0
+    for sesion in sesiones:
+        antes = rss_mb()
+        sesion['inicio'] = time.perf_counter()
+        ejecutar(sesion, timeout)
+        sesion['rss_carga_mb'] = rss_mb() - antes
+        revisar(sesion, descargar, timeout)
+
+    limite = time.perf_counter() + espera_maxima
+    while time.perf_counter() < limite:
+        pendientes = [sesion for sesion in sesiones if sesion['listo'] is None and sesion['error'] is None]
+        if not pendientes:
+            break
+        time.sleep(intervalo)
+        for sesion in pendientes:
+            ejecutar(sesion, timeout)
+            revisar(sesion, descargar, timeout)
+        pico, pico_workers = max(pico, rss_mb()), max(pico_workers, rss_workers_mb())
+
+    total_fin = rss_mb()
+    # Las sesiones se cierran: su estado se descarta y sólo queda lo que guarda el proceso
+    resultados = [{clave: valor for clave, valor in sesion.items() if clave not in ('app', 'inicio')}
+                  for sesion in sesiones]
+    del sesiones
+    gc.collect()
+    archivos = [os.path.join(DIRECTORIO_SALIDA, nombre) for nombre in os.listdir(DIRECTORIO_SALIDA)]
+    with trabajos._lock:
+        trabajos_en_memoria = list(trabajos._trabajos.values())
+    return {
+        'sesiones': resultados,
+        'total': {'rss_inicio_mb': total_inicio, 'rss_pico_mb': max(pico, total_fin), 'rss_fin_mb': total_fin,
+                  'rss_workers_pico_mb': pico_workers},
+        'restos': {
+            'rss_mb': rss_mb(), 'rss_sobre_inicio_mb': rss_mb() - total_inicio,
+            'trabajos_en_memoria': len(trabajos_en_memoria),
+            'trabajos_mb': sum(tamano_objeto(trabajos._datos_publicos(trabajo)) for trabajo in trabajos_en_memoria) / MB,
+            'archivos': len(archivos),
+            'archivos_mb': sum(os.path.getsize(ruta) for ruta in archivos if os.path.isfile(ruta)) / MB,
+            'hilos': threading.active_count(),
+        },
+    }
+
+
+def imprimir(resultados):
+    print(f"{'sesión':>6} {'listo (s)':>10} {'RSS carga':>10} {'estado':>9} {'descargas':>10} {'estado fin':>11} "
+          f"{'descargas fin':>14}")
+    for sesion in resultados['sesiones']:
+        if sesion['error'] is not None or sesion['listo'] is None:
+            print(f"{sesion['numero']:>6}  {sesion['error'] or 'no terminó a tiempo'}")
+            continue
+        print(f"{sesion['numero']:>6} {sesion['listo']:>10.1f} {sesion['rss_carga_mb']:>7.1f} MB "
+              f"{sesion['estado_listo_mb']:>6.1f} MB {sesion['descargas_mb']:>7.1f} MB "
+              f"{sesion['estado_final_mb']:>8.1f} MB {sesion['descargas_final_mb']:>11.1f} MB")
+    total = resultados['total']
+    print(f"RSS del proceso: {total['rss_inicio_mb']:.0f} MB al inicio, {total['rss_pico_mb']:.0f} MB en el pico, "
+          f"{total['rss_fin_mb']:.0f} MB al final; workers de render: {total['rss_workers_pico_mb']:.0f} MB en el pico")
+    restos = resultados['restos']
+    print(f"Al cerrar las sesiones: RSS {restos['rss_mb']:.0f} MB ({restos['rss_sobre_inicio_mb']:+.0f} MB), "
+          f"{restos['trabajos_en_memoria']} trabajos en memoria ({restos['trabajos_mb']:.2f} MB), "
+          f"{restos['archivos']} archivos en {DIRECTORIO_SALIDA} ({restos['archivos_mb']:.1f} MB), "
+          f"{restos['hilos']} hilos")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sesiones', type=int, default=4)
+    parser.add_argument('--filas', type=int, default=400, help="Filas de la planilla sintética")
+    parser.add_argument('--archivo', help="Planilla a subir en cada sesión (por defecto, una sintética SI_<filas>)")
+    parser.add_argument('--sin-descarga', action='store_true', help="No descargar el ZIP al terminar")
+    parser.add_argument('--timeout', type=float, default=120, help="Segundos máximos de cada ejecución de la página")
+    parser.add_argument('--intervalo', type=float, default=1.0, help="Segundos entre consultas de las sesiones")
+    parser.add_argument('--espera-maxima', type=float, default=1800, help="Segundos máximos de toda la prueba")
+    parser.add_argument('--salida', help="Además, escribe los resultados en este JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        archivo = args.archivo
+        if archivo is None:
+            archivo = os.path.join(directorio, f"SI_{args.filas}.xlsx")
+            generar_planilla(archivo, args.filas)
+        resultados = medir(os.path.abspath(archivo), args.sesiones, not args.sin_descarga, args.timeout,
+                           args.intervalo, args.espera_maxima)
+    imprimir(resultados)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
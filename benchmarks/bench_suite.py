@@ -0,0 +1,248 @@
+"""
+Suite de benchmarks de punta a punta sobre planillas sintéticas.
+
+Por cada tamaño y tipo de archivo (S: normal, SI: con marca de agua, P: progresivo)
+mide por separado ingesta, clasificación, preparación de filas, diseño, render,
+marca de agua y ZIP. Guarda throughput, RSS máximo y tamaño de salida en JSON y
+compara contra una línea base, marcando las regresiones que superen el umbral.
+
+Cada escenario corre en un proceso nuevo para que el RSS máximo sea sólo suyo.
+El render se mide en serie sobre una muestra de filas (--muestra-render).
+
+Uso:
+    python benchmarks/bench_suite.py [--tamanos 100,1000,5000,20000] [--escenarios S,SI,P]
+                                     [--guardar] [--linea-base benchmarks/linea_base.json] [--umbral 0.2]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from certificados import clasificacion, ingesta, motor, render  # noqa: E402
+from certificados.empaquetado import escribir_zip  # noqa: E402
+from certificados.paralelo import renderizar_lote  # noqa: E402
+from planilla_sintetica import generar_planilla  # noqa: E402
+
+LINEA_BASE = os.path.join(RAIZ, 'benchmarks', 'linea_base.json')
+
+# Además del throughput de cada etapa, métricas que empeoran al subir
+METRICAS_MENOR_ES_MEJOR = ['rss_mb', 'kb_por_certificado']
+
+
+def rss_maximo_mb():
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def cronometrar(etapas, nombre, filas, funcion, *args):
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    segundos = time.perf_counter() - inicio
+    etapas[nombre] = {'segundos': round(segundos, 4), 'filas': filas,
+                      'filas_s': round(filas / segundos, 1) if segundos else None}
+    return resultado
+
+
+def preparar_grupos(grupos, plantillas, nombre_archivo, con_marca_agua):
+    """(contexto, filas) por grupo no vacío, con la marca de agua según las reglas del nombre del archivo"""
+    preparados = []
+    for grupo_nombre, grupo_df in grupos.items():
+        if grupo_df.empty:
+            continue
+        plantilla_key = render.mapeo_plantillas[grupo_nombre]
+        ruta_marca_agua = None
+        if con_marca_agua:
+            ruta_marca_agua = motor.ruta_marca_agua_grupo(plantilla_key, nombre_archivo,
+                                                          render.styles_config_by_template)
+        contexto = render.crear_contexto_grupo(plantilla_key, plantillas[plantilla_key],
+                                               render.styles_config_by_template, ruta_marca_agua)
+        preparados.append((contexto, render.preparar_filas(grupo_df, plantilla_key)))
+    return preparados
+
+
+def disenar(preparados):
+    for contexto, filas in preparados:
+        page_width, _page_height = render.tamano_pagina(contexto['styles_config'])
+        estilos = contexto['estilos']
+        for nombre, curso, numero, horas_progresivo, _pdf_name in filas:
+            for texto, style_key in render.textos_certificado(contexto, nombre, curso, numero, horas_progresivo):
+                render.posicionar_texto(texto, estilos[style_key], page_width)
+
+
+def muestra(preparados, filas_muestra):
+    """Toma hasta filas_muestra filas repartidas entre los grupos en proporción a su tamaño"""
+    total = sum(len(filas) for _contexto, filas in preparados)
+    elegidos = []
+    for contexto, filas in preparados:
+        cantidad = max(1, round(len(filas) * filas_muestra / total)) if total > filas_muestra else len(filas)
+        elegidos.append((contexto, filas[:cantidad]))
+    return elegidos
+
+
+def renderizar(preparados):
+    pdfs = []
+    for contexto, filas in preparados:
+        for (pdf_bytes, error, _segundos), fila in zip(renderizar_lote(contexto, filas), filas):
+            if error:
+                raise RuntimeError(f"{fila[0]}: {error}")
+            pdfs.append((fila[4], pdf_bytes))
+    return pdfs
+
+
+def empaquetar(pdfs, ruta_zip):
+    with escribir_zip(ruta_zip) as zip_file:
+        zip_file.writestr("Constancias/", "")
+        for pdf_name, pdf_bytes in pdfs:
+            zip_file.writestr(pdf_name, pdf_bytes)
+    return os.path.getsize(ruta_zip)
+
+
+def medir_escenario(prefijo, filas, filas_muestra, directorio):
+    """Corre todas las etapas para una planilla sintética; se ejecuta en un proceso aparte"""
+    nombre_archivo = f"{prefijo}_{filas}.xlsx"
+    ruta = os.path.join(directorio, nombre_archivo)
+    if not os.path.exists(ruta):
+        generar_planilla(ruta, filas)
+
+    plantillas = motor.cargar_plantillas()
+    etapas = {}
+
+    planilla, exito, mensaje = cronometrar(etapas, 'ingesta', filas, ingesta.procesar_planilla, ruta)
+    if not exito:
+        raise RuntimeError(mensaje)
+    df = planilla['df']
+
+    grupos = cronometrar(etapas, 'clasificacion', len(df), clasificacion.clasificar_estudiantes_por_nota,
+                         df, nombre_archivo)
+    preparados = cronometrar(etapas, 'preparacion', len(df), preparar_grupos, grupos, plantillas,
+                             nombre_archivo, False)
+    cronometrar(etapas, 'diseno', len(df), disenar, preparados)
+
+    # Calentar las cachés de fondos y marcas de agua antes de medir el render
+    preparados = muestra(preparados, filas_muestra)
+    filas_render = sum(len(filas) for _contexto, filas in preparados)
+    renderizar(muestra(preparados, 1))
+    pdfs = cronometrar(etapas, 'render', filas_render, renderizar, preparados)
+
+    if motor.aplica_marca_agua(nombre_archivo):
+        con_marca = muestra(preparar_grupos(grupos, plantillas, nombre_archivo, True), filas_muestra)
+        renderizar(muestra(con_marca, 1))
+        pdfs = cronometrar(etapas, 'marca_agua', filas_render, renderizar, con_marca)
+
+    ruta_zip = os.path.join(directorio, f"{prefijo}_{filas}.zip")
+    tamano_zip = cronometrar(etapas, 'zip', len(pdfs), empaquetar, pdfs, ruta_zip)
+    os.unlink(ruta_zip)
+
+    return {
+        'filas': filas,
+        'filas_render': filas_render,
+        'etapas': etapas,
+        'rss_mb': round(rss_maximo_mb(), 1),
+        'zip_bytes': tamano_zip,
+        'kb_por_certificado': round(tamano_zip / max(1, len(pdfs)) / 1024, 1),
+    }
+
+
+def comparar(resultados, linea_base, umbral):
+    """Lista de regresiones (texto) de resultados frente a la línea base"""
+    regresiones = []
+    for clave, actual in resultados.items():
+        base = linea_base.get(clave)
+        if not base:
+            continue
+        for etapa, medicion in actual['etapas'].items():
+            anterior = base['etapas'].get(etapa)
+            if not anterior or not anterior.get('filas_s') or not medicion.get('filas_s'):
+                continue
+            if medicion['filas_s'] < anterior['filas_s'] * (1 - umbral):
+                regresiones.append(f"{clave} {etapa}: {medicion['filas_s']} filas/s (antes {anterior['filas_s']})")
+        for metrica in METRICAS_MENOR_ES_MEJOR:
+            if base.get(metrica) and actual[metrica] > base[metrica] * (1 + umbral):
+                regresiones.append(f"{clave} {metrica}: {actual[metrica]} (antes {base[metrica]})")
+    return regresiones
+
+
+def imprimir(resultados):
+    etapas = ['ingesta', 'clasificacion', 'preparacion', 'diseno', 'render', 'marca_agua', 'zip']
+    print(f"{'escenario':<12}" + "".join(f"{etapa:>14}" for etapa in etapas) + f"{'RSS MB':>9}{'KB/cert':>9}")
+    for clave, resultado in resultados.items():
+        columnas = []
+        for etapa in etapas:
+            medicion = resultado['etapas'].get(etapa)
+            columnas.append(f"{medicion['filas_s']:>14.1f}" if medicion else f"{'-':>14}")
+        print(f"{clave:<12}" + "".join(columnas) + f"{resultado['rss_mb']:>9.1f}{resultado['kb_por_certificado']:>9.1f}")
+    print("(filas/s por etapa)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tamanos', default='100,1000', help="Filas por planilla, separadas por comas (hasta 20000)")
+    parser.add_argument('--escenarios', default='S,SI,P', help="Prefijos del nombre de archivo a medir")
+    parser.add_argument('--muestra-render', type=int, default=200, help="Filas que se renderizan por escenario")
+    parser.add_argument('--linea-base', default=LINEA_BASE, help="JSON con la línea base a comparar")
+    parser.add_argument('--guardar', action='store_true', help="Guarda los resultados como nueva línea base")
+    parser.add_argument('--salida', help="Además, escribe los resultados en este JSON")
+    parser.add_argument('--umbral', type=float, default=0.2, help="Empeoramiento tolerado (0.2 = 20 %%)")
+    parser.add_argument('--directorio', default=os.path.join(tempfile.gettempdir(), 'certificados_bench'),
+                        help="Dónde se guardan las planillas sintéticas (se reutilizan entre corridas)")
+    args = parser.parse_args()
+
+    os.makedirs(args.directorio, exist_ok=True)
+    tamanos = [int(tamano) for tamano in args.tamanos.split(',')]
+    escenarios = [escenario.strip().upper() for escenario in args.escenarios.split(',')]
+
+    resultados = {}
+    contexto_mp = multiprocessing.get_context('spawn')
+    for filas in tamanos:
+        for prefijo in escenarios:
+            # Un proceso nuevo por escenario: el RSS máximo no arrastra lo de escenarios anteriores
+            with contexto_mp.Pool(1) as pool:
+                resultados[f"{prefijo}_{filas}"] = pool.apply(
+                    medir_escenario, (prefijo, filas, args.muestra_render, args.directorio))
+
+    imprimir(resultados)
+
+    informe = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'resultados': resultados,
+    }
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+
+    codigo = 0
+    if os.path.exists(args.linea_base) and not args.guardar:
+        with open(args.linea_base, encoding='utf-8') as f:
+            linea_base = json.load(f)
+        regresiones = comparar(resultados, linea_base['resultados'], args.umbral)
+        if regresiones:
+            print(f"\n⚠️ Regresiones de más del {args.umbral:.0%} frente a {args.linea_base}:")
+            for regresion in regresiones:
+                print(f"  {regresion}")
+            codigo = 1
+        else:
+            print(f"\nSin regresiones frente a {args.linea_base}")
+
+    if args.guardar:
+        with open(args.linea_base, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        print(f"\nLínea base guardada en {args.linea_base}")
+
+    return codigo
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Genera planillas de notas sintéticas con el formato que espera la ingesta.
+
+Una fila de título y 10 de encabezado del reporte, la cabecera en la fila 12 con
+las columnas requeridas (más algunas que se descartan) y después los estudiantes,
+con grados de primaria y secundaria y notas NP, bajas y aprobatorias mezcladas.
+
+Uso:
+    python benchmarks/planilla_sintetica.py 1000 SI_1000.xlsx [--semilla 1]
+"""
+import argparse
+import os
+import random
+import sys
+
+from openpyxl import Workbook
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from certificados.ingesta import FILA_CABECERA, columnas_requeridas  # noqa: E402
+
+COLUMNAS_EXTRA = ['docente', 'sede']
+
+GRADOS = ['1P', '2P', '3P', '4P', '5P', '1S', '2S', '3S', '4S', '5S']
+
+NOMBRES = ['JUAN CARLOS', 'MARÍA JOSÉ', 'ANA', 'LUIS ALBERTO FERNANDO', 'ROSA', 'JOSÉ MIGUEL', 'LUCÍA']
+APELLIDOS = ['PÉREZ', 'GARCÍA', 'QUISPE', 'MAMANI', 'FLORES', 'RODRÍGUEZ', 'SÁNCHEZ', 'ÑAHUI']
+
+CURSOS = [
+    'Programación en Python',
+    'Diseño Gráfico Digital con Herramientas de Adobe Creative Cloud',
+    'Ofimática',
+    'Robótica educativa y pensamiento computacional avanzado',
+]
+
+# NP, notas bajas (constancia de participación) y aprobatorias
+NOTAS = ['NP', 5, 10, 12, 13, 15, 18, 20]
+
+
+def fila_estudiante(i, azar):
+    nota = azar.choice(NOTAS)
+    valores = {
+        'nro': i + 1,
+        'paterno': azar.choice(APELLIDOS),
+        'materno': azar.choice(APELLIDOS),
+        'nombre': f"{azar.choice(NOMBRES)} {i}",
+        'grado': azar.choice(GRADOS),
+        'sección': azar.choice('ABC'),
+        'curso': azar.choice(CURSOS),
+        'nota lab': azar.randint(0, 20),
+        'lista de asistencia': 'OK',
+        'nota de examen cibertec': azar.randint(0, 20),
+        'nota final': nota,
+        'observación sobre nota desaprobatoria': 'No se presentó' if nota == 'NP' else None,
+        'status': 'APROBADO' if nota != 'NP' and nota >= 13 else 'DESAPROBADO',
+        'numeración': f"N-{i:05}" if i % 5 else None,
+        'horas_progresivo': 40 if i % 3 else None,
+        'docente': 'DOCENTE DE PRUEBA',
+        'sede': 'LIMA',
+    }
+    return [valores[columna] for columna in columnas_requeridas + COLUMNAS_EXTRA]
+
+
+def generar_planilla(ruta, filas, semilla=1):
+    """Escribe en ruta un Excel sintético con `filas` estudiantes y devuelve la ruta"""
+    azar = random.Random(semilla)
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet()
+
+    hoja.append(['REPORTE DE NOTAS - PLANILLA SINTÉTICA'])
+    for i in range(FILA_CABECERA - 1):
+        hoja.append([f"Encabezado del reporte {i + 1}"])
+    hoja.append([columna.upper() for columna in columnas_requeridas + COLUMNAS_EXTRA])
+
+    for i in range(filas):
+        hoja.append(fila_estudiante(i, azar))
+
+    libro.save(ruta)
+    return ruta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('filas', type=int)
+    parser.add_argument('ruta', help="Archivo .xlsx a escribir; el prefijo del nombre (P, SI, ...) define el flujo")
+    parser.add_argument('--semilla', type=int, default=1)
+    args = parser.parse_args()
+
+    generar_planilla(args.ruta, args.filas, args.semilla)
+    print(f"{args.ruta}: {args.filas} filas")
+
+
+if __name__ == '__main__':
+    main()
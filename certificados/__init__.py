@@ -0,0 +1 @@
+"""Motor de generación de certificados PDF."""
@@ -0,0 +1,134 @@
+"""
+Caché en disco de certificados ya generados, direccionada por contenido.
+
+La clave de cada PDF es una huella de todo lo que se dibuja: los campos de la
+fila, la fecha, la plantilla, sus estilos, la marca de agua y el backend. Al
+volver a subir una lista corregida sólo se generan las filas que cambiaron.
+La caché se recorta por tamaño borrando primero lo usado hace más tiempo, pero nunca
+los PDFs de la corrida que la recorta: si una planilla grande no entra en el tamaño
+máximo, se conserva entera igual (y se avisa) para que corregir un nombre y volver a
+correrla siga reutilizando el resto.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import uuid
+
+from certificados.render import TREBUCHET_AVAILABLE
+
+DIRECTORIO_CACHE = os.environ.get('CERTIFICADOS_CACHE') or os.path.join(tempfile.gettempdir(), 'certificados_cache')
+
+# Tamaño máximo de la caché en bytes (variable CERTIFICADOS_CACHE_MB, en megabytes). Cada PDF guardado lleva su
+# propio fondo (~100-350 KB según la variante), así que 500 MB son unos 1500-5000 certificados; la corrida
+# actual se conserva aunque no entre
+TAMANO_MAXIMO_CACHE = int(os.environ.get('CERTIFICADOS_CACHE_MB', 500)) * 1024 * 1024
+
+# Cambiar cuando cambie el dibujo de los certificados, para no reutilizar PDFs viejos
+VERSION_RENDER = 1
+
+
+def huella_contexto(contexto):
+    """Huella de la parte común a todos los certificados de un grupo"""
+    datos = [
+        VERSION_RENDER,
+        contexto['backend'],
+        contexto['plantilla_key'],
+        contexto['huella_plantilla'],
+        contexto['styles_config'],
+        contexto['huella_marca_agua'],
+        contexto['fecha'],
+        TREBUCHET_AVAILABLE,
+    ]
+    return hashlib.sha256(json.dumps(datos, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def clave_certificado(huella_grupo, nombre, curso, numero, horas_progresivo):
+    datos = [huella_grupo, nombre, curso, numero, horas_progresivo]
+    return hashlib.sha256(json.dumps(datos).encode('utf-8')).hexdigest()
+
+
+def ruta_certificado(clave, directorio=None):
+    return os.path.join(directorio or DIRECTORIO_CACHE, clave[:2], f"{clave}.pdf")
+
+
+def esta_en_cache(clave, directorio=None):
+    return os.path.exists(ruta_certificado(clave, directorio))
+
+
+def leer(clave, directorio=None):
+    """Bytes del PDF guardado con esa clave, o None si no está. Marca el archivo como usado recién"""
+    ruta = ruta_certificado(clave, directorio)
+    try:
+        with open(ruta, 'rb') as f:
+            pdf_bytes = f.read()
+        os.utime(ruta)
+        return pdf_bytes
+    except FileNotFoundError:
+        return None
+
+
+def guardar(clave, pdf_bytes, directorio=None):
+    """Guarda el PDF con esa clave. Devuelve False si no se pudo escribir; la caché nunca detiene la generación"""
+    ruta = ruta_certificado(clave, directorio)
+    # Se escribe aparte y se renombra, así otra sesión nunca lee un PDF a medias
+    ruta_parcial = f"{ruta}.{uuid.uuid4().hex}.part"
+    try:
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta_parcial, 'wb') as f:
+            f.write(pdf_bytes)
+        os.replace(ruta_parcial, ruta)
+        return True
+    except OSError:
+        if os.path.exists(ruta_parcial):
+            os.unlink(ruta_parcial)
+        return False
+
+
+def recortar_cache(directorio=None, tamano_maximo=None, claves_corrida=(), avisar=None):
+    """
+    Borra los PDFs usados hace más tiempo hasta que la caché no supere tamano_maximo. Los de `claves_corrida`
+    (los de la corrida que termina) no se borran: si solos superan tamano_maximo, la caché queda con ellos y
+    se avisa. Devuelve cuántos borró
+    """
+    directorio = directorio or DIRECTORIO_CACHE
+    tamano_maximo = TAMANO_MAXIMO_CACHE if tamano_maximo is None else tamano_maximo
+
+    if not os.path.isdir(directorio):
+        return 0
+
+    de_la_corrida = {f"{clave}.pdf" for clave in claves_corrida}
+    archivos = []
+    tamano_corrida = 0
+    for carpeta, _subcarpetas, nombres in os.walk(directorio):
+        for nombre in nombres:
+            if not nombre.endswith('.pdf'):
+                continue
+            ruta = os.path.join(carpeta, nombre)
+            try:
+                estado = os.stat(ruta)
+            except FileNotFoundError:
+                continue
+            if nombre in de_la_corrida:
+                tamano_corrida += estado.st_size
+            else:
+                archivos.append((estado.st_mtime, estado.st_size, ruta))
+
+    if tamano_corrida > tamano_maximo and avisar:
+        avisar('warning', f"⚠️ Los certificados de esta corrida ocupan {tamano_corrida / 1024 / 1024:.0f} MB en la "
+                          f"caché, más que su máximo ({tamano_maximo / 1024 / 1024:.0f} MB). Se conservan para "
+                          "reutilizarlos; sube CERTIFICADOS_CACHE_MB para guardar también los de otras planillas")
+
+    total = tamano_corrida + sum(tamano for _mtime, tamano, _ruta in archivos)
+    borrados = 0
+    for _mtime, tamano, ruta in sorted(archivos):
+        if total <= tamano_maximo:
+            break
+        try:
+            os.unlink(ruta)
+            borrados += 1
+        except FileNotFoundError:
+            # Otra sesión lo borró primero
+            pass
+        total -= tamano
+    return borrados
@@ -0,0 +1,64 @@
+"""
+Clasificación de estudiantes en los grupos que definen la plantilla de cada certificado.
+"""
+import numpy as np
+import pandas as pd
+
+GRADOS_GRUPO_3 = ['1p', '2p', '3p']
+GRADOS_GRUPO_4 = ['4p', '5p', '1s', '2s', '3s', '4s', '5s']
+
+
+def _sin_avisos(nivel, mensaje):
+    pass
+
+# Función para clasificar estudiantes por criterios
+def clasificar_estudiantes_por_nota(df, nombre_archivo, avisar=_sin_avisos):
+    grupos = {
+        'grupo_1': pd.DataFrame(),  # Progresivo
+        'grupo_2': pd.DataFrame(),  # Nota < 13 / Participación
+        'grupo_3': pd.DataFrame(),  # Nota ≥ 13 y Grado = v1
+        'grupo_4': pd.DataFrame()   # Nota ≥ 13 y Grado = v2
+    }
+
+    if 'nota final' not in df.columns:
+        avisar('error', "❌ No se encontró la columna 'NOTA FINAL' en el DataFrame")
+        return None
+
+    if 'grado' not in df.columns:
+        avisar('error', "❌ No se encontró la columna 'GRADO' en el DataFrame")
+        return None
+
+    # Verificar si el archivo empieza con "P"
+    archivo_empieza_con_p = nombre_archivo.upper().startswith('P')
+
+    if archivo_empieza_con_p:
+        # Si el archivo empieza con "P", todos los estudiantes van al grupo 1 (Progresivo)
+        grupos['grupo_1'] = df
+        avisar('info', "📋 **Archivo detectado con prefijo 'P'**: Todos los certificados usarán el formato Progresivo")
+
+    else:
+        # Etiqueta de grupo por fila en una sola pasada, sin tocar el DataFrame recibido
+        nota_final_num = pd.to_numeric(df['nota final'], errors='coerce').to_numpy()
+        grado = df['grado'].astype('string').str.lower().str.strip()
+        nota_alta = nota_final_num >= 13
+
+        etiquetas = np.select(
+            [
+                nota_final_num < 13,  # Grupo 2: Nota < 13 - Participación
+                nota_alta & grado.isin(GRADOS_GRUPO_3).to_numpy(dtype=bool),  # Grupo 3: Nota ≥ 13 y 1P-3P
+                nota_alta & grado.isin(GRADOS_GRUPO_4).to_numpy(dtype=bool),  # Grupo 4: Nota ≥ 13 y 4P-5S
+            ],
+            ['grupo_2', 'grupo_3', 'grupo_4'],
+            default='',
+        )
+
+        # Se ordena una sola vez por grupo (manteniendo el orden de la lista dentro de cada uno)
+        # y cada grupo es un tramo contiguo de ese orden, sin copias adicionales
+        orden = np.argsort(etiquetas, kind='stable')
+        etiquetas = etiquetas[orden]
+        df_ordenado = df.iloc[orden]
+        for grupo in ('grupo_2', 'grupo_3', 'grupo_4'):
+            inicio, fin = np.searchsorted(etiquetas, grupo, side='left'), np.searchsorted(etiquetas, grupo, side='right')
+            grupos[grupo] = df_ordenado.iloc[inicio:fin]
+
+    return grupos
@@ -0,0 +1,143 @@
+"""
+Generación de certificados por línea de comandos, sin Streamlit.
+
+Uso:
+    python -m certificados NOTAS_1.xlsx [NOTAS_2.csv carpeta/ planillas.zip ...] -o salida/ [--combinado TODO.zip]
+                           [--pdf grupo] [--workers N] [--backend pymupdf] [--variante correo] [--sin-cache]
+                           [--compresion 6] [--volumen-mb 25] [--volumen-por-carpeta] [--perfil muestreo]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+from certificados import metricas
+from certificados.eventos import crear_flujo, describir_avance, describir_fallas
+from certificados.lote import procesar_lote
+from certificados.motor import MODOS_SALIDA
+from certificados.empaquetado import opciones_empaque, ruta_resumen_metricas, rutas_volumenes
+from certificados.reanudacion import ruta_fallidos
+from certificados.render import AVISO_FUENTE
+from certificados.paralelo import BACKENDS
+from certificados.perfil import MODOS_PERFIL
+from certificados.variantes import VARIANTES, VARIANTE_POR_DEFECTO
+
+logger = logging.getLogger("certificados")
+
+# Una línea de avance cada 5 segundos como máximo, sin importar cuántas filas tenga el lote
+EVENTOS_LOG_POR_SEGUNDO = 0.2
+
+NIVELES_LOG = {
+    'info': logging.INFO,
+    'write': logging.INFO,
+    'success': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+    'fallo': logging.ERROR,
+}
+
+
+def avisar_log(nivel, mensaje):
+    logger.log(NIVELES_LOG.get(nivel, logging.INFO), mensaje)
+
+
+# Escribe en el log los eventos del flujo de la generación (ver eventos)
+def registrar_evento(evento):
+    if evento['tipo'] in ('avance', 'fin'):
+        logger.info("lote: %s", describir_avance(evento))
+    elif evento['tipo'] == 'fallas':
+        logger.error("%s", describir_fallas(evento))
+    else:
+        avisar_log(evento.get('nivel', 'info'), evento['mensaje'])
+
+
+def registrar_resumen(corrida):
+    resumen = metricas.resumen(corrida)
+    for etapa, datos in resumen['etapas'].items():
+        logger.info("   %-13s %8.3f s  %6d items  %10d bytes  %d errores", etapa, datos['segundos'], datos['cantidad'],
+                    datos['bytes'], datos['errores'])
+    if resumen['bytes_por_certificado']:
+        logger.info("   %.1f KB por certificado", resumen['bytes_por_certificado'] / 1024)
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(prog="python -m certificados",
+                                     description="Genera los ZIP de certificados a partir de las planillas de notas.")
+    parser.add_argument('archivos', nargs='+',
+                        help="Planillas de notas (.xlsx, .csv o .parquet), carpetas o ZIP con planillas a procesar")
+    parser.add_argument('-o', '--salida', default='.', help="Directorio donde se escriben los ZIP (por defecto: actual)")
+    parser.add_argument('--combinado', metavar='NOMBRE.zip',
+                        help="Escribe un solo ZIP con una carpeta por planilla en lugar de un ZIP por planilla")
+    parser.add_argument('--pdf', choices=MODOS_SALIDA, default='individual',
+                        help="Un PDF por estudiante (por defecto), uno por grupo o uno por planilla, con marcadores")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Procesos de render (por defecto: CERTIFICADOS_WORKERS o núcleos disponibles)")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='reportlab', help="Motor de render de los PDFs")
+    parser.add_argument('--variante', choices=sorted(VARIANTES), default=VARIANTE_POR_DEFECTO,
+                        help="Fondos para imprimir (originales) o para correo (150 dpi, PDFs unas tres veces más livianos)")
+    parser.add_argument('--compresion', type=int, choices=range(10), metavar='0-9', default=None,
+                        help="Nivel de compresión de los ZIP (por defecto CERTIFICADOS_COMPRESION o 0, sin comprimir)")
+    parser.add_argument('--volumen-mb', type=int, default=None,
+                        help="Parte cada ZIP en volúmenes de hasta este tamaño (en MB)")
+    parser.add_argument('--volumen-por-carpeta', action='store_true', default=None,
+                        help="Pone cada carpeta (por ejemplo Constancias/) en sus propios volúmenes")
+    parser.add_argument('--sin-cache', action='store_true',
+                        help="Genera todos los certificados sin usar ni actualizar la caché (CERTIFICADOS_CACHE)")
+    parser.add_argument('--perfil', choices=MODOS_PERFIL, default=None,
+                        help="Perfila la corrida y deja .perfil.pstats y .perfil.folded (flamegraph) en la salida")
+    parser.add_argument('--metricas', action='store_true',
+                        help="Escribe junto a cada ZIP un resumen JSON con los tiempos de cada etapa")
+    parser.add_argument('-q', '--silencioso', action='store_true', help="Sólo muestra advertencias y errores")
+    return parser
+
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+    logging.basicConfig(level=logging.WARNING if args.silencioso else logging.INFO, format="%(message)s")
+
+    if AVISO_FUENTE:
+        avisar_log(*AVISO_FUENTE)
+
+    inicio = time.perf_counter()
+    al_avanzar, avisar, terminar = crear_flujo(registrar_evento, EVENTOS_LOG_POR_SEGUNDO)
+    resultados = procesar_lote(args.archivos, args.salida, args.combinado, al_avanzar, avisar,
+                               args.workers, args.backend, not args.sin_cache, args.variante, args.pdf,
+                               opciones_empaque(args.compresion, args.volumen_mb, args.volumen_por_carpeta),
+                               args.perfil)
+    terminar()
+    if not resultados:
+        logger.error("❌ No se encontraron planillas para procesar")
+        return 1
+
+    fallidos = 0
+    for resultado in resultados:
+        nombre_archivo, corrida = resultado['nombre_archivo'], resultado['corrida']
+        if corrida is not None:
+            if args.metricas:
+                # Junto al ZIP de la planilla; en el combinado (un solo ZIP) con el nombre que tendría el suyo
+                ruta_metricas = resultado['ruta_zip']
+                if args.combinado:
+                    ruta_metricas = os.path.join(args.salida, resultado['nombre_zip'])
+                metricas.escribir_resumen(corrida, ruta_resumen_metricas(ruta_metricas))
+            registrar_resumen(corrida)
+        if resultado['generados'] is None:
+            fallidos += 1
+            logger.error("❌ %s: no se generaron certificados", nombre_archivo)
+            continue
+
+        logger.info("🎉 %s: %d certificados en %s", nombre_archivo, resultado['generados'], resultado['ruta_zip'])
+        volumenes = rutas_volumenes(resultado['ruta_zip'])
+        if volumenes != [resultado['ruta_zip']]:
+            for ruta in volumenes:
+                logger.info("   📦 %s (%.1f MB)", ruta, os.path.getsize(ruta) / 1024 / 1024)
+        if os.path.exists(ruta_fallidos(resultado['ruta_zip'])):
+            logger.warning("⚠️ %s: las filas que fallaron están en %s; vuelve a correr el mismo comando para "
+                           "reintentarlas", nombre_archivo, ruta_fallidos(resultado['ruta_zip']))
+
+    logger.info("%d planillas en %.1f s", len(resultados), time.perf_counter() - inicio)
+    return 1 if fallidos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
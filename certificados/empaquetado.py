@@ -0,0 +1,451 @@
+"""
+Escritura de los ZIP de certificados directamente a disco.
+
+Los archivos se guardan en un directorio de salida y se borran pasado un
+tiempo de vida (TTL), así las sesiones sólo guardan la ruta y no el ZIP.
+
+El empaquetado se configura con opciones_empaque: nivel de compresión (las
+entradas se comprimen en varios hilos y las que casi no se achican, como los
+PDF con imágenes ya comprimidas, se guardan tal cual) y reparto en volúmenes
+por tamaño o por carpeta. Sin volúmenes la salida es exactamente `ruta_zip`;
+con volúmenes la lista queda en `<zip>.volumenes.json` (ver rutas_volumenes).
+
+Cada ZIP (o volumen) termina con un MANIFIESTO.json que sirve de índice: qué
+certificado está en qué entrada, en qué offset y con qué sha256 (ver indice).
+
+Los ZIP los escribe EscritorZip siguiendo el formato (APPNOTE de PKWARE) y no
+zipfile, que no tiene cómo agregar entradas ya comprimidas sin tocar sus partes
+internas. Cualquier lector de ZIP (zipfile incluido) los abre.
+"""
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import time
+import uuid
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from zipfile import ZIP_DEFLATED, ZIP_STORED
+
+DIRECTORIO_SALIDA = os.environ.get('CERTIFICADOS_SALIDA') or os.path.join(tempfile.gettempdir(), 'certificados')
+
+# Segundos que se conserva un ZIP generado antes de borrarlo
+TTL_ARCHIVOS = int(os.environ.get('CERTIFICADOS_TTL', 3600))
+
+# Nivel de compresión de las entradas: 0 las guarda sin comprimir, 1-9 es el nivel de deflate
+COMPRESION = int(os.environ.get('CERTIFICADOS_COMPRESION', 0))
+
+# Tamaño máximo de cada volumen en MB (0 = un solo ZIP) y si cada carpeta va en sus propios volúmenes
+VOLUMEN_MB = int(os.environ.get('CERTIFICADOS_VOLUMEN_MB', 0))
+VOLUMEN_POR_CARPETA = os.environ.get('CERTIFICADOS_VOLUMEN_POR_CARPETA', '0') not in ('', '0')
+
+# Hilos que comprimen entradas (zlib suelta el GIL mientras comprime)
+HILOS_COMPRESION = int(os.environ.get('CERTIFICADOS_HILOS_ZIP', 0)) or os.cpu_count() or 1
+
+# Una entrada que no se achica al menos esta fracción se guarda sin comprimir
+GANANCIA_MINIMA = 0.1
+
+NOMBRE_MANIFIESTO = 'MANIFIESTO.json'
+
+_executor = None
+
+
+def opciones_empaque(compresion=None, volumen_mb=None, por_carpeta=None):
+    """Opciones de empaquetado; las que no se pasan salen de las variables de entorno"""
+    return {
+        'compresion': COMPRESION if compresion is None else compresion,
+        'volumen_mb': VOLUMEN_MB if volumen_mb is None else volumen_mb,
+        'por_carpeta': VOLUMEN_POR_CARPETA if por_carpeta is None else por_carpeta,
+    }
+
+
+def _obtener_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=HILOS_COMPRESION, thread_name_prefix='compresion')
+    return _executor
+
+
+def comprimir_entrada(datos, nivel):
+    """(datos en deflate crudo, crc32), o None si no se achican lo suficiente y conviene guardarlos tal cual"""
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, -15)
+    comprimido = compresor.compress(datos) + compresor.flush()
+    if len(comprimido) > len(datos) * (1 - GANANCIA_MINIMA):
+        return None
+    return comprimido, zlib.crc32(datos)
+
+
+# Registros del formato ZIP: encabezado local, entrada del directorio central, fin del directorio (y sus
+# versiones ZIP64, para cuando el ZIP pasa de 4 GB o de 65535 entradas)
+_ENCABEZADO_LOCAL = struct.Struct('<4s5H3L2H')
+_ENTRADA_DIRECTORIO = struct.Struct('<4s4B4H3L5H2L')
+_FIN_DIRECTORIO = struct.Struct('<4s4H2LH')
+_FIN_DIRECTORIO_64 = struct.Struct('<4sQ2H2L4Q')
+_UBICACION_FIN_64 = struct.Struct('<4sLQL')
+_EXTRA_64 = struct.Struct('<2HQ')
+_LIMITE_32 = 0xFFFFFFFF
+_LIMITE_ENTRADAS = 0xFFFF
+
+# Versión 2.0 (deflate y carpetas) o 4.5 (ZIP64), hecho en Unix; nombres en UTF-8
+_VERSION, _VERSION_64, _SISTEMA_UNIX, _NOMBRE_UTF8 = 20, 45, 3, 0x800
+
+
+def _fecha_dos(segundos):
+    anio, mes, dia, hora, minuto, segundo = time.localtime(segundos)[:6]
+    return (hora << 11) | (minuto << 5) | (segundo // 2), (max(anio, 1980) - 1980) << 9 | (mes << 5) | dia
+
+
+# Función para saber cuánto ocupa una entrada en el ZIP: encabezado local, nombre y datos (`largo`, ya comprimidos)
+def _bytes_local(nombre, largo):
+    return _ENCABEZADO_LOCAL.size + len(nombre.encode('utf-8')) + largo
+
+
+# Función para saber cuánto ocupa en el directorio central una entrada que empieza en `offset`
+def _bytes_directorio(nombre, offset):
+    return _ENTRADA_DIRECTORIO.size + len(nombre.encode('utf-8')) + (_EXTRA_64.size if offset >= _LIMITE_32 else 0)
+
+
+# Función para saber cuánto suman estas filas a una lista del manifiesto (json con indent=1): cada línea va con
+# dos espacios más de sangría y cada fila con su separador ",\n"
+def _bytes_manifiesto(filas):
+    total = 0
+    for fila in filas:
+        texto = json.dumps(fila, ensure_ascii=False, indent=1)
+        total += len(texto.encode('utf-8')) + 2 * (texto.count('\n') + 1) + 2
+    return total
+
+
+def _fila_manifiesto(entrada, sha256):
+    return {'nombre': entrada['nombre'], 'bytes': entrada['bytes'], 'comprimido': entrada['comprimido'],
+            'offset': entrada['offset'], 'crc32': f"{entrada['crc']:08x}", 'sha256': sha256}
+
+
+class EscritorZip:
+    """
+    Escribe un ZIP entrada por entrada, con los datos tal cual o ya comprimidos en deflate crudo.
+    `tamano` son los bytes escritos (el offset de la próxima entrada) y `directorio` las entradas escritas:
+    con los dos se retoma el archivo donde quedó (ver reanudacion)
+    """
+
+    def __init__(self, ruta, directorio=None, tamano=0):
+        self.ruta = ruta
+        self.directorio = list(directorio or [])
+        self.tamano = tamano
+        self._archivo = open(ruta, 'r+b' if tamano else 'wb')
+        self._archivo.seek(tamano)
+        self._archivo.truncate()
+
+    def namelist(self):
+        return [entrada['nombre'] for entrada in self.directorio]
+
+    def agregar(self, nombre, datos, comprimido=None, crc=None):
+        """Escribe una entrada; con `comprimido` (y el crc32 de `datos`) se guarda esa versión en deflate"""
+        carpeta = nombre.endswith('/')
+        hora, fecha = _fecha_dos(time.time())
+        entrada = {
+            'nombre': nombre, 'metodo': ZIP_DEFLATED if comprimido is not None else ZIP_STORED,
+            'crc': zlib.crc32(datos) if crc is None else crc, 'bytes': len(datos),
+            'comprimido': len(comprimido if comprimido is not None else datos), 'offset': self.tamano,
+            'hora': hora, 'fecha': fecha,
+            # Permisos rw------- para archivos y rwxrwxr-x (más el atributo de carpeta de DOS) para carpetas
+            'atributos': (0o40775 << 16) | 0x10 if carpeta else 0o600 << 16,
+        }
+        if entrada['comprimido'] >= _LIMITE_32 or entrada['bytes'] >= _LIMITE_32:
+            raise ValueError(f"{nombre}: una entrada de más de 4 GB no se puede guardar")
+        nombre_bytes = nombre.encode('utf-8')
+        self._archivo.write(_ENCABEZADO_LOCAL.pack(
+            b'PK\x03\x04', _VERSION, _NOMBRE_UTF8, entrada['metodo'], hora, fecha, entrada['crc'],
+            entrada['comprimido'], entrada['bytes'], len(nombre_bytes), 0))
+        self._archivo.write(nombre_bytes)
+        self._archivo.write(comprimido if comprimido is not None else datos)
+        self.tamano += _bytes_local(nombre, entrada['comprimido'])
+        self.directorio.append(entrada)
+        return entrada
+
+    def _escribir_directorio(self):
+        # El directorio central y su fin van después de la última entrada; no cambian `tamano`
+        inicio = self.tamano
+        for entrada in self.directorio:
+            nombre_bytes = entrada['nombre'].encode('utf-8')
+            extra = b''
+            offset, version = entrada['offset'], _VERSION
+            if offset >= _LIMITE_32:
+                extra, offset, version = _EXTRA_64.pack(1, 8, offset), _LIMITE_32, _VERSION_64
+            self._archivo.write(_ENTRADA_DIRECTORIO.pack(
+                b'PK\x01\x02', version, _SISTEMA_UNIX, version, 0, _NOMBRE_UTF8, entrada['metodo'], entrada['hora'],
+                entrada['fecha'], entrada['crc'], entrada['comprimido'], entrada['bytes'], len(nombre_bytes),
+                len(extra), 0, 0, 0, entrada['atributos'], offset))
+            self._archivo.write(nombre_bytes)
+            self._archivo.write(extra)
+        fin = self._archivo.tell()
+        cantidad, largo = len(self.directorio), fin - inicio
+
+        if cantidad >= _LIMITE_ENTRADAS or inicio >= _LIMITE_32 or largo >= _LIMITE_32:
+            self._archivo.write(_FIN_DIRECTORIO_64.pack(
+                b'PK\x06\x06', _FIN_DIRECTORIO_64.size - 12, _VERSION_64, _VERSION_64, 0, 0, cantidad, cantidad,
+                largo, inicio))
+            self._archivo.write(_UBICACION_FIN_64.pack(b'PK\x06\x07', 0, fin, 1))
+            cantidad, largo, inicio = min(cantidad, _LIMITE_ENTRADAS), min(largo, _LIMITE_32), _LIMITE_32
+        self._archivo.write(_FIN_DIRECTORIO.pack(b'PK\x05\x06', 0, 0, cantidad, cantidad, largo, inicio, 0))
+
+    def sincronizar(self):
+        """Asegura en disco los `tamano` bytes escritos; con eso y `directorio` el archivo se puede retomar"""
+        self._archivo.flush()
+        os.fsync(self._archivo.fileno())
+
+    def close(self):
+        if self._archivo.closed:
+            return
+        try:
+            self._escribir_directorio()
+        finally:
+            self._archivo.close()
+
+    def abandonar(self):
+        # Cierra sin escribir el directorio: el archivo se va a borrar o a retomar desde su último punto de control
+        self._archivo.close()
+
+
+def ruta_volumenes(ruta_zip):
+    return os.path.splitext(ruta_zip)[0] + '.volumenes.json'
+
+
+def rutas_volumenes(ruta_zip):
+    """Archivos ZIP que forman la salida de ruta_zip: los volúmenes si se repartió, si no ruta_zip"""
+    try:
+        with open(ruta_volumenes(ruta_zip), encoding='utf-8') as f:
+            volumenes = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return [ruta_zip]
+    directorio = os.path.dirname(ruta_zip)
+    return [os.path.join(directorio, volumen['archivo']) for volumen in volumenes]
+
+
+def tamano_salida(ruta_zip):
+    return sum(os.path.getsize(ruta) for ruta in rutas_volumenes(ruta_zip) if os.path.exists(ruta))
+
+
+class ZipVolumenes:
+    """
+    Se usa como el ZipFile de escribir_zip (writestr). Comprime las entradas en el pool de hilos y las
+    escribe en orden, repartidas en volúmenes según `empaque` (opciones_empaque)
+    """
+
+    def __init__(self, ruta_zip, empaque=None):
+        self.ruta_zip = ruta_zip
+        self.empaque = empaque or opciones_empaque()
+        self.reparte = bool(self.empaque['volumen_mb'] or self.empaque['por_carpeta'])
+        self.volumenes = []
+        self._actual = {}
+        self._pendientes = deque()
+        # Carpetas que todavía no tienen archivos: con volúmenes se crean junto con el primero
+        self._carpetas = {}
+
+    def _ruta_parcial(self, indice):
+        if not self.reparte:
+            return self.ruta_zip + '.part'
+        return f"{os.path.splitext(self.ruta_zip)[0]}.vol{indice}.zip.part"
+
+    def _nuevo_volumen(self, clave, zip_file=None, **datos):
+        numero = sum(1 for volumen in self.volumenes if volumen['clave'] == clave) + 1
+        # `reserva`: lo que falta escribir al cerrar (directorio central, su fin y el manifiesto), contado en bytes
+        volumen = {'clave': clave, 'numero': numero, 'ruta_parcial': self._ruta_parcial(len(self.volumenes)),
+                   'reserva': self._reserva_inicial(clave), 'entradas': [], 'certificados': []}
+        volumen.update(datos)
+        volumen['zip'] = zip_file or EscritorZip(volumen['ruta_parcial'])
+        self.volumenes.append(volumen)
+        self._actual[clave] = volumen
+        return volumen
+
+    def _clave(self, nombre):
+        return nombre.rsplit('/', 1)[0] if self.empaque['por_carpeta'] and '/' in nombre else ''
+
+    def _reserva_inicial(self, clave):
+        # Lo fijo de cerrar un volumen: el fin del directorio (con sus registros ZIP64), la entrada del manifiesto
+        # y el envoltorio del manifiesto, con el nombre de volumen más largo posible
+        sufijo = f"_{clave.replace('/', '_')}" if clave else ""
+        nombre = os.path.basename(f"{os.path.splitext(self.ruta_zip)[0]}{sufijo}_999999.zip")
+        envoltorio = json.dumps({'volumen': nombre, 'numero': 999999, 'total': 999999, 'entradas': [],
+                                 'certificados': []}, ensure_ascii=False, indent=1)
+        # Cada lista con filas pasa de "[]" a "[\n" ... "\n ]"
+        largo = len(envoltorio.encode('utf-8')) + 2 * 3
+        return (_FIN_DIRECTORIO.size + _FIN_DIRECTORIO_64.size + _UBICACION_FIN_64.size
+                + _bytes_local(NOMBRE_MANIFIESTO, largo) + _bytes_directorio(NOMBRE_MANIFIESTO, _LIMITE_32))
+
+    def _tamano_con(self, volumen, nombre, largo, fila, bytes_certificados):
+        # Bytes del volumen ya cerrado si se le agrega esta entrada (y las carpetas que esperan con ella)
+        offset, directorio = volumen['zip'].tamano, 0
+        for carpeta in self._carpetas.get(volumen['clave'], []):
+            directorio += _bytes_directorio(carpeta, offset)
+            offset += _bytes_local(carpeta, 0)
+        fila = dict(fila, offset=offset)
+        return (offset + _bytes_local(nombre, largo) + _bytes_directorio(nombre, offset) + volumen['reserva']
+                + directorio + _bytes_manifiesto([fila]) + bytes_certificados)
+
+    def _volumen(self, nombre, largo, fila, bytes_certificados):
+        clave = self._clave(nombre)
+        volumen = self._actual.get(clave)
+        limite = self.empaque['volumen_mb'] * 1024 * 1024
+        if volumen is None or (limite and volumen['entradas']
+                               and self._tamano_con(volumen, nombre, largo, fila, bytes_certificados) > limite):
+            volumen = self._nuevo_volumen(clave)
+        return volumen
+
+    def writestr(self, nombre, datos, certificados=None):
+        """Como ZipFile.writestr; `certificados` son los registros del índice que van en esta entrada"""
+        if isinstance(datos, str):
+            datos = datos.encode('utf-8')
+        futuro = None
+        if self.empaque['compresion'] and not nombre.endswith('/'):
+            futuro = _obtener_executor().submit(comprimir_entrada, datos, self.empaque['compresion'])
+        self._pendientes.append((nombre, datos, futuro, certificados or []))
+        self._escribir_listas()
+
+    def _escribir_listas(self, todas=False):
+        # Se escriben en orden; a lo sumo dos entradas por hilo esperan comprimidas en memoria
+        limite = 0 if todas else 2 * HILOS_COMPRESION
+        while self._pendientes and (len(self._pendientes) > limite or self._pendientes[0][2] is None
+                                    or self._pendientes[0][2].done()):
+            nombre, datos, futuro, certificados = self._pendientes.popleft()
+            if self.reparte and nombre.endswith('/'):
+                self._carpetas.setdefault(self._clave(nombre), []).append(nombre)
+                continue
+            comprimido = futuro.result() if futuro else None
+            largo = len(comprimido[0]) if comprimido else len(datos)
+            sha256 = hashlib.sha256(datos).hexdigest()
+            registros = [dict(certificado, entrada=nombre) for certificado in certificados]
+            bytes_certificados = _bytes_manifiesto(registros)
+            # El offset de la fila lo pone _tamano_con; el crc32 ocupa siempre 8 caracteres
+            fila = _fila_manifiesto({'nombre': nombre, 'bytes': len(datos), 'comprimido': largo, 'offset': 0,
+                                     'crc': 0}, sha256)
+            volumen = self._volumen(nombre, largo, fila, bytes_certificados)
+            for carpeta in self._carpetas.pop(volumen['clave'], []):
+                entrada = volumen['zip'].agregar(carpeta, b'')
+                volumen['reserva'] += _bytes_directorio(carpeta, entrada['offset'])
+            entrada = volumen['zip'].agregar(nombre, datos, *(comprimido or ()))
+            volumen['reserva'] += _bytes_directorio(nombre, entrada['offset'])
+            if not nombre.endswith('/'):
+                fila = _fila_manifiesto(entrada, sha256)
+                volumen['entradas'].append(fila)
+                volumen['certificados'].extend(registros)
+                volumen['reserva'] += _bytes_manifiesto([fila]) + bytes_certificados
+
+    def nombres_finales(self):
+        """Nombre final de cada volumen: <zip>[_<carpeta>][_<número>].zip"""
+        base = os.path.splitext(self.ruta_zip)[0]
+        por_clave = {}
+        for volumen in self.volumenes:
+            por_clave[volumen['clave']] = por_clave.get(volumen['clave'], 0) + 1
+        nombres = []
+        for volumen in self.volumenes:
+            sufijo = f"_{volumen['clave'].replace('/', '_')}" if volumen['clave'] else ""
+            if por_clave[volumen['clave']] > 1:
+                sufijo += f"_{volumen['numero']}"
+            nombres.append(f"{base}{sufijo}.zip")
+        return nombres
+
+    def cerrar(self):
+        """Termina de escribir, agrega el manifiesto de cada volumen y les da su nombre final. Devuelve las rutas"""
+        self._escribir_listas(todas=True)
+        if not self.volumenes:
+            self._nuevo_volumen('')
+        rutas = self.nombres_finales()
+        for i, (volumen, ruta) in enumerate(zip(self.volumenes, rutas), 1):
+            manifiesto = {'volumen': os.path.basename(ruta), 'numero': i, 'total': len(rutas),
+                          'entradas': volumen['entradas'], 'certificados': volumen['certificados']}
+            volumen['zip'].agregar(NOMBRE_MANIFIESTO,
+                                   json.dumps(manifiesto, ensure_ascii=False, indent=1).encode('utf-8'))
+            volumen['zip'].close()
+            os.replace(volumen['ruta_parcial'], ruta)
+
+        # Volúmenes de una corrida anterior con el mismo nombre que esta vez no se generaron
+        anteriores = set(rutas_volumenes(self.ruta_zip)) - set(rutas)
+        for ruta in anteriores:
+            if os.path.exists(ruta):
+                os.unlink(ruta)
+        if rutas == [self.ruta_zip]:
+            if os.path.exists(ruta_volumenes(self.ruta_zip)):
+                os.unlink(ruta_volumenes(self.ruta_zip))
+        else:
+            with open(ruta_volumenes(self.ruta_zip), 'w', encoding='utf-8') as f:
+                json.dump([{'archivo': os.path.basename(ruta), 'entradas': len(volumen['entradas']),
+                            'bytes': os.path.getsize(ruta)} for volumen, ruta in zip(self.volumenes, rutas)], f)
+        self.rutas = rutas
+        return rutas
+
+    def descartar(self):
+        # Cierra y borra los volúmenes a medio escribir
+        for _nombre, _datos, futuro, _certificados in self._pendientes:
+            if futuro:
+                futuro.cancel()
+        self._pendientes.clear()
+        for volumen in self.volumenes:
+            try:
+                volumen['zip'].abandonar()
+            except OSError:
+                pass
+            if os.path.exists(volumen['ruta_parcial']):
+                os.unlink(volumen['ruta_parcial'])
+
+
+def crear_ruta_zip(directorio=None):
+    """Devuelve una ruta nueva y única para un ZIP dentro del directorio de salida"""
+    directorio = directorio or DIRECTORIO_SALIDA
+    os.makedirs(directorio, exist_ok=True)
+    return os.path.join(directorio, f"{uuid.uuid4().hex}.zip")
+
+
+@contextmanager
+def escribir_zip(ruta_zip, empaque=None):
+    """
+    Abre un ZipVolumenes que escribe cada entrada directo al disco.
+    Los archivos se escriben como .part y sólo toman su nombre final si termina sin errores.
+    """
+    zip_file = ZipVolumenes(ruta_zip, empaque)
+    try:
+        yield zip_file
+        zip_file.cerrar()
+    finally:
+        zip_file.descartar()
+
+
+def ruta_resumen_metricas(ruta_zip):
+    """Resumen JSON de las métricas de la corrida que generó el ZIP; vence junto con él"""
+    return os.path.splitext(ruta_zip)[0] + '.metricas.json'
+
+
+def zip_disponible(ruta_zip):
+    return bool(ruta_zip) and all(os.path.exists(ruta) for ruta in rutas_volumenes(ruta_zip))
+
+
+def limpiar_archivos_vencidos(directorio=None, ttl=None, ahora=None):
+    """
+    Borra los ZIP (con sus restos .part, resúmenes de métricas, estados de trabajo, puntos de control, filas
+    fallidas y perfiles) del directorio de salida con más de `ttl` segundos.
+    Devuelve cuántos borró
+    """
+    directorio = directorio or DIRECTORIO_SALIDA
+    ttl = TTL_ARCHIVOS if ttl is None else ttl
+    ahora = time.time() if ahora is None else ahora
+
+    if not os.path.isdir(directorio):
+        return 0
+
+    borrados = 0
+    for nombre in os.listdir(directorio):
+        if not nombre.endswith(('.zip', '.zip.part', '.metricas.json', '.trabajo.json', '.control.json',
+                                '.fallidos.json', '.entrada.json', '.volumenes.json', '.perfil.pstats',
+                                '.perfil.folded')):
+            continue
+        ruta = os.path.join(directorio, nombre)
+        try:
+            if ahora - os.path.getmtime(ruta) > ttl:
+                os.unlink(ruta)
+                borrados += 1
+        except FileNotFoundError:
+            # Otra sesión lo borró primero
+            pass
+    return borrados
@@ -0,0 +1,133 @@
+"""
+Flujo de eventos de la generación: etapas, avance, fallas, velocidad y tiempo restante.
+
+El motor informa con `al_avanzar(procesados, total)` después de cada certificado y con
+`avisar(nivel, mensaje)`. crear_flujo convierte esas llamadas en eventos (dicts) y se los
+entrega a `entregar` con un límite de eventos por segundo, así el costo de informar no
+crece con la cantidad de filas:
+
+    {'tipo': 'etapa', 'estado': 'inicio' | 'fin', 'mensaje'}   un grupo (o PDF combinado) empieza o termina
+    {'tipo': 'avance', 'procesados', 'total', 'por_segundo', 'eta'}
+    {'tipo': 'fallas', 'cantidad', 'ejemplos'}                  resumen de los certificados que fallaron
+    {'tipo': 'aviso', 'nivel', 'mensaje'}                       info, advertencias y errores generales
+    {'tipo': 'fin', ...los de 'avance', 'fallas'}               al terminar, con lo que quedó pendiente
+
+Los de avance y fallas salen como mucho EVENTOS_POR_SEGUNDO veces por segundo; los
+demás salen en el momento porque son pocos (uno por grupo). Todos llevan 'segundos'
+desde el inicio del flujo.
+"""
+import os
+import time
+from collections import deque
+
+# Eventos de avance por segundo como máximo (la página consulta el estado una vez por segundo)
+EVENTOS_POR_SEGUNDO = float(os.environ.get('CERTIFICADOS_EVENTOS_POR_SEGUNDO', 4))
+
+# Segundos de avance con los que se calcula la velocidad (y con ella el tiempo restante)
+VENTANA_VELOCIDAD = 10.0
+
+# Errores que se guardan como ejemplo en el resumen de fallas
+EJEMPLOS_FALLAS = 5
+
+# Niveles de avisar que marcan el inicio y el fin de una etapa, y el de un certificado que falló
+NIVEL_INICIO_ETAPA = 'write'
+NIVEL_FIN_ETAPA = 'success'
+NIVEL_FALLO = 'fallo'
+
+
+def crear_flujo(entregar, eventos_por_segundo=None, reloj=time.monotonic):
+    """
+    Devuelve (al_avanzar, avisar, terminar) para pasarle al motor. terminar() entrega las fallas pendientes y el
+    evento 'fin' (con el avance final), y lo devuelve
+    """
+    intervalo = 1 / (eventos_por_segundo or EVENTOS_POR_SEGUNDO)
+    inicio = reloj()
+    estado = {
+        'procesados': 0, 'total': 0, 'ultimo_envio': None, 'muestras': deque([(inicio, 0)]),
+        'fallas': 0, 'fallas_enviadas': 0, 'ejemplos': [],
+    }
+
+    def _avance(ahora):
+        # Velocidad en la ventana reciente: no la falsean las filas retomadas de un punto de control al empezar
+        muestras = estado['muestras']
+        muestras.append((ahora, estado['procesados']))
+        while len(muestras) > 2 and ahora - muestras[1][0] >= VENTANA_VELOCIDAD:
+            muestras.popleft()
+        segundos, procesados = ahora - muestras[0][0], estado['procesados'] - muestras[0][1]
+        por_segundo = procesados / segundos if segundos > 0 and procesados > 0 else None
+        faltan = max(estado['total'] - estado['procesados'], 0)
+        return {
+            'tipo': 'avance', 'segundos': ahora - inicio, 'procesados': estado['procesados'], 'total': estado['total'],
+            'por_segundo': por_segundo, 'eta': faltan / por_segundo if por_segundo else None,
+        }
+
+    def _fallas(ahora):
+        return {'tipo': 'fallas', 'segundos': ahora - inicio, 'cantidad': estado['fallas'],
+                'ejemplos': list(estado['ejemplos'])}
+
+    def _enviar_fallas(ahora):
+        if estado['fallas'] != estado['fallas_enviadas']:
+            estado['fallas_enviadas'] = estado['fallas']
+            entregar(_fallas(ahora))
+
+    def _enviar(ahora):
+        estado['ultimo_envio'] = ahora
+        entregar(_avance(ahora))
+        _enviar_fallas(ahora)
+
+    def al_avanzar(procesados, total):
+        estado['procesados'], estado['total'] = procesados, total
+        ahora = reloj()
+        if estado['ultimo_envio'] is None or ahora - estado['ultimo_envio'] >= intervalo:
+            _enviar(ahora)
+
+    def avisar(nivel, mensaje):
+        ahora = reloj()
+        if nivel == NIVEL_FALLO:
+            estado['fallas'] += 1
+            if len(estado['ejemplos']) < EJEMPLOS_FALLAS:
+                estado['ejemplos'].append(mensaje)
+        elif nivel in (NIVEL_INICIO_ETAPA, NIVEL_FIN_ETAPA):
+            entregar({'tipo': 'etapa', 'segundos': ahora - inicio, 'mensaje': mensaje,
+                      'estado': 'inicio' if nivel == NIVEL_INICIO_ETAPA else 'fin'})
+        else:
+            entregar({'tipo': 'aviso', 'segundos': ahora - inicio, 'nivel': nivel, 'mensaje': mensaje})
+
+    def terminar():
+        ahora = reloj()
+        _enviar_fallas(ahora)
+        fin = dict(_avance(ahora), tipo='fin', fallas=_fallas(ahora))
+        entregar(fin)
+        return fin
+
+    return al_avanzar, avisar, terminar
+
+
+def formato_duracion(segundos):
+    """'45 s', '3 min 20 s', '1 h 05 min'"""
+    segundos = int(round(segundos))
+    if segundos < 60:
+        return f"{segundos} s"
+    if segundos < 3600:
+        return f"{segundos // 60} min {segundos % 60:02d} s"
+    return f"{segundos // 3600} h {segundos % 3600 // 60:02d} min"
+
+
+def describir_avance(evento):
+    """'1200 de 4000 certificados · 85.3/s · faltan ~33 s' a partir de un evento de avance (o fin)"""
+    texto = f"{evento['procesados']} de {evento['total']} certificados"
+    if evento.get('por_segundo'):
+        texto += f" · {evento['por_segundo']:.1f}/s"
+    if evento.get('eta') and evento['procesados'] < evento['total']:
+        texto += f" · faltan ~{formato_duracion(evento['eta'])}"
+    return texto
+
+
+def describir_fallas(fallas):
+    """'❌ 37 certificados no se pudieron generar', con los primeros errores como ejemplo"""
+    texto = f"❌ {fallas['cantidad']} certificados no se pudieron generar"
+    if fallas['ejemplos']:
+        texto += ". Por ejemplo: " + "; ".join(fallas['ejemplos'])
+        if fallas['cantidad'] > len(fallas['ejemplos']):
+            texto += "; ..."
+    return texto
@@ -0,0 +1,172 @@
+"""
+Búsqueda y extracción de certificados sueltos a partir del índice de cada ZIP.
+
+Cada ZIP (o cada volumen) lleva un MANIFIESTO.json con dos tablas:
+
+    entradas      por archivo del ZIP: nombre, bytes, comprimido, offset del encabezado local, crc32 y sha256
+    certificados  por fila: fila de la planilla, numeración, nombre, nombre normalizado, curso, plantilla,
+                  grupo, entrada del ZIP que lo contiene y página (1 salvo en los PDF combinados)
+
+Para extraer un certificado se lee el manifiesto y se va directo al offset de su
+entrada, sin recorrer ni descomprimir el resto del ZIP; el contenido se valida
+contra el sha256 del índice.
+
+Uso:
+    python -m certificados.indice SALIDA.zip [VOLUMEN_2.zip ...] [--nombre "ana perez"] [--numero N-00012]
+                                  [--fila 15] [-x carpeta/]
+"""
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import unicodedata
+import zlib
+from zipfile import ZIP_DEFLATED, ZIP_STORED, BadZipFile, ZipFile
+
+from certificados.empaquetado import NOMBRE_MANIFIESTO, rutas_volumenes
+
+# Encabezado local de una entrada ZIP: firma, versión, flags, método, hora, fecha, crc, tamaños y largos
+_ENCABEZADO_LOCAL = struct.Struct('<4s5H3L2H')
+
+
+def normalizar_nombre(texto):
+    """Mayúsculas, sin tildes y con un solo espacio entre palabras: 'José  Pérez' -> 'JOSE PEREZ'"""
+    descompuesto = unicodedata.normalize('NFKD', str(texto))
+    sin_tildes = ''.join(caracter for caracter in descompuesto if not unicodedata.combining(caracter))
+    return ' '.join(sin_tildes.upper().split())
+
+
+def registro_certificado(plan, indice, pagina=1):
+    """Fila `indice` del plan como registro del índice; la entrada del ZIP se agrega al escribirla"""
+    nombre, curso, numero = plan['filas'][indice][:3]
+    return {
+        'fila': plan['filas_planilla'][indice], 'numeracion': numero, 'nombre': nombre,
+        'nombre_normalizado': normalizar_nombre(nombre), 'curso': curso, 'plantilla': plan['plantilla_key'],
+        'grupo': plan['grupo'], 'pagina': pagina,
+    }
+
+
+def leer_manifiesto(ruta_zip):
+    """Manifiesto del ZIP, o None si el ZIP no tiene índice (por ejemplo, uno generado antes de que existiera)"""
+    try:
+        with ZipFile(ruta_zip) as zip_file:
+            manifiesto = json.loads(zip_file.read(NOMBRE_MANIFIESTO))
+    except (KeyError, BadZipFile, ValueError):
+        return None
+    return manifiesto if 'certificados' in manifiesto else None
+
+
+def _expandir(rutas):
+    # La ruta de salida de un ZIP repartido (la de su .volumenes.json) se busca en todos sus volúmenes
+    vistas = []
+    for ruta in rutas:
+        for volumen in rutas_volumenes(ruta):
+            if volumen not in vistas:
+                vistas.append(volumen)
+    return vistas
+
+
+def buscar_certificados(rutas, nombre=None, numeracion=None, fila=None, avisar=None):
+    """
+    Certificados del índice de los ZIP de `rutas` que cumplen todos los criterios dados. `nombre` coincide si
+    todas sus palabras están en el nombre (sin importar tildes ni mayúsculas).
+    Cada resultado es el registro del certificado con 'ruta_zip' y 'datos_entrada' (su fila de 'entradas')
+    """
+    palabras = normalizar_nombre(nombre).split() if nombre else []
+    resultados = []
+    for ruta_zip in _expandir(rutas):
+        manifiesto = leer_manifiesto(ruta_zip)
+        if manifiesto is None:
+            if avisar:
+                avisar('warning', f"⚠️ {ruta_zip} no tiene índice ({NOMBRE_MANIFIESTO})")
+            continue
+        entradas = {entrada['nombre']: entrada for entrada in manifiesto['entradas']}
+        for certificado in manifiesto['certificados']:
+            if numeracion is not None and certificado['numeracion'] != str(numeracion).strip():
+                continue
+            if fila is not None and certificado['fila'] != fila:
+                continue
+            if palabras and not set(palabras) <= set(certificado['nombre_normalizado'].split()):
+                continue
+            resultados.append(dict(certificado, ruta_zip=ruta_zip, datos_entrada=entradas[certificado['entrada']]))
+    return resultados
+
+
+def leer_entrada(ruta_zip, entrada):
+    """Contenido de una entrada leído desde su offset (una fila de 'entradas' del manifiesto), validado con su sha256"""
+    with open(ruta_zip, 'rb') as f:
+        f.seek(entrada['offset'])
+        encabezado = f.read(_ENCABEZADO_LOCAL.size)
+        if len(encabezado) != _ENCABEZADO_LOCAL.size:
+            raise ValueError(f"{entrada['nombre']}: el offset del índice está fuera del ZIP")
+        firma, _version, _flags, metodo, _hora, _fecha, _crc, _comprimido, _bytes, largo_nombre, largo_extra = \
+            _ENCABEZADO_LOCAL.unpack(encabezado)
+        if firma != b'PK\x03\x04':
+            raise ValueError(f"{entrada['nombre']}: el índice no corresponde a este ZIP")
+        f.seek(largo_nombre + largo_extra, os.SEEK_CUR)
+        datos = f.read(entrada['comprimido'])
+
+    if metodo == ZIP_DEFLATED:
+        datos = zlib.decompress(datos, -15)
+    elif metodo != ZIP_STORED:
+        raise ValueError(f"{entrada['nombre']}: método de compresión {metodo} no admitido")
+    if hashlib.sha256(datos).hexdigest() != entrada['sha256']:
+        raise ValueError(f"{entrada['nombre']}: el contenido no coincide con el sha256 del índice")
+    return datos
+
+
+def extraer_certificados(resultados, directorio):
+    """
+    Escribe en `directorio` cada entrada de los resultados de buscar_certificados (una vez), con sus carpetas
+    del ZIP (Constancias/...). Devuelve las rutas
+    """
+    rutas = []
+    for resultado in resultados:
+        partes = [parte for parte in resultado['entrada'].split('/') if parte not in ('', '.', '..')]
+        ruta = os.path.join(directorio, *partes)
+        if ruta in rutas:
+            continue
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'wb') as f:
+            f.write(leer_entrada(resultado['ruta_zip'], resultado['datos_entrada']))
+        rutas.append(ruta)
+    return rutas
+
+
+def _avisar_consola(nivel, mensaje):
+    print(mensaje, file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m certificados.indice",
+                                     description="Busca y extrae certificados sueltos usando el índice de los ZIP.")
+    parser.add_argument('zips', nargs='+', help="ZIP generados (o sus volúmenes)")
+    parser.add_argument('--nombre', help="Palabras del nombre del estudiante, sin importar tildes ni mayúsculas")
+    parser.add_argument('--numero', help="Numeración del certificado")
+    parser.add_argument('--fila', type=int, help="Fila de la planilla (1 = primer estudiante)")
+    parser.add_argument('-x', '--extraer', metavar='CARPETA', help="Extrae los certificados encontrados a la carpeta")
+    args = parser.parse_args(argv)
+
+    resultados = buscar_certificados(args.zips, args.nombre, args.numero, args.fila, _avisar_consola)
+    for resultado in resultados:
+        pagina = f" (página {resultado['pagina']})" if resultado['pagina'] != 1 else ""
+        print(f"{resultado['fila']:>6}  {resultado['numeracion']:<12} {resultado['nombre']:<40} "
+              f"{resultado['plantilla']}  {os.path.basename(resultado['ruta_zip'])}:{resultado['entrada']}{pagina}")
+    if not resultados:
+        print("No se encontraron certificados", file=sys.stderr)
+        return 1
+
+    if args.extraer:
+        try:
+            rutas = extraer_certificados(resultados, args.extraer)
+        except (OSError, ValueError) as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 1
+        print(f"{len(rutas)} archivos extraídos en {args.extraer}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""
+Lectura y limpieza de la planilla de notas (Excel, CSV o Parquet).
+
+La planilla se lee una sola vez y fila por fila: de esa misma lectura salen la
+vista previa del archivo original y la tabla limpia con las columnas requeridas.
+"""
+import csv
+import io
+import math
+import os
+
+import pandas as pd
+from openpyxl import load_workbook
+
+# Lista de columnas
+columnas_requeridas = [
+    'nro', 'paterno', 'materno', 'nombre', 'grado', 'sección', 'curso',
+    'nota lab', 'lista de asistencia', 'nota de examen cibertec', 'nota final',
+    'observación sobre nota desaprobatoria', 'status', 'numeración', 'horas_progresivo'
+]
+
+# Fila de la hoja con la cabecera (la 12); las anteriores son el encabezado del reporte
+FILA_CABECERA = 11
+
+# Filas del archivo original que se muestran en la vista previa
+FILAS_VISTA_PREVIA = 15
+
+FORMATOS_ADMITIDOS = ['xlsx', 'csv', 'parquet']
+
+# Separadores que se prueban al leer un CSV (el de Excel en español es ';')
+DELIMITADORES_CSV = ',;\t'
+
+
+def formato_archivo(archivo, nombre_archivo=None):
+    nombre = nombre_archivo or getattr(archivo, 'name', None) or str(archivo)
+    return os.path.splitext(nombre)[1].lower().lstrip('.')
+
+
+def _es_vacio(valor):
+    return valor is None or valor == '' or (isinstance(valor, float) and math.isnan(valor))
+
+
+def _normalizar_valor(valor):
+    # Igual que pandas: celdas vacías como NaN y números enteros guardados como float como int
+    if valor is None or valor == '':
+        return math.nan
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+
+def _nombres_columnas(cabecera, ancho):
+    """Nombres para la vista previa como los pone pandas: 'Unnamed: i' si falta y sufijos .1, .2 si se repiten"""
+    nombres = []
+    vistos = {}
+    for i in range(ancho):
+        valor = cabecera[i] if i < len(cabecera) else None
+        nombre = f"Unnamed: {i}" if _es_vacio(valor) else str(valor)
+        if nombre in vistos:
+            vistos[nombre] += 1
+            nombre = f"{nombre}.{vistos[nombre]}"
+        else:
+            vistos[nombre] = 0
+        nombres.append(nombre)
+    return nombres
+
+
+def _es_cabecera(fila):
+    valores = {str(valor).strip().lower() for valor in fila if isinstance(valor, str)}
+    return 'nombre' in valores and 'curso' in valores
+
+
+def _leer_filas(filas, cabecera_al_inicio=False):
+    """
+    Recorre una sola vez las filas crudas de la hoja y arma la vista previa y la tabla de columnas requeridas.
+    Con `cabecera_al_inicio` (CSV) la cabecera también puede ser la primera fila, si tiene 'nombre' y 'curso'.
+    Devuelve (df, vista_previa, (filas, columnas)) con las dimensiones de la hoja original.
+    """
+    primeras = []
+    datos = []
+    indices = None
+    total_filas = 0
+    ultima_fila_con_datos = 0
+    ancho = 0
+
+    for numero_fila, fila in enumerate(filas):
+        total_filas += 1
+        ocupadas = [i for i, valor in enumerate(fila) if not _es_vacio(valor)]
+        if ocupadas:
+            ultima_fila_con_datos = total_filas
+            ancho = max(ancho, ocupadas[-1] + 1)
+
+        if numero_fila <= FILAS_VISTA_PREVIA:
+            primeras.append(fila)
+
+        if indices is None:
+            # La cabecera está en la fila 12, salvo que el CSV ya empiece con ella
+            if numero_fila == FILA_CABECERA or (numero_fila == 0 and cabecera_al_inicio and _es_cabecera(fila)):
+                cabecera = [valor.lower() if isinstance(valor, str) else None for valor in fila]
+                indices = {}
+                for i, columna in enumerate(cabecera):
+                    if columna in columnas_requeridas and columna not in indices:
+                        indices[columna] = i
+            continue
+
+        datos.append([_normalizar_valor(fila[i]) if i < len(fila) else math.nan for i in indices.values()])
+
+    if indices is None:
+        raise ValueError(f"la planilla no llega a la fila {FILA_CABECERA + 1}, donde debe estar la cabecera")
+
+    # pandas descarta las filas vacías del final de la hoja
+    filas_datos_vacias = total_filas - ultima_fila_con_datos
+    if filas_datos_vacias:
+        datos = datos[:max(0, len(datos) - filas_datos_vacias)]
+
+    # Vista previa como la muestra pandas: primera fila como cabecera y las siguientes 15
+    columnas_vista = _nombres_columnas(primeras[0] if primeras else [], ancho)
+    vista_previa = pd.DataFrame(
+        [[_normalizar_valor(fila[i]) if i < len(fila) else math.nan for i in range(ancho)]
+         for fila in primeras[1:ultima_fila_con_datos]],
+        columns=columnas_vista, dtype=object)
+
+    # Columnas requeridas en el orden de la lista, sólo las que existen en la planilla
+    df = pd.DataFrame(datos, columns=list(indices), dtype=object)
+    df = df[[col for col in columnas_requeridas if col in indices]]
+    return df, vista_previa, (max(0, ultima_fila_con_datos - 1), ancho)
+
+
+def _filas_excel(archivo):
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        yield from libro.worksheets[0].iter_rows(values_only=True)
+    finally:
+        libro.close()
+
+
+def _filas_csv(archivo):
+    if hasattr(archivo, 'read'):
+        contenido = archivo.read()
+    else:
+        with open(archivo, 'rb') as f:
+            contenido = f.read()
+    try:
+        texto = contenido.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        # CSV guardado desde Excel en Windows
+        texto = contenido.decode('cp1252', errors='replace')
+    # Las filas del encabezado del reporte pueden venir sin separadores (una sola celda): no cuentan para elegirlo
+    muestra = '\n'.join(linea for linea in texto[:64 * 1024].splitlines()
+                        if any(separador in linea for separador in DELIMITADORES_CSV))
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=DELIMITADORES_CSV)
+    except csv.Error:
+        dialecto = csv.excel
+    yield from csv.reader(io.StringIO(texto), dialecto)
+
+
+def _leer_parquet(archivo):
+    # Parquet ya trae la cabecera como nombres de columna: sólo se leen las requeridas
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(archivo)
+    nombres = {}
+    for nombre in parquet.schema_arrow.names:
+        nombres.setdefault(nombre.lower(), nombre)
+    existentes = [col for col in columnas_requeridas if col in nombres]
+
+    tabla = parquet.read(columns=[nombres[col] for col in existentes])
+    # Mismos valores que desde Excel: NaN en vacíos y enteros sin decimales (una columna con vacíos llega como float)
+    df = pd.DataFrame({col: [_normalizar_valor(valor) for valor in tabla.column(i).to_pylist()]
+                       for i, col in enumerate(existentes)}, columns=existentes, dtype=object)
+
+    primer_lote = next(parquet.iter_batches(batch_size=FILAS_VISTA_PREVIA), None)
+    vista_previa = primer_lote.to_pandas() if primer_lote is not None else pd.DataFrame(columns=parquet.schema_arrow.names)
+    return df, vista_previa, (parquet.metadata.num_rows, parquet.metadata.num_columns)
+
+
+def leer_planilla(archivo, nombre_archivo=None):
+    """Lee la planilla una sola vez. Devuelve (df con las columnas requeridas, vista previa, dimensiones originales)"""
+    formato = formato_archivo(archivo, nombre_archivo)
+    if hasattr(archivo, 'seek'):
+        archivo.seek(0)
+
+    if formato == 'parquet':
+        return _leer_parquet(archivo)
+    if formato == 'csv':
+        return _leer_filas(_filas_csv(archivo), cabecera_al_inicio=True)
+    return _leer_filas(_filas_excel(archivo))
+
+
+# Función para procesar la planilla base
+def procesar_planilla(archivo, nombre_archivo=None):
+    """
+    Lee la planilla (Excel, CSV o Parquet), salta el encabezado del reporte y se queda con las columnas requeridas.
+    Devuelve (planilla, exito, mensaje) con planilla = {'df', 'vista_previa', 'dimensiones'}
+    """
+    try:
+        formato = formato_archivo(archivo, nombre_archivo)
+        if formato not in FORMATOS_ADMITIDOS:
+            return None, False, f"Formato no admitido: '{formato}'. Usa {', '.join(FORMATOS_ADMITIDOS)}"
+
+        df_procesado, vista_previa, dimensiones = leer_planilla(archivo, nombre_archivo)
+
+        # Reemplazar 'NP' por 0 en la columna 'nota final'
+        if 'nota final' in df_procesado.columns:
+            es_np = df_procesado['nota final'].astype('string').str.strip().str.upper().eq('NP').fillna(False)
+            df_procesado.loc[es_np.to_numpy(dtype=bool), 'nota final'] = 0
+            df_procesado['nota final'] = df_procesado['nota final'].infer_objects()
+
+        # Crear columna nombre_certificado
+        df_procesado['nombre_certificado'] = df_procesado['nombre'].fillna('').str.strip() + ' ' + df_procesado[
+            'paterno'].fillna('').str.strip() + ' ' + df_procesado['materno'].fillna('').str.strip()
+
+        # Reordenar columnas para poner nombre_certificado después de nro
+        if 'nro' in df_procesado.columns:
+            columnas = df_procesado.columns.tolist()
+            columnas.remove('nombre_certificado')
+            posicion_nro = columnas.index('nro')
+            columnas.insert(posicion_nro + 1, 'nombre_certificado')
+            df_procesado = df_procesado[columnas]
+
+        planilla = {'df': df_procesado, 'vista_previa': vista_previa, 'dimensiones': dimensiones}
+        return planilla, True, "Archivo procesado correctamente"
+
+    except Exception as e:
+        return None, False, f"Error al procesar el archivo: {str(e)}"
+
+
+# Función para procesar el archivo Excel Base
+def procesar_excel_inicial(uploaded_file, nombre_archivo=None):
+    """
+    Procesa el archivo eliminando el encabezado del reporte y las columnas que no se usan.
+    Devuelve (df, exito, mensaje)
+    """
+    planilla, exito, mensaje = procesar_planilla(uploaded_file, nombre_archivo)
+    return (planilla['df'] if exito else None), exito, mensaje
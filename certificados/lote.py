@@ -0,0 +1,206 @@
+"""
+Procesamiento por lotes de muchas planillas de notas.
+
+Acepta archivos sueltos, carpetas y ZIP con planillas. Las plantillas se leen una
+sola vez, cada planilla se clasifica con las reglas de su propio nombre y el
+render de todas comparte el mismo pool de workers (con sus fuentes, fondos y
+marcas de agua ya cargados), así el tiempo total depende de la cantidad de
+estudiantes y no de la cantidad de archivos.
+
+La salida es un ZIP por planilla o un único ZIP con una carpeta por planilla.
+Los ZIP por planilla guardan puntos de control: volver a correr el mismo lote
+retoma los que quedaron a medio escribir y reintenta sólo las filas que fallaron.
+"""
+import io
+import os
+import time
+from zipfile import ZipFile, is_zipfile
+
+from certificados import cache_pdf, metricas
+from certificados.clasificacion import clasificar_estudiantes_por_nota
+from certificados.empaquetado import escribir_zip, tamano_salida
+from certificados.ingesta import FORMATOS_ADMITIDOS, formato_archivo, procesar_excel_inicial
+from certificados.motor import (
+    cargar_plantillas, escribir_archivo, escribir_combinado, nombre_zip_descarga, planificar_grupos, sin_avance,
+    sin_avisos, tareas_render
+)
+from certificados.paralelo import renderizar_tareas
+from certificados.perfil import perfilar
+from certificados.reanudacion import descartar_hechas, escribir_zip_reanudable, huella_planes, leer_control
+from certificados.variantes import VARIANTE_POR_DEFECTO
+
+
+def _es_planilla(nombre):
+    base = os.path.basename(nombre)
+    return bool(base) and not base.startswith(('.', '~$')) and formato_archivo(base) in FORMATOS_ADMITIDOS
+
+
+class _MiembroZip(io.BytesIO):
+    # Planilla leída de un ZIP, con nombre como la que llega del uploader
+    def __init__(self, contenido, name):
+        super().__init__(contenido)
+        self.name = name
+
+
+def expandir_entradas(rutas):
+    """
+    Genera (nombre_archivo, archivo) por cada planilla de las rutas: archivos, carpetas (sin subcarpetas)
+    y ZIP. Las reglas de prefijo se aplican sobre nombre_archivo, que es siempre el nombre sin carpetas
+    """
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            for nombre in sorted(os.listdir(ruta)):
+                ruta_archivo = os.path.join(ruta, nombre)
+                if os.path.isfile(ruta_archivo) and _es_planilla(nombre):
+                    yield nombre, ruta_archivo
+        elif formato_archivo(ruta) == 'zip' and is_zipfile(ruta):
+            with ZipFile(ruta) as archivo_zip:
+                for miembro in sorted(archivo_zip.namelist()):
+                    if miembro.startswith('__MACOSX/') or not _es_planilla(miembro):
+                        continue
+                    nombre = os.path.basename(miembro)
+                    yield nombre, _MiembroZip(archivo_zip.read(miembro), nombre)
+        else:
+            yield os.path.basename(ruta), ruta
+
+
+def _nombres_unicos(nombres_zip):
+    # Dos planillas con el mismo nombre en carpetas distintas no pueden compartir carpeta ni ZIP
+    vistos = {}
+    unicos = []
+    for nombre in nombres_zip:
+        base, extension = os.path.splitext(nombre)
+        vistos[nombre] = vistos.get(nombre, 0) + 1
+        unicos.append(nombre if vistos[nombre] == 1 else f"{base}_{vistos[nombre]}{extension}")
+    return unicos
+
+
+def preparar_archivo(nombre_archivo, archivo, plantillas, avisar=sin_avisos, backend='reportlab', usar_cache=True):
+    """Lee y clasifica una planilla y arma los planes de sus grupos. Devuelve el dict del archivo o None si falla"""
+    corrida = metricas.nueva_corrida(nombre_archivo)
+    with metricas.cronometro(corrida, 'ingesta'):
+        df_procesado, exito, mensaje = procesar_excel_inicial(archivo, nombre_archivo)
+    if not exito:
+        metricas.registrar(corrida, 'ingesta', errores=1)
+        metricas.cerrar_corrida(corrida)
+        avisar('error', f"{nombre_archivo}: {mensaje}")
+        return None
+    metricas.registrar(corrida, 'ingesta', cantidad=len(df_procesado))
+
+    with metricas.cronometro(corrida, 'clasificacion'):
+        grupos = clasificar_estudiantes_por_nota(df_procesado, nombre_archivo, avisar)
+    if not grupos:
+        metricas.cerrar_corrida(corrida)
+        return None
+    metricas.registrar(corrida, 'clasificacion', cantidad=sum(len(grupo) for grupo in grupos.values()))
+
+    planes = planificar_grupos(grupos, plantillas, nombre_archivo, avisar, backend, usar_cache)
+    return {
+        'nombre_archivo': nombre_archivo,
+        'planes': planes,
+        'total': sum(len(plan['filas']) for plan in planes),
+        'corrida': corrida,
+    }
+
+
+def procesar_lote(rutas, salida, combinado=None, al_avanzar=sin_avance, avisar=sin_avisos, max_workers=None,
+    backend='reportlab', usar_cache=True, variante=VARIANTE_POR_DEFECTO, modo='individual', empaque=None,
+    perfil=None):
+    """
+    Genera los certificados de todas las planillas de `rutas` (archivos, carpetas o ZIP).
+    Sin `combinado` escribe un ZIP por planilla en la carpeta `salida`; con `combinado` (nombre de archivo)
+    escribe un solo ZIP en `salida` con una carpeta por planilla. Con `modo` 'grupo' o 'archivo' cada planilla
+    lleva PDFs de varias páginas en lugar de un PDF por estudiante. `empaque` (opciones_empaque) fija la
+    compresión y el reparto de cada ZIP en volúmenes.
+    Devuelve una lista de dicts por planilla con 'nombre_archivo', 'ruta_zip', 'nombre_zip' (el nombre de su ZIP,
+    o de su carpeta en el combinado, sin repetidos), 'generados' (None si falló) y 'corrida' (sus métricas, ya
+    cerradas).
+    Con `perfil` ('muestreo' o 'determinista') el perfil de todo el lote queda en `salida`, junto al ZIP
+    combinado o como lote.perfil.pstats y lote.perfil.folded
+    """
+    with perfilar(os.path.join(salida, combinado or 'lote.zip'), perfil, avisar):
+        return _procesar_lote(rutas, salida, combinado, al_avanzar, avisar, max_workers, backend, usar_cache,
+                              variante, modo, empaque)
+
+
+def _procesar_lote(rutas, salida, combinado, al_avanzar, avisar, max_workers, backend, usar_cache, variante, modo,
+    empaque):
+    plantillas = cargar_plantillas(avisar, variante)
+    if not plantillas:
+        return []
+
+    entradas = []
+    for nombre_archivo, archivo in expandir_entradas(rutas):
+        if modo == 'individual':
+            preparado = preparar_archivo(nombre_archivo, archivo, plantillas, avisar, backend, usar_cache)
+        else:
+            preparado = preparar_archivo(nombre_archivo, archivo, plantillas, avisar, usar_cache=False)
+        entradas.append(preparado or {'nombre_archivo': nombre_archivo, 'corrida': None})
+    archivos = [entrada for entrada in entradas if 'planes' in entrada]
+
+    os.makedirs(salida, exist_ok=True)
+    nombres_zip = _nombres_unicos([nombre_zip_descarga(archivo['nombre_archivo']) for archivo in archivos])
+    for archivo, nombre_zip in zip(archivos, nombres_zip):
+        archivo['nombre_zip'] = nombre_zip
+    total_lote = sum(archivo['total'] for archivo in archivos)
+
+    # Las filas que ya quedaron en el ZIP de una corrida anterior cortada no se vuelven a renderizar
+    reanudable = modo == 'individual' and not combinado
+    if reanudable:
+        for archivo, nombre_zip in zip(archivos, nombres_zip):
+            archivo['huella'] = huella_planes(archivo['planes'], empaque)
+            control = leer_control(os.path.join(salida, nombre_zip), archivo['huella'])
+            if control:
+                descartar_hechas(archivo['planes'], set(control['hechas']))
+
+    # Un único flujo de render para todos los grupos de todas las planillas (los PDFs combinados se
+    # renderizan documento por documento al escribir cada planilla)
+    generados = {}
+    if modo == 'individual':
+        generados = renderizar_tareas([tarea for archivo in archivos for tarea in tareas_render(archivo['planes'])],
+                                      max_workers)
+
+    def escribir(archivo, zip_file, prefijo, base, control=None):
+        inicio = time.perf_counter()
+
+        def avance(procesados, _total):
+            al_avanzar(base + procesados, total_lote)
+
+        if modo == 'individual':
+            total_generados = escribir_archivo(archivo['planes'], generados, zip_file, avance, avisar,
+                                               archivo['corrida'], prefijo, control)
+        else:
+            total_generados = escribir_combinado(archivo['planes'], zip_file, archivo['nombre_archivo'], modo,
+                                                 avance, avisar, max_workers, archivo['corrida'], prefijo)
+        metricas.registrar(archivo['corrida'], 'generacion', time.perf_counter() - inicio, cantidad=total_generados)
+        return total_generados
+
+    base = 0
+    if combinado:
+        ruta_combinado = os.path.join(salida, combinado)
+        with escribir_zip(ruta_combinado, empaque) as zip_file:
+            for archivo, nombre_zip in zip(archivos, nombres_zip):
+                prefijo = os.path.splitext(nombre_zip)[0] + '/'
+                archivo.update(ruta_zip=ruta_combinado, generados=escribir(archivo, zip_file, prefijo, base))
+                base += archivo['total']
+    else:
+        for archivo, nombre_zip in zip(archivos, nombres_zip):
+            ruta_zip = os.path.join(salida, nombre_zip)
+            if reanudable:
+                with escribir_zip_reanudable(ruta_zip, archivo['huella'], empaque) as zip_file:
+                    archivo.update(ruta_zip=ruta_zip, generados=escribir(archivo, zip_file, '', base, zip_file))
+            else:
+                with escribir_zip(ruta_zip, empaque) as zip_file:
+                    archivo.update(ruta_zip=ruta_zip, generados=escribir(archivo, zip_file, '', base))
+            metricas.registrar(archivo['corrida'], 'generacion', bytes_producidos=tamano_salida(ruta_zip))
+            base += archivo['total']
+
+    if usar_cache:
+        cache_pdf.recortar_cache(claves_corrida=[clave for archivo in archivos for plan in archivo['planes']
+                                                 for clave in plan['claves']], avisar=avisar)
+
+    for archivo in archivos:
+        metricas.cerrar_corrida(archivo['corrida'])
+    return [{'nombre_archivo': entrada['nombre_archivo'], 'ruta_zip': entrada.get('ruta_zip'),
+             'nombre_zip': entrada.get('nombre_zip'), 'generados': entrada.get('generados'),
+             'corrida': entrada['corrida']} for entrada in entradas]
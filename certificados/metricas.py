@@ -0,0 +1,190 @@
+"""
+Métricas de las corridas de generación.
+
+Cada corrida (un archivo procesado) acumula por etapa la duración, la cantidad,
+los bytes producidos y los errores, además de los aciertos de la caché y la
+duración de cada certificado. Al cerrarla se suma a un registro del proceso que
+se puede exportar en el formato de texto de Prometheus.
+
+Etapas: ingesta, clasificacion, render (suma del tiempo de cada certificado en
+los workers), zip (escrituras al ZIP) y generacion (tiempo total de pared).
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Límites de los histogramas, en segundos
+BUCKETS_CERTIFICADO = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
+BUCKETS_ETAPA = [0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0]
+
+_lock = threading.Lock()
+_contadores = {}
+_histogramas = {}
+
+
+def nueva_corrida(nombre_archivo):
+    return {
+        'archivo': nombre_archivo,
+        'inicio': time.time(),
+        'etapas': {},
+        'cache': {'aciertos': 0, 'fallos': 0},
+        'duraciones_certificado': [],
+    }
+
+
+def registrar(corrida, etapa, segundos=0.0, cantidad=0, bytes_producidos=0, errores=0):
+    """Suma a la etapa de la corrida; corrida=None no registra nada"""
+    if corrida is None:
+        return
+    datos = corrida['etapas'].setdefault(etapa, {'segundos': 0.0, 'cantidad': 0, 'bytes': 0, 'errores': 0})
+    datos['segundos'] += segundos
+    datos['cantidad'] += cantidad
+    datos['bytes'] += bytes_producidos
+    datos['errores'] += errores
+
+
+@contextmanager
+def cronometro(corrida, etapa):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar(corrida, etapa, time.perf_counter() - inicio)
+
+
+def registrar_certificado(corrida, segundos, pdf_bytes, error):
+    if corrida is None:
+        return
+    corrida['duraciones_certificado'].append(segundos)
+    registrar(corrida, 'render', segundos, cantidad=1, bytes_producidos=len(pdf_bytes or b''),
+              errores=1 if error else 0)
+
+
+def registrar_cache(corrida, aciertos, fallos):
+    if corrida is None:
+        return
+    corrida['cache']['aciertos'] += aciertos
+    corrida['cache']['fallos'] += fallos
+
+
+def _percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return None
+    return valores_ordenados[min(len(valores_ordenados) - 1, int(p * len(valores_ordenados)))]
+
+
+def resumen(corrida):
+    """Resumen serializable de la corrida"""
+    duraciones = sorted(corrida['duraciones_certificado'])
+    # Tamaño medio de cada PDF escrito al ZIP
+    escrito = corrida['etapas'].get('zip')
+    bytes_por_certificado = round(escrito['bytes'] / escrito['cantidad']) if escrito and escrito['cantidad'] else None
+    return {
+        'archivo': corrida['archivo'],
+        'inicio': datetime.fromtimestamp(corrida['inicio']).isoformat(timespec='seconds'),
+        'etapas': {etapa: {**datos, 'segundos': round(datos['segundos'], 4)}
+                   for etapa, datos in corrida['etapas'].items()},
+        'cache': dict(corrida['cache']),
+        'bytes_por_certificado': bytes_por_certificado,
+        'certificado_segundos': {
+            'p50': _percentil(duraciones, 0.5),
+            'p95': _percentil(duraciones, 0.95),
+            'max': duraciones[-1] if duraciones else None,
+        },
+    }
+
+
+def escribir_resumen(corrida, ruta):
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(resumen(corrida), f, indent=2, ensure_ascii=False)
+    return ruta
+
+
+# Registro del proceso (Prometheus)
+
+def _sumar(nombre, etiquetas, valor):
+    clave = (nombre, tuple(sorted(etiquetas.items())))
+    _contadores[clave] = _contadores.get(clave, 0) + valor
+
+
+def _observar(nombre, etiquetas, buckets, valor):
+    clave = (nombre, tuple(sorted(etiquetas.items())))
+    histograma = _histogramas.setdefault(clave, {'buckets': buckets, 'conteos': [0] * len(buckets), 'suma': 0.0,
+                                                 'cuenta': 0})
+    for i, limite in enumerate(buckets):
+        if valor <= limite:
+            histograma['conteos'][i] += 1
+    histograma['suma'] += valor
+    histograma['cuenta'] += 1
+
+
+def cerrar_corrida(corrida):
+    """Suma la corrida al registro del proceso (y al archivo de CERTIFICADOS_PROMETHEUS, si está). Devuelve su resumen"""
+    with _lock:
+        _sumar('certificados_corridas_total', {}, 1)
+        for etapa, datos in corrida['etapas'].items():
+            _sumar('certificados_etapa_segundos_total', {'etapa': etapa}, datos['segundos'])
+            _sumar('certificados_etapa_items_total', {'etapa': etapa}, datos['cantidad'])
+            _sumar('certificados_etapa_bytes_total', {'etapa': etapa}, datos['bytes'])
+            _sumar('certificados_etapa_errores_total', {'etapa': etapa}, datos['errores'])
+            _observar('certificados_etapa_segundos', {'etapa': etapa}, BUCKETS_ETAPA, datos['segundos'])
+        _sumar('certificados_cache_total', {'resultado': 'acierto'}, corrida['cache']['aciertos'])
+        _sumar('certificados_cache_total', {'resultado': 'fallo'}, corrida['cache']['fallos'])
+        for segundos in corrida['duraciones_certificado']:
+            _observar('certificados_certificado_segundos', {}, BUCKETS_CERTIFICADO, segundos)
+    escribir_prometheus()
+    return resumen(corrida)
+
+
+def registrar_solicitud(ruta, estado, segundos):
+    """Suma al registro del proceso una respuesta del servicio HTTP y su latencia"""
+    with _lock:
+        _sumar('certificados_servicio_solicitudes_total', {'ruta': ruta, 'estado': estado}, 1)
+        _observar('certificados_servicio_segundos', {'ruta': ruta}, BUCKETS_CERTIFICADO, segundos)
+
+
+def _etiquetas_texto(etiquetas, extra=()):
+    pares = list(etiquetas) + list(extra)
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{clave}="{valor}"' for clave, valor in pares) + '}'
+
+
+def texto_prometheus():
+    """Contadores e histogramas del proceso en el formato de texto de Prometheus"""
+    lineas = []
+    with _lock:
+        vistos = set()
+        for (nombre, etiquetas), valor in sorted(_contadores.items()):
+            if nombre not in vistos:
+                vistos.add(nombre)
+                lineas.append(f"# TYPE {nombre} counter")
+            lineas.append(f"{nombre}{_etiquetas_texto(etiquetas)} {valor}")
+        for (nombre, etiquetas), histograma in sorted(_histogramas.items()):
+            if nombre not in vistos:
+                vistos.add(nombre)
+                lineas.append(f"# TYPE {nombre} histogram")
+            for limite, conteo in zip(histograma['buckets'], histograma['conteos']):
+                lineas.append(f"{nombre}_bucket{_etiquetas_texto(etiquetas, [('le', limite)])} {conteo}")
+            lineas.append(f"{nombre}_bucket{_etiquetas_texto(etiquetas, [('le', '+Inf')])} {histograma['cuenta']}")
+            lineas.append(f"{nombre}_sum{_etiquetas_texto(etiquetas)} {histograma['suma']}")
+            lineas.append(f"{nombre}_count{_etiquetas_texto(etiquetas)} {histograma['cuenta']}")
+    return '\n'.join(lineas) + '\n'
+
+
+def escribir_prometheus(ruta=None):
+    """
+    Escribe texto_prometheus() en ruta (por defecto la variable CERTIFICADOS_PROMETHEUS), para el
+    textfile collector de node_exporter. Sin ruta no hace nada
+    """
+    ruta = ruta or os.environ.get('CERTIFICADOS_PROMETHEUS')
+    if not ruta:
+        return None
+    ruta_parcial = f"{ruta}.{os.getpid()}.{threading.get_ident()}.part"
+    with open(ruta_parcial, 'w', encoding='utf-8') as f:
+        f.write(texto_prometheus())
+    os.replace(ruta_parcial, ruta)
+    return ruta
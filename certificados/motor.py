@@ -0,0 +1,394 @@
+"""
+Motor de generación sin Streamlit: plantillas, render por grupos y empaquetado.
+
+Los mensajes para el usuario salen por `avisar(nivel, mensaje)` (niveles: info,
+write y success al empezar y terminar cada grupo, warning, error, y fallo por cada
+certificado que no se pudo generar) y el avance por `al_avanzar(procesados, total)`.
+La página de Streamlit y la línea de comandos conectan esas funciones a un flujo
+de eventos (ver eventos) que limita las actualizaciones y resume las fallas.
+"""
+import os
+import time
+
+from certificados.render import (
+    RAIZ_PROYECTO, crear_contexto_grupo, preparar_filas, styles_config_by_template, mapeo_plantillas
+)
+from certificados.paralelo import renderizar_documentos, renderizar_tareas, renderizar_lote
+from certificados import cache_pdf, metricas
+from certificados.perfil import perfilar
+from certificados.recursos import leer_recurso
+from certificados.variantes import VARIANTE_POR_DEFECTO, aplicar_variante
+from certificados.empaquetado import ZipVolumenes, escribir_zip, tamano_salida
+from certificados.indice import registro_certificado
+from certificados.reanudacion import clave_fila, descartar_hechas, escribir_zip_reanudable, huella_planes
+
+# Formato de salida: un PDF por certificado, un PDF de varias páginas por grupo o uno por archivo
+MODOS_SALIDA = ['individual', 'grupo', 'archivo']
+
+# Páginas como máximo de cada PDF combinado; los grupos más grandes se parten en varios PDFs
+PAGINAS_POR_PDF = int(os.environ.get('CERTIFICADOS_PAGINAS_POR_PDF', 500))
+
+
+# `avisar` y `al_avanzar` por defecto (también para lote y vista_previa): no muestran nada
+def sin_avisos(nivel, mensaje):
+    pass
+
+
+def sin_avance(procesados, total):
+    pass
+
+
+# Reglas según el nombre del archivo
+def aplica_marca_agua(nombre_archivo):
+    """La segunda letra 'I' en el nombre del archivo indica certificados con marca de agua"""
+    return len(nombre_archivo) >= 2 and nombre_archivo[1].upper() == 'I'
+
+
+def nombre_zip_descarga(nombre_archivo):
+    """Nombre del ZIP entregado al usuario; la segunda letra 'P' lo marca como preliminar"""
+    nombre_base = os.path.splitext(nombre_archivo)[0] if nombre_archivo else "CERTIFICADOS"
+
+    if len(nombre_base) >= 2 and nombre_base[1].upper() == 'P':
+        return f"{nombre_base}_PRELIMINAR.zip"
+    return f"{nombre_base}.zip"
+
+
+# Función para cargar plantillas
+def cargar_plantillas(avisar=sin_avisos, variante=VARIANTE_POR_DEFECTO):
+    """
+    Carga las plantillas de fondo desde la carpeta plantillas (desde el registro de recursos del proceso),
+    con los fondos en la variante pedida ('impresion' o 'correo')
+    """
+    plantillas = {}
+    plantillas_path = os.path.join(RAIZ_PROYECTO, "plantillas")
+
+    if not os.path.exists(plantillas_path):
+        avisar('error', f"❌ La carpeta '{plantillas_path}' no existe. Créala y agrega las imágenes de fondo.")
+        return None
+
+    archivos_plantilla = {
+        'PROGRESIVO_1P_5S.jpg': 'fondo_1',
+        'PARTICIPACION_1P_5S.jpg': 'fondo_2',
+        'APROBADO_1P_3P.jpg': 'fondo_3',
+        'APROBADO_4P_5S.jpg': 'fondo_4'
+    }
+
+    for archivo, clave in archivos_plantilla.items():
+        ruta_completa = os.path.join(plantillas_path, archivo)
+        # Bytes compartidos por todas las sesiones; se vuelven a leer sólo si el archivo cambió
+        plantilla_bytes = leer_recurso(ruta_completa)
+        if plantilla_bytes is not None:
+            plantillas[clave] = plantilla_bytes
+        else:
+            avisar('warning', f"⚠️ No se encontró {archivo} en la carpeta plantillas")
+
+    if len(plantillas) == 4:
+        return aplicar_variante(plantillas, variante)
+    else:
+        avisar('error', f"❌ Se necesitan 4 plantillas, solo se encontraron {len(plantillas)}")
+        return None
+
+
+# Marca de agua que corresponde a un grupo, o None si no lleva
+def ruta_marca_agua_grupo(plantilla_key, nombre_archivo, styles_config_by_template, avisar=sin_avisos):
+    # Aplicar marca de agua si la segunda letra es 'I' y si esta aprobado
+    if not aplica_marca_agua(nombre_archivo) or plantilla_key == 'fondo_2':
+        return None
+
+    # Ruta a la marca de agua
+    watermark_path = os.path.join(RAIZ_PROYECTO, "watermarks", "marca_agua.pdf")
+    if not os.path.exists(watermark_path):
+        avisar('warning', f"⚠️ No se encontró el archivo de marca de agua en {watermark_path}. Se generarán PDFs sin marca de agua.")
+        return None
+
+    # Marca de agua según la orientación de la plantilla
+    landscape_watermark_path = os.path.join(RAIZ_PROYECTO, "watermarks", "marca_agua_landscape.pdf")
+    if styles_config_by_template[plantilla_key].get('orientation') != 'portrait' and os.path.exists(landscape_watermark_path):
+        return landscape_watermark_path
+    return watermark_path
+
+
+# Contexto, filas y certificados que faltan en la caché de cada grupo no vacío
+def planificar_grupos(grupos, plantillas, nombre_archivo, avisar=sin_avisos, backend='reportlab', usar_cache=True):
+    planes = [planificar_grupo(grupo_df, plantillas[mapeo_plantillas[grupo_nombre]], mapeo_plantillas[grupo_nombre],
+                               grupo_nombre, styles_config_by_template, nombre_archivo, avisar, backend, usar_cache)
+              for grupo_nombre, grupo_df in grupos.items() if not grupo_df.empty]
+    desduplicar_nombres(planes, avisar)
+    return planes
+
+
+# Dos estudiantes con el mismo nombre y curso darían el mismo archivo en el ZIP y uno taparía al otro:
+# desde el segundo se numeran (_2, _3, ...). Devuelve [(nombre original, nombre nuevo)]
+def desduplicar_nombres(planes, avisar=sin_avisos):
+    usados = {fila[4] for plan in planes for fila in plan['filas']}
+    vistos = set()
+    renombrados = []
+    for plan in planes:
+        for i, fila in enumerate(plan['filas']):
+            pdf_name = fila[4]
+            if pdf_name in vistos:
+                base, extension = os.path.splitext(pdf_name)
+                numero = 2
+                while f"{base}_{numero}{extension}" in usados:
+                    numero += 1
+                pdf_name = f"{base}_{numero}{extension}"
+                usados.add(pdf_name)
+                plan['filas'][i] = fila[:4] + (pdf_name,)
+                renombrados.append((fila[4], pdf_name))
+            vistos.add(pdf_name)
+
+    if renombrados:
+        ejemplos = ", ".join(f"{original} → {nuevo}" for original, nuevo in renombrados[:3])
+        avisar('warning', f"⚠️ {len(renombrados)} estudiantes tienen el mismo nombre y curso que otro; sus "
+                          f"certificados se numeran para no taparse ({ejemplos}{', ...' if len(renombrados) > 3 else ''})")
+    return renombrados
+
+
+def planificar_grupo(grupo_df, plantilla_bytes, plantilla_key, nombre_grupo, styles_config_by_template, nombre_archivo,
+    avisar=sin_avisos, backend='reportlab', usar_cache=True):
+    ruta_marca_agua = ruta_marca_agua_grupo(plantilla_key, nombre_archivo, styles_config_by_template, avisar)
+
+    # Con caché la salida tiene que ser determinista para que los PDFs guardados sean reutilizables
+    contexto = crear_contexto_grupo(plantilla_key, plantilla_bytes, styles_config_by_template, ruta_marca_agua,
+                                    backend=backend, determinista=usar_cache)
+    filas = preparar_filas(grupo_df, plantilla_key)
+
+    # Sólo se generan las filas cuyo PDF no está en la caché
+    claves = []
+    por_generar = set(range(len(filas)))
+    if usar_cache:
+        huella_grupo = cache_pdf.huella_contexto(contexto)
+        claves = [cache_pdf.clave_certificado(huella_grupo, *fila[:4]) for fila in filas]
+        por_generar = {i for i, clave in enumerate(claves) if not cache_pdf.esta_en_cache(clave)}
+
+    return {
+        'grupo': nombre_grupo,
+        'plantilla_key': plantilla_key,
+        'contexto': contexto,
+        'filas': filas,
+        # Fila de cada estudiante en la planilla (1 = primero), para el índice del ZIP
+        'filas_planilla': [int(indice) + 1 for indice in grupo_df.index],
+        'claves': claves,
+        'por_generar': por_generar,
+        'usar_cache': usar_cache,
+    }
+
+
+# Lo que hay que mandar a renderizar de cada plan: (contexto, filas que faltan en la caché)
+def tareas_render(planes):
+    return [(plan['contexto'], [fila for i, fila in enumerate(plan['filas']) if i in plan['por_generar']])
+            for plan in planes]
+
+
+# Escribe en el ZIP los certificados de un grupo: los de la caché y los que llegan renderizados en `generados`.
+# Con `control` (el ZipReanudable donde se escribe) se saltan las filas que ya estaban y se registra cada fila
+def escribir_grupo(plan, generados, zip_file, al_avanzar, estudiantes_base, total_estudiantes, avisar=sin_avisos,
+    corrida=None, prefijo='', control=None):
+    certificados_generados = 0
+    contexto, filas, claves, por_generar = plan['contexto'], plan['filas'], plan['claves'], plan['por_generar']
+    reutilizados = 0
+    retomados = 0
+
+    for i, fila in enumerate(filas):
+        nombre, pdf_name = fila[0], fila[4]
+        clave = clave_fila(plan, i, prefijo)
+        if control is not None and clave in control.hechas:
+            retomados += 1
+            certificados_generados += 1
+            al_avanzar(estudiantes_base + i + 1, total_estudiantes)
+            continue
+
+        if i in por_generar:
+            _fila, pdf_bytes, error, segundos = next(generados)
+            metricas.registrar_certificado(corrida, segundos, pdf_bytes, error)
+            if plan['usar_cache'] and not error:
+                cache_pdf.guardar(claves[i], pdf_bytes)
+        else:
+            pdf_bytes, error = cache_pdf.leer(claves[i]), None
+            if pdf_bytes is None:
+                # Otra sesión lo sacó de la caché después de revisarla
+                pdf_bytes, error, segundos = renderizar_lote(contexto, [fila])[0]
+                metricas.registrar_certificado(corrida, segundos, pdf_bytes, error)
+            else:
+                reutilizados += 1
+
+        if error:
+            avisar('fallo', f"Error generando certificado para {nombre}: {error}")
+            if control is not None:
+                control.marcar_fallida(clave, fila, plan['grupo'], plan['plantilla_key'], error)
+            # Las filas que fallan también cuentan para el avance (y el tiempo restante)
+            al_avanzar(estudiantes_base + i + 1, total_estudiantes)
+            continue
+
+        # Añadir al ZIP
+        inicio = time.perf_counter()
+        agregar_al_zip(zip_file, prefijo + pdf_name, pdf_bytes, [registro_certificado(plan, i)])
+        metricas.registrar(corrida, 'zip', time.perf_counter() - inicio, cantidad=1, bytes_producidos=len(pdf_bytes))
+        if control is not None:
+            control.marcar_hecha(clave)
+
+        certificados_generados += 1
+
+        # Actualizar progreso
+        al_avanzar(estudiantes_base + i + 1, total_estudiantes)
+
+    if retomados:
+        avisar('info', f"⏩ {plan['grupo']}: {retomados} ya estaban en el ZIP desde el último punto de control")
+    if plan['usar_cache']:
+        generados_grupo = len(filas) - reutilizados - retomados
+        metricas.registrar_cache(corrida, reutilizados, generados_grupo)
+        avisar('info', f"♻️ {plan['grupo']}: {reutilizados} reutilizados de la caché, {generados_grupo} generados")
+
+    return certificados_generados
+
+
+# Genera certificados para un grupo específico con su plantilla y estilos correspondientes
+def generar_certificados_grupo(grupo_df, plantilla_bytes, plantilla_key, nombre_grupo, zip_file, al_avanzar,
+    estudiantes_base, total_estudiantes, styles_config_by_template, nombre_archivo, avisar=sin_avisos,
+    max_workers=None, backend='reportlab', usar_cache=True, corrida=None):
+    plan = planificar_grupo(grupo_df, plantilla_bytes, plantilla_key, nombre_grupo, styles_config_by_template,
+                            nombre_archivo, avisar, backend, usar_cache)
+    # Los PDFs se generan en paralelo y llegan en el orden de las filas
+    generados = renderizar_tareas(tareas_render([plan]), max_workers)
+    return escribir_grupo(plan, generados, zip_file, al_avanzar, estudiantes_base, total_estudiantes, avisar, corrida)
+
+
+# Escribe en un ZIP abierto los certificados de todos los grupos de un archivo, bajo `prefijo`
+def escribir_archivo(planes, generados, zip_file, al_avanzar=sin_avance, avisar=sin_avisos, corrida=None,
+    prefijo='', control=None):
+    total_estudiantes = sum(len(plan['filas']) for plan in planes)
+    estudiantes_procesados = 0
+    total_generados = 0
+
+    # Crear directorio para constancias
+    zip_file.writestr(prefijo + "Constancias/", "")
+
+    for plan in planes:
+        avisar('write', f"Procesando {plan['grupo']} ({len(plan['filas'])} estudiantes) con plantilla "
+                        f"{plan['plantilla_key']}...")
+
+        certificados_gen = escribir_grupo(plan, generados, zip_file, al_avanzar, estudiantes_procesados,
+                                          total_estudiantes, avisar, corrida, prefijo, control)
+
+        estudiantes_procesados += len(plan['filas'])
+        total_generados += certificados_gen
+
+        avisar('success', f"✅ {plan['grupo']}: {certificados_gen} certificados generados con estilo "
+                          f"{plan['plantilla_key']}")
+
+    return total_generados
+
+
+# Escribe una entrada con los registros de sus certificados en el índice; un ZipFile común (como el de los
+# benchmarks) no lleva índice
+def agregar_al_zip(zip_file, nombre, datos, certificados):
+    if isinstance(zip_file, ZipVolumenes):
+        zip_file.writestr(nombre, datos, certificados)
+    else:
+        zip_file.writestr(nombre, datos)
+
+
+# PDFs combinados de un archivo como (nombre en el ZIP, páginas, registros del índice de cada página),
+# con páginas = [(contexto, fila, seccion)]
+def documentos_combinados(planes, nombre_archivo, modo):
+    nombre_base = os.path.splitext(nombre_zip_descarga(nombre_archivo))[0]
+    if modo == 'grupo':
+        # Las constancias de participación van en su carpeta, como en la salida individual
+        conjuntos = []
+        for plan in planes:
+            carpeta = "Constancias/" if plan['plantilla_key'] == 'fondo_2' else ""
+            conjuntos.append((f"{carpeta}{nombre_base}_{plan['grupo']}",
+                              [(plan, i, None) for i in range(len(plan['filas']))]))
+    else:
+        conjuntos = [(nombre_base, [(plan, i, plan['grupo']) for plan in planes for i in range(len(plan['filas']))])]
+
+    documentos = []
+    for nombre, filas in conjuntos:
+        partes = [filas[i:i + PAGINAS_POR_PDF] for i in range(0, len(filas), PAGINAS_POR_PDF)]
+        for numero_parte, parte in enumerate(partes, 1):
+            sufijo = f"_parte_{numero_parte}" if len(partes) > 1 else ""
+            documentos.append((f"{nombre}{sufijo}.pdf",
+                               [(plan['contexto'], plan['filas'][i], seccion) for plan, i, seccion in parte],
+                               [registro_certificado(plan, i, pagina) for pagina, (plan, i, _seccion)
+                                in enumerate(parte, 1)]))
+    return documentos
+
+
+# Escribe en un ZIP abierto los PDFs combinados (modo 'grupo' o 'archivo') de un archivo, bajo `prefijo`
+def escribir_combinado(planes, zip_file, nombre_archivo, modo, al_avanzar=sin_avance, avisar=sin_avisos,
+    max_workers=None, corrida=None, prefijo=''):
+    documentos = documentos_combinados(planes, nombre_archivo, modo)
+    total_estudiantes = sum(len(paginas) for _nombre, paginas, _registros in documentos)
+    estudiantes_procesados = 0
+    total_generados = 0
+
+    if any(nombre.startswith("Constancias/") for nombre, _paginas, _registros in documentos):
+        zip_file.writestr(prefijo + "Constancias/", "")
+
+    resultados = renderizar_documentos([paginas for _nombre, paginas, _registros in documentos], max_workers)
+    for (nombre_pdf, paginas, registros), (pdf_bytes, error, segundos) in zip(documentos, resultados):
+        metricas.registrar(corrida, 'render', segundos, cantidad=len(paginas), bytes_producidos=len(pdf_bytes or b''),
+                           errores=1 if error else 0)
+        estudiantes_procesados += len(paginas)
+        if error:
+            avisar('fallo', f"Error generando {nombre_pdf}: {error}")
+            al_avanzar(estudiantes_procesados, total_estudiantes)
+            continue
+
+        inicio = time.perf_counter()
+        agregar_al_zip(zip_file, prefijo + nombre_pdf, pdf_bytes, registros)
+        metricas.registrar(corrida, 'zip', time.perf_counter() - inicio, cantidad=len(paginas),
+                           bytes_producidos=len(pdf_bytes))
+
+        total_generados += len(paginas)
+        al_avanzar(estudiantes_procesados, total_estudiantes)
+        avisar('success', f"✅ {nombre_pdf}: {len(paginas)} certificados")
+
+    return total_generados
+
+
+# Genera el ZIP con los certificados de todos los grupos
+def generar_zip(grupos, plantillas, nombre_archivo, ruta_zip, al_avanzar=sin_avance, avisar=sin_avisos,
+    max_workers=None, backend='reportlab', usar_cache=True, corrida=None, modo='individual', empaque=None,
+    perfil=None):
+    """
+    Escribe en ruta_zip los certificados de todos los grupos y devuelve cuántos se generaron.
+    Con modo 'grupo' o 'archivo' los certificados van en PDFs de varias páginas (siempre con reportlab y sin caché).
+    En modo 'individual' el ZIP guarda puntos de control (ver reanudacion): volver a llamarla con las mismas filas
+    retoma una corrida cortada o reintenta sólo las filas que fallaron.
+    Si se pasa una corrida (metricas.nueva_corrida) se registran en ella los tiempos de cada etapa.
+    Con `perfil` ('muestreo' o 'determinista') el perfil de la corrida queda junto al ZIP (ver perfil)
+    """
+    with perfilar(ruta_zip, perfil, avisar):
+        return _generar_zip(grupos, plantillas, nombre_archivo, ruta_zip, al_avanzar, avisar, max_workers, backend,
+                            usar_cache, corrida, modo, empaque)
+
+
+def _generar_zip(grupos, plantillas, nombre_archivo, ruta_zip, al_avanzar, avisar, max_workers, backend, usar_cache,
+    corrida, modo, empaque):
+    inicio = time.perf_counter()
+    if modo != 'individual':
+        planes = planificar_grupos(grupos, plantillas, nombre_archivo, avisar, usar_cache=False)
+        with escribir_zip(ruta_zip, empaque) as zip_file:
+            total_generados = escribir_combinado(planes, zip_file, nombre_archivo, modo, al_avanzar, avisar,
+                                                 max_workers, corrida)
+        metricas.registrar(corrida, 'generacion', time.perf_counter() - inicio, cantidad=total_generados,
+                           bytes_producidos=tamano_salida(ruta_zip))
+        return total_generados
+
+    planes = planificar_grupos(grupos, plantillas, nombre_archivo, avisar, backend, usar_cache)
+
+    # Si una corrida anterior con las mismas filas se cortó, se retoma desde su último punto de control
+    with escribir_zip_reanudable(ruta_zip, huella_planes(planes, empaque), empaque) as zip_file:
+        descartar_hechas(planes, zip_file.hechas)
+        # Un solo flujo de render para todos los grupos: el pool no espera a que termine cada grupo
+        generados = renderizar_tareas(tareas_render(planes), max_workers)
+        total_generados = escribir_archivo(planes, generados, zip_file, al_avanzar, avisar, corrida,
+                                           control=zip_file)
+
+    if usar_cache:
+        cache_pdf.recortar_cache(claves_corrida=[clave for plan in planes for clave in plan['claves']], avisar=avisar)
+
+    metricas.registrar(corrida, 'generacion', time.perf_counter() - inicio, cantidad=total_generados,
+                       bytes_producidos=tamano_salida(ruta_zip))
+    return total_generados
@@ -0,0 +1,176 @@
+"""
+Render de certificados repartido en un pool de procesos.
+
+Las filas se envían en lotes a los workers y los resultados vuelven en el
+mismo orden de las filas, así el ZIP queda igual que en una corrida serial.
+El contexto de cada grupo (con los bytes de la plantilla) no viaja con cada
+lote: se publica una vez en un archivo y cada worker lo carga la primera vez
+que lo necesita.
+"""
+import atexit
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from certificados import perfil, render, render_pymupdf
+from certificados.recursos import huella_bytes
+
+# Backends de render disponibles; el contexto de cada grupo indica cuál usar
+BACKENDS = {
+    'reportlab': render.renderizar_certificado,
+    'pymupdf': render_pymupdf.renderizar_certificado,
+}
+
+# Filas por tarea enviada a un worker
+TAMANO_LOTE = 16
+
+# Pools creados en el proceso, uno por cantidad de workers
+_pools = {}
+
+# Contextos que un worker guarda en memoria, por ruta; cada corrida usa uno por plantilla
+CONTEXTOS_POR_WORKER = 8
+_contextos = {}
+
+# Carpeta del proceso principal con los contextos publicados; se borra al salir
+_lock = threading.Lock()
+_directorio_contextos = None
+
+
+def workers_por_defecto():
+    """Cantidad de workers: variable CERTIFICADOS_WORKERS o, si no está, los núcleos disponibles"""
+    valor = os.environ.get('CERTIFICADOS_WORKERS')
+    if valor:
+        return max(1, int(valor))
+    return os.cpu_count() or 1
+
+
+def obtener_pool(max_workers):
+    # "spawn" evita heredar por fork los hilos del servidor de Streamlit
+    if max_workers not in _pools:
+        _pools[max_workers] = ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+    return _pools[max_workers]
+
+
+# Tarea que corre en el worker: devuelve (pdf_bytes, error, segundos) por cada fila del lote
+def renderizar_lote(contexto, filas):
+    renderizar_certificado = BACKENDS[contexto['backend']]
+    resultados = []
+    for nombre, curso, numero, horas_progresivo, _pdf_name in filas:
+        inicio = time.perf_counter()
+        try:
+            pdf_bytes, error = renderizar_certificado(contexto, nombre, curso, numero, horas_progresivo), None
+        except Exception as e:
+            pdf_bytes, error = None, str(e)
+        resultados.append((pdf_bytes, error, time.perf_counter() - inicio))
+    return resultados
+
+
+def publicar_contexto(contexto):
+    """
+    Guarda el contexto en un archivo para los workers y devuelve su ruta. El nombre es la huella del contenido:
+    un mismo contexto se escribe una sola vez aunque lo usen varias corridas
+    """
+    global _directorio_contextos
+    with _lock:
+        if _directorio_contextos is None:
+            _directorio_contextos = tempfile.mkdtemp(prefix='certificados_contextos_')
+            atexit.register(shutil.rmtree, _directorio_contextos, True)
+    datos = pickle.dumps(contexto, pickle.HIGHEST_PROTOCOL)
+    ruta = os.path.join(_directorio_contextos, f"{huella_bytes(datos)}.pickle")
+    if not os.path.exists(ruta):
+        descriptor, temporal = tempfile.mkstemp(dir=_directorio_contextos, suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as f:
+            f.write(datos)
+        os.replace(temporal, ruta)
+    return ruta
+
+
+# Función para obtener en el worker un contexto publicado: se lee del archivo sólo la primera vez
+def _cargar_contexto(ruta):
+    contexto = _contextos.get(ruta)
+    if contexto is None:
+        with open(ruta, 'rb') as f:
+            contexto = pickle.load(f)
+        if len(_contextos) >= CONTEXTOS_POR_WORKER:
+            _contextos.pop(next(iter(_contextos)))
+        _contextos[ruta] = contexto
+    return contexto
+
+
+# Tarea que corre en el worker: renderizar_lote con el contexto publicado en `ruta_contexto`
+def renderizar_lote_publicado(ruta_contexto, filas):
+    return renderizar_lote(_cargar_contexto(ruta_contexto), filas)
+
+
+# Tarea que corre en el worker: un PDF de varias páginas. Devuelve (pdf_bytes, error, segundos)
+def renderizar_documento(paginas, determinista=False):
+    inicio = time.perf_counter()
+    try:
+        pdf_bytes, error = render.renderizar_pdf_combinado(paginas, determinista), None
+    except Exception as e:
+        pdf_bytes, error = None, str(e)
+    return pdf_bytes, error, time.perf_counter() - inicio
+
+
+def renderizar_documentos(documentos, max_workers=None, determinista=False):
+    """
+    Genera (pdf_bytes, error, segundos) por cada lista de páginas de `documentos`, en orden.
+    Cada documento va entero a un worker; como mucho hay uno en vuelo por worker, para acotar la memoria
+    """
+    if max_workers is None:
+        max_workers = workers_por_defecto()
+
+    if max_workers <= 1 or len(documentos) <= 1:
+        for paginas in documentos:
+            yield renderizar_documento(paginas, determinista)
+        return
+
+    pool = obtener_pool(max_workers)
+    pendientes = deque()
+    for paginas in documentos:
+        pendientes.append(perfil.enviar_tarea(pool, renderizar_documento, paginas, determinista))
+        if len(pendientes) >= max_workers:
+            yield pendientes.popleft().result()
+    while pendientes:
+        yield pendientes.popleft().result()
+
+
+def renderizar_tareas(tareas, max_workers=None, tamano_lote=TAMANO_LOTE):
+    """
+    Genera (fila, pdf_bytes, error, segundos) para cada fila de una lista de (contexto, filas) de varios grupos
+    o archivos, en el orden recibido. Con un solo worker, o pocas filas, el render se hace en el proceso actual.
+    Los lotes de todos los grupos comparten el pool, así los grupos chicos no se renderizan uno tras otro
+    """
+    if max_workers is None:
+        max_workers = workers_por_defecto()
+
+    if max_workers <= 1 or sum(len(filas) for _contexto, filas in tareas) <= tamano_lote:
+        for contexto, filas in tareas:
+            for fila in filas:
+                yield (fila,) + renderizar_lote(contexto, [fila])[0]
+        return
+
+    pool = obtener_pool(max_workers)
+    # Cada lote lleva sólo sus filas y la ruta del contexto de su grupo, publicado una vez por tarea
+    publicadas = ((publicar_contexto(contexto), filas) for contexto, filas in tareas)
+    lotes = ((ruta, filas[i:i + tamano_lote]) for ruta, filas in publicadas for i in range(0, len(filas), tamano_lote))
+    # Sólo se mantienen en vuelo dos lotes por worker para acotar la memoria
+    pendientes = deque()
+    for ruta, lote in lotes:
+        pendientes.append((lote, perfil.enviar_tarea(pool, renderizar_lote_publicado, ruta, lote)))
+        if len(pendientes) >= max_workers * 2:
+            yield from _entregar(*pendientes.popleft())
+    while pendientes:
+        yield from _entregar(*pendientes.popleft())
+
+
+def _entregar(lote, futuro):
+    for fila, resultado in zip(lote, futuro.result()):
+        yield (fila,) + resultado
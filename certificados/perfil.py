@@ -0,0 +1,216 @@
+"""
+Perfil de una corrida de generación, para ver por qué una planilla en particular es lenta.
+
+Se activa por corrida o por trabajo (o para todo el proceso con CERTIFICADOS_PERFIL):
+
+    muestreo      un hilo toma la pila del hilo que genera cada INTERVALO_MUESTREO segundos
+    determinista  además corre cProfile (más exacto, pero hace más lenta la corrida)
+
+Los workers de render perfilan cada tarea que reciben y dejan su parte en una carpeta
+temporal. Al terminar, junto al ZIP quedan:
+
+    <zip>.perfil.pstats   para pstats o snakeviz (con muestreo, las "llamadas" son muestras)
+    <zip>.perfil.folded   pilas colapsadas para flamegraph.pl o speedscope, con las del
+                          proceso principal bajo 'generacion' y las de los workers bajo 'render'
+
+Con el perfil apagado el único costo es revisar si hay una sesión activa al enviar cada
+lote a los workers.
+"""
+import cProfile
+import marshal
+import os
+import pstats
+import shutil
+import sys
+import threading
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+MODOS_PERFIL = ['muestreo', 'determinista']
+
+# Perfil de todas las corridas del proceso: '' (apagado), 'muestreo' o 'determinista'
+PERFIL = os.environ.get('CERTIFICADOS_PERFIL', '')
+
+# Segundos entre muestras de la pila
+INTERVALO_MUESTREO = float(os.environ.get('CERTIFICADOS_PERFIL_INTERVALO', 0.005))
+
+_local = threading.local()
+
+
+def ruta_pstats(ruta_zip):
+    return os.path.splitext(ruta_zip)[0] + '.perfil.pstats'
+
+
+def ruta_flamegraph(ruta_zip):
+    return os.path.splitext(ruta_zip)[0] + '.perfil.folded'
+
+
+def sesion_actual():
+    """Sesión de perfil del hilo actual, o None si no se está perfilando"""
+    return getattr(_local, 'sesion', None)
+
+
+def _muestrear(sesion):
+    # Corre en su propio hilo: cuenta cuántas veces se vio cada pila del hilo perfilado
+    while not sesion['detener'].wait(sesion['intervalo']):
+        frame = sys._current_frames().get(sesion['hilo'])
+        pila = []
+        while frame is not None:
+            pila.append(frame.f_code)
+            frame = frame.f_back
+        if pila:
+            sesion['muestras'][tuple(reversed(pila))] += 1
+
+
+def _iniciar(modo, intervalo):
+    sesion = {
+        'modo': modo, 'intervalo': intervalo, 'hilo': threading.get_ident(), 'muestras': Counter(),
+        'detener': threading.Event(), 'cprofile': None,
+    }
+    if modo == 'determinista':
+        sesion['cprofile'] = cProfile.Profile()
+        try:
+            sesion['cprofile'].enable()
+        except ValueError:
+            # Otro perfil determinista ya está activo en el proceso: queda sólo el muestreo
+            sesion['cprofile'] = None
+    sesion['muestreador'] = threading.Thread(target=_muestrear, args=(sesion,), daemon=True,
+                                             name='perfil-muestreo')
+    sesion['muestreador'].start()
+    return sesion
+
+
+def _detener(sesion):
+    if sesion['cprofile'] is not None:
+        sesion['cprofile'].disable()
+    sesion['detener'].set()
+    sesion['muestreador'].join()
+
+
+def _clave(codigo):
+    return codigo.co_filename, codigo.co_firstlineno, codigo.co_name
+
+
+def _etiqueta(codigo):
+    return f"{getattr(codigo, 'co_qualname', codigo.co_name)} ({os.path.basename(codigo.co_filename)}:" \
+           f"{codigo.co_firstlineno})"
+
+
+def stats_de_muestras(muestras, intervalo):
+    """Las muestras en el formato de pstats: el tiempo de cada función es muestras x intervalo"""
+    stats = {}
+    for pila, cantidad in muestras.items():
+        segundos = cantidad * intervalo
+        claves = [_clave(codigo) for codigo in pila]
+        vistas = set()
+        for i, clave in enumerate(claves):
+            cc, nc, tt, ct, llamadores = stats.get(clave, (0, 0, 0.0, 0.0, {}))
+            propio = segundos if i == len(claves) - 1 else 0.0
+            # Una función recursiva cuenta una sola vez por muestra en el tiempo acumulado
+            if clave not in vistas:
+                vistas.add(clave)
+                cc, nc, ct = cc + cantidad, nc + cantidad, ct + segundos
+            if i > 0:
+                anterior = llamadores.get(claves[i - 1], (0, 0, 0.0, 0.0))
+                llamadores[claves[i - 1]] = (anterior[0] + cantidad, anterior[1] + cantidad,
+                                             anterior[2] + propio, anterior[3] + segundos)
+            stats[clave] = (cc, nc, tt + propio, ct, llamadores)
+    return stats
+
+
+def _lineas_flamegraph(muestras, raiz):
+    lineas = Counter()
+    for pila, cantidad in muestras.items():
+        lineas[';'.join([raiz] + [_etiqueta(codigo) for codigo in pila])] += cantidad
+    return lineas
+
+
+def _guardar(sesion, ruta_base, raiz):
+    # <ruta_base>.pstats y <ruta_base>.folded con lo que juntó la sesión
+    if sesion['cprofile'] is not None:
+        sesion['cprofile'].dump_stats(ruta_base + '.pstats')
+    else:
+        with open(ruta_base + '.pstats', 'wb') as f:
+            marshal.dump(stats_de_muestras(sesion['muestras'], sesion['intervalo']), f)
+    with open(ruta_base + '.folded', 'w', encoding='utf-8') as f:
+        for pila, cantidad in _lineas_flamegraph(sesion['muestras'], raiz).items():
+            f.write(f"{pila} {cantidad}\n")
+
+
+def ejecutar_perfilado(directorio, modo, intervalo, funcion, *args):
+    """Corre en el worker: perfila una tarea y deja su parte en `directorio`"""
+    sesion = _iniciar(modo, intervalo)
+    try:
+        return funcion(*args)
+    finally:
+        _detener(sesion)
+        try:
+            _guardar(sesion, os.path.join(directorio, f"{os.getpid()}-{uuid.uuid4().hex}"), 'render')
+        except OSError:
+            # La corrida ya terminó y borró la carpeta; esta parte se pierde
+            pass
+
+
+def enviar_tarea(pool, funcion, *args):
+    """pool.submit(funcion, *args); si el hilo actual se está perfilando, la tarea se perfila en el worker"""
+    sesion = sesion_actual()
+    if sesion is None:
+        return pool.submit(funcion, *args)
+    return pool.submit(ejecutar_perfilado, sesion['partes'], sesion['modo'], sesion['intervalo'], funcion, *args)
+
+
+def _unir(sesion, ruta_zip):
+    # Perfil del proceso principal más las partes de los workers, en los dos archivos finales
+    base_principal = os.path.join(sesion['partes'], 'principal')
+    _guardar(sesion, base_principal, 'generacion')
+    partes = sorted(nombre[:-len('.pstats')] for nombre in os.listdir(sesion['partes']) if nombre.endswith('.pstats'))
+
+    estadisticas = pstats.Stats(base_principal + '.pstats')
+    lineas = Counter()
+    for parte in partes:
+        ruta = os.path.join(sesion['partes'], parte)
+        if parte != 'principal':
+            estadisticas.add(ruta + '.pstats')
+        with open(ruta + '.folded', encoding='utf-8') as f:
+            for linea in f:
+                pila, _espacio, cantidad = linea.rstrip('\n').rpartition(' ')
+                lineas[pila] += int(cantidad)
+
+    estadisticas.dump_stats(ruta_pstats(ruta_zip))
+    with open(ruta_flamegraph(ruta_zip), 'w', encoding='utf-8') as f:
+        for pila, cantidad in sorted(lineas.items()):
+            f.write(f"{pila} {cantidad}\n")
+
+
+@contextmanager
+def perfilar(ruta_zip, modo=None, avisar=None):
+    """
+    Perfila lo que corre dentro del bloque, en este hilo y en los workers de render, y deja el perfil junto a
+    ruta_zip (ver ruta_pstats y ruta_flamegraph). Con modo '' (o None y CERTIFICADOS_PERFIL vacía) no hace nada
+    """
+    modo = PERFIL if modo is None else modo
+    if not modo or sesion_actual() is not None:
+        yield None
+        return
+    if modo not in MODOS_PERFIL:
+        raise ValueError(f"Modo de perfil desconocido: '{modo}'. Usa {', '.join(MODOS_PERFIL)}")
+
+    sesion = _iniciar(modo, INTERVALO_MUESTREO)
+    sesion['partes'] = os.path.splitext(ruta_zip)[0] + '.perfil.partes'
+    os.makedirs(sesion['partes'], exist_ok=True)
+    _local.sesion = sesion
+    try:
+        yield sesion
+    finally:
+        _local.sesion = None
+        _detener(sesion)
+        try:
+            _unir(sesion, ruta_zip)
+            if avisar:
+                avisar('info', f"📈 Perfil ({modo}) en {ruta_pstats(ruta_zip)} y {ruta_flamegraph(ruta_zip)}")
+        except OSError as e:
+            if avisar:
+                avisar('warning', f"⚠️ No se pudo guardar el perfil: {e}")
+        finally:
+            shutil.rmtree(sesion['partes'], ignore_errors=True)
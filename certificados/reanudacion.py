@@ -0,0 +1,213 @@
+"""
+Puntos de control de la generación, para retomar un ZIP a medio escribir.
+
+Cada tantas filas los volúmenes en curso (`.part`) se bajan a disco y en
+`<zip>.control.json` se guarda qué filas ya están adentro, cuáles fallaron y, por
+volumen, cuántos bytes tenía escritos y sus entradas. Si el proceso se cae, la
+siguiente corrida con las mismas filas corta cada `.part` en esos bytes y sigue
+agregando sólo las filas que faltan; el directorio central se arma con las
+entradas guardadas al cerrar.
+
+Las filas que fallan quedan en `<zip>.fallidos.json` con sus datos y el error.
+Volver a correr la misma planilla reintenta sólo esas filas sobre el ZIP ya
+terminado; cuando no queda ninguna se borran los dos archivos.
+"""
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+from certificados import cache_pdf
+from certificados.empaquetado import EscritorZip, ZipVolumenes, opciones_empaque
+
+# Filas escritas entre un punto de control y el siguiente
+FILAS_POR_PUNTO_CONTROL = int(os.environ.get('CERTIFICADOS_PUNTO_CONTROL', 200))
+
+
+def ruta_control(ruta_zip):
+    return os.path.splitext(ruta_zip)[0] + '.control.json'
+
+
+def ruta_fallidos(ruta_zip):
+    return os.path.splitext(ruta_zip)[0] + '.fallidos.json'
+
+
+def clave_fila(plan, indice, prefijo=''):
+    return f"{prefijo}{plan['grupo']}/{indice}"
+
+
+def huella_planes(planes, empaque=None):
+    """Huella de todo lo que va en el ZIP y de cómo se empaqueta: si cambia, el punto de control no sirve"""
+    datos = [[plan['grupo'], cache_pdf.huella_contexto(plan['contexto']), plan['filas']] for plan in planes]
+    datos.append(empaque or opciones_empaque())
+    return hashlib.sha256(json.dumps(datos, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def leer_control(ruta_zip, huella):
+    """Punto de control guardado para estas filas, o None si no hay uno que sirva"""
+    try:
+        with open(ruta_control(ruta_zip), encoding='utf-8') as f:
+            control = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if control.get('huella') != huella or 'volumenes' not in control:
+        return None
+    for volumen in control['volumenes']:
+        # Un punto de control de una versión anterior (sin el índice de los certificados o con el directorio
+        # central copiado tal cual) no sirve
+        if 'certificados' not in volumen or 'tamano' not in volumen:
+            return None
+        for ruta in (volumen['ruta_parcial'], volumen['ruta_final']):
+            if ruta and os.path.exists(ruta) and os.path.getsize(ruta) >= volumen['tamano']:
+                volumen['ruta'] = ruta
+                break
+        else:
+            return None
+    return control
+
+
+def descartar_hechas(planes, hechas, prefijo=''):
+    """Saca de por_generar las filas que ya están en el ZIP. Devuelve cuántas había"""
+    descartadas = 0
+    for plan in planes:
+        ya_hechas = {i for i in range(len(plan['filas'])) if clave_fila(plan, i, prefijo) in hechas}
+        plan['por_generar'] -= ya_hechas
+        descartadas += len(ya_hechas)
+    return descartadas
+
+
+def _escribir_json(ruta, datos):
+    ruta_parcial = f"{ruta}.{threading.get_ident()}.part"
+    with open(ruta_parcial, 'w', encoding='utf-8') as f:
+        json.dump(datos, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(ruta_parcial, ruta)
+
+
+def _borrar(ruta):
+    try:
+        os.unlink(ruta)
+    except FileNotFoundError:
+        pass
+
+
+class ZipReanudable(ZipVolumenes):
+    """
+    Un ZipVolumenes que además registra qué filas quedaron escritas (marcar_hecha) o fallaron (marcar_fallida)
+    y guarda un punto de control de todos sus volúmenes cada FILAS_POR_PUNTO_CONTROL filas
+    """
+
+    def __init__(self, ruta_zip, huella, empaque=None, filas_por_punto=None):
+        super().__init__(ruta_zip, empaque)
+        self.huella = huella
+        self.filas_por_punto = filas_por_punto or FILAS_POR_PUNTO_CONTROL
+        self.pendientes = 0
+
+        control = leer_control(ruta_zip, huella)
+        if control is None:
+            _borrar(ruta_control(ruta_zip))
+            _borrar(ruta_fallidos(ruta_zip))
+            self.hechas = set()
+            self.fallidos = {}
+        else:
+            # Volver cada volumen a como estaba en el punto de control: lo escrito después se descarta
+            for volumen in control['volumenes']:
+                if volumen['ruta'] != volumen['ruta_parcial']:
+                    os.replace(volumen['ruta'], volumen['ruta_parcial'])
+                escritor = EscritorZip(volumen['ruta_parcial'], volumen['directorio'], volumen['tamano'])
+                self._nuevo_volumen(volumen['clave'], escritor,
+                                    numero=volumen['numero'], ruta_parcial=volumen['ruta_parcial'],
+                                    reserva=volumen['reserva'], entradas=volumen['entradas'],
+                                    certificados=volumen['certificados'])
+            self.hechas = set(control['hechas'])
+            self.fallidos = {fallido['clave']: fallido for fallido in control['fallidos']}
+        self.nombres = {nombre for volumen in self.volumenes for nombre in volumen['zip'].namelist()}
+
+    def writestr(self, nombre, datos, certificados=None):
+        # Las carpetas ya creadas antes del punto de control no se repiten
+        if nombre.endswith('/') and nombre in self.nombres:
+            return
+        super().writestr(nombre, datos, certificados)
+        self.nombres.add(nombre)
+
+    def marcar_hecha(self, clave):
+        self.hechas.add(clave)
+        self.fallidos.pop(clave, None)
+        self._contar()
+
+    def marcar_fallida(self, clave, fila, grupo, plantilla_key, error):
+        nombre, curso, numero, horas_progresivo, pdf_name = fila
+        self.fallidos[clave] = {
+            'clave': clave, 'grupo': grupo, 'plantilla': plantilla_key, 'nombre': nombre, 'curso': curso,
+            'numero': numero, 'horas': horas_progresivo, 'pdf': pdf_name, 'error': str(error),
+        }
+        self._contar()
+
+    def _contar(self):
+        self.pendientes += 1
+        if self.pendientes >= self.filas_por_punto:
+            self.punto_control()
+
+    def punto_control(self):
+        """Baja los volúmenes a disco y guarda el punto de control; se sigue agregando sobre los mismos archivos"""
+        self._escribir_listas(todas=True)
+        volumenes = []
+        for volumen in self.volumenes:
+            volumen['zip'].sincronizar()
+            volumenes.append({
+                'clave': volumen['clave'], 'numero': volumen['numero'], 'ruta_parcial': volumen['ruta_parcial'],
+                'ruta_final': None, 'reserva': volumen['reserva'],
+                'entradas': volumen['entradas'], 'certificados': volumen['certificados'],
+                'tamano': volumen['zip'].tamano, 'directorio': list(volumen['zip'].directorio),
+            })
+        self.control = {
+            'huella': self.huella,
+            'volumenes': volumenes,
+            'hechas': sorted(self.hechas),
+            'fallidos': list(self.fallidos.values()),
+        }
+        _escribir_json(ruta_control(self.ruta_zip), self.control)
+        if self.fallidos:
+            _escribir_json(ruta_fallidos(self.ruta_zip), list(self.fallidos.values()))
+        else:
+            _borrar(ruta_fallidos(self.ruta_zip))
+        self.pendientes = 0
+
+    def terminar(self):
+        """Cierra los volúmenes con su nombre final; el punto de control sólo se conserva si quedaron filas fallidas"""
+        self.punto_control()
+        rutas = self.cerrar()
+        if self.fallidos:
+            # Al retomar se buscan los volúmenes con su nombre final; el manifiesto queda después del punto
+            # de control y se descarta
+            for volumen, ruta in zip(self.control['volumenes'], rutas):
+                volumen['ruta_final'] = ruta
+            _escribir_json(ruta_control(self.ruta_zip), self.control)
+        else:
+            _borrar(ruta_control(self.ruta_zip))
+
+    def interrumpir(self):
+        # Guarda lo hecho hasta ahora; si el ZIP quedó a medio escribir vale el punto de control anterior
+        try:
+            self.punto_control()
+        except (OSError, ValueError):
+            pass
+        for volumen in self.volumenes:
+            volumen['zip'].abandonar()
+
+
+@contextmanager
+def escribir_zip_reanudable(ruta_zip, huella, empaque=None, filas_por_punto=None):
+    """
+    Como escribir_zip, pero retoma los `.part` de una corrida anterior con la misma huella y no los borra si
+    la corrida se corta, para retomarla después
+    """
+    zip_file = ZipReanudable(ruta_zip, huella, empaque, filas_por_punto)
+    try:
+        yield zip_file
+    except BaseException:
+        zip_file.interrumpir()
+        raise
+    zip_file.terminar()
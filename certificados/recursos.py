@@ -0,0 +1,74 @@
+"""
+Registro de los archivos de solo lectura del proceso: plantillas y marcas de agua.
+
+Cada archivo se lee una sola vez por proceso y todas las sesiones reciben el
+mismo objeto bytes, no una copia. Antes de entregarlo se compara con os.stat
+(fecha de modificación y tamaño) contra lo que se leyó; si alguien reemplazó
+el archivo se vuelve a leer, así los cambios se aplican sin reiniciar.
+"""
+import hashlib
+import os
+import threading
+
+_lock = threading.Lock()
+_recursos = {}
+# id del contenido -> recurso, para reconocer los bytes que entregó el registro
+_por_contenido = {}
+
+
+def huella_bytes(contenido):
+    return hashlib.sha1(contenido).hexdigest()
+
+
+def _firma(ruta):
+    estado = os.stat(ruta)
+    return estado.st_mtime_ns, estado.st_size
+
+
+def obtener_recurso(ruta):
+    """Devuelve {'contenido', 'huella', 'firma'} del archivo, leyéndolo sólo si cambió. None si no existe"""
+    ruta = os.path.abspath(ruta)
+    try:
+        firma = _firma(ruta)
+    except FileNotFoundError:
+        with _lock:
+            _olvidar(ruta)
+        return None
+
+    with _lock:
+        recurso = _recursos.get(ruta)
+        if recurso is not None and recurso['firma'] == firma:
+            return recurso
+
+    with open(ruta, 'rb') as f:
+        contenido = f.read()
+    recurso = {'contenido': contenido, 'huella': huella_bytes(contenido), 'firma': firma}
+    with _lock:
+        _olvidar(ruta)
+        _recursos[ruta] = recurso
+        _por_contenido[id(contenido)] = recurso
+    return recurso
+
+
+def _olvidar(ruta):
+    recurso = _recursos.pop(ruta, None)
+    if recurso is not None:
+        _por_contenido.pop(id(recurso['contenido']), None)
+
+
+def leer_recurso(ruta):
+    recurso = obtener_recurso(ruta)
+    return recurso['contenido'] if recurso else None
+
+
+def huella_recurso(ruta):
+    recurso = obtener_recurso(ruta)
+    return recurso['huella'] if recurso else None
+
+
+def huella_contenido(contenido):
+    """Huella de unos bytes; si son los de un recurso del registro no se vuelve a calcular"""
+    recurso = _por_contenido.get(id(contenido))
+    if recurso is not None and recurso['contenido'] is contenido:
+        return recurso['huella']
+    return huella_bytes(contenido)
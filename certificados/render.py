@@ -0,0 +1,679 @@
+"""
+Render de certificados en PDF, sin dependencias de Streamlit.
+
+Todo lo que se cachea aquí (fuente, fondos y marcas de agua) vive a nivel de
+proceso, así que cada worker del pool de render lo calienta una sola vez.
+"""
+import copy
+import logging
+import os
+import zlib
+from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+
+import pandas as pd
+import PyPDF2
+from PyPDF2 import generic as pdf_generic
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.colors import HexColor
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfbase import pdfdoc
+from reportlab.lib.utils import ImageReader
+
+from certificados.recursos import huella_contenido, huella_recurso, leer_recurso
+
+logger = logging.getLogger(__name__)
+
+# Carpeta raíz del proyecto: fonts/, plantillas/ y watermarks/ se buscan ahí
+RAIZ_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Registrar fuente personalizada
+def registrar_fuente_trebuchet():
+    """Registra la fuente Trebuchet MS si está disponible. Devuelve (disponible, aviso) con aviso = (nivel, mensaje) o None"""
+    font_path = os.path.join(RAIZ_PROYECTO, "fonts", "trebuchet.ttf")
+    if os.path.exists(font_path):
+        try:
+            pdfmetrics.registerFont(TTFont('Trebuchet', font_path))
+            return True, None
+        except Exception as e:
+            return False, ('warning', f"No se pudo cargar la fuente Trebuchet MS: {e}")
+    else:
+        return False, ('info', "Fuente Trebuchet MS no encontrada. Usando fuente por defecto.")
+
+TREBUCHET_AVAILABLE, AVISO_FUENTE = registrar_fuente_trebuchet()
+
+# Cachés por proceso
+_cache_fondos = {}
+_cache_marcas_agua = {}
+
+# Diccionario de meses
+def mes_en_espanol(fecha):
+    meses = {
+        'January': 'enero',
+        'February': 'febrero',
+        'March': 'marzo',
+        'April': 'abril',
+        'May': 'mayo',
+        'June': 'junio',
+        'July': 'julio',
+        'August': 'agosto',
+        'September': 'septiembre',
+        'October': 'octubre',
+        'November': 'noviembre',
+        'December': 'diciembre'
+    }
+
+    mes_ingles = fecha.strftime('%B')
+    mes_espanol = meses.get(mes_ingles, mes_ingles)
+    return fecha.strftime(f"%d de {mes_espanol} del %Y")
+
+# Función para agregar marca de agua (PDF)
+def agregar_marca_agua(pdf_bytes, watermark_path):
+    try:
+        pdf_reader = PyPDF2.PdfReader(pdf_bytes)
+        watermark_reader = PyPDF2.PdfReader(BytesIO(leer_recurso(watermark_path)))
+        
+        watermark_page = watermark_reader.pages[0]
+        
+        pdf_writer = PyPDF2.PdfWriter()
+        
+        for page_num in range(len(pdf_reader.pages)):
+            page = pdf_reader.pages[page_num]
+            
+            # Determinar orientación de la página
+            page_width = float(page.mediabox.width)
+            page_height = float(page.mediabox.height)
+            is_landscape = page_width > page_height
+            
+            # Crear una copia de la marca de agua para no modificar la original
+            if is_landscape:
+                landscape_watermark_path = os.path.join(RAIZ_PROYECTO, "watermarks", "marca_agua_landscape.pdf")
+                if os.path.exists(landscape_watermark_path):
+                    landscape_watermark_reader = PyPDF2.PdfReader(BytesIO(leer_recurso(landscape_watermark_path)))
+                    watermark = landscape_watermark_reader.pages[0]
+                else:
+                    watermark = watermark_page
+            else:
+                watermark = watermark_page
+            
+            page.merge_page(watermark)
+            pdf_writer.add_page(page)
+        
+        result_pdf = BytesIO()
+        pdf_writer.write(result_pdf)
+        result_pdf.seek(0)
+        
+        return result_pdf
+    except Exception as e:
+        logger.error("Error al aplicar marca de agua: %s", e)
+        return pdf_bytes
+
+# Convierte un objeto leído con PyPDF2 en su equivalente de reportlab (sólo objetos simples, sin streams)
+def convertir_objeto_pdf(obj):
+    obj = obj.get_object()
+    if isinstance(obj, pdf_generic.StreamObject):
+        raise ValueError("La marca de agua contiene streams en sus recursos")
+    if isinstance(obj, pdf_generic.DictionaryObject):
+        return pdfdoc.PDFDictionary({k[1:]: convertir_objeto_pdf(v) for k, v in obj.items()})
+    if isinstance(obj, pdf_generic.ArrayObject):
+        return pdfdoc.PDFArray([convertir_objeto_pdf(v) for v in obj])
+    if isinstance(obj, pdf_generic.NameObject):
+        return pdfdoc.PDFName(obj[1:])
+    if isinstance(obj, pdf_generic.BooleanObject):
+        return "true" if obj else "false"
+    if isinstance(obj, pdf_generic.NullObject):
+        return "null"
+    if isinstance(obj, pdf_generic.NumberObject):
+        return int(obj)
+    if isinstance(obj, pdf_generic.FloatObject):
+        return float(obj)
+    if isinstance(obj, (pdf_generic.TextStringObject, pdf_generic.ByteStringObject)):
+        return pdfdoc.PDFString(obj)
+    raise ValueError(f"Tipo de objeto no soportado en la marca de agua: {type(obj).__name__}")
+
+# Caché de marcas de agua convertidas a Form XObject
+def cargar_marca_agua(watermark_path, huella):
+    """Prepara una sola vez por proceso la primera página de la marca de agua como Form XObject.
+    Devuelve None si la página no se puede convertir (se usa entonces agregar_marca_agua)"""
+    clave = (watermark_path, huella)
+    if clave not in _cache_marcas_agua:
+        for anterior in [c for c in _cache_marcas_agua if c[0] == watermark_path]:
+            del _cache_marcas_agua[anterior]
+        _cache_marcas_agua[clave] = _convertir_marca_agua(watermark_path, huella)
+    return _cache_marcas_agua[clave]
+
+def _convertir_marca_agua(watermark_path, huella):
+    try:
+        page = PyPDF2.PdfReader(BytesIO(leer_recurso(watermark_path))).pages[0]
+        if page.get('/Rotate', 0):
+            return None
+        recursos = page.get('/Resources')
+        recursos = convertir_objeto_pdf(recursos) if recursos is not None else pdfdoc.PDFDictionary()
+        contenido = page.get_contents().get_data()
+    except Exception:
+        return None
+
+    mediabox = page.mediabox
+    diccionario = pdfdoc.PDFDictionary({
+        'Type': pdfdoc.PDFName('XObject'),
+        'Subtype': pdfdoc.PDFName('Form'),
+        'BBox': pdfdoc.PDFArray([float(mediabox.left), float(mediabox.bottom),
+                                 float(mediabox.right), float(mediabox.top)]),
+        'Resources': recursos,
+        'Filter': pdfdoc.PDFArray([pdfdoc.PDFName('FlateDecode')]),
+    })
+    return {
+        'nombre': f"marca_agua_{huella}",
+        'diccionario': diccionario,
+        'contenido': zlib.compress(contenido),
+        'transparencia': 'ExtGState' in recursos,
+    }
+
+# Dibuja la marca de agua cacheada sobre la página, sin volver a leer ni reescribir el PDF
+def dibujar_marca_agua(c, marca_agua):
+    nombre_interno = c._doc.getXObjectName(marca_agua['nombre'])
+    if nombre_interno not in c._doc.idToObject:
+        c._doc.Reference(pdfdoc.PDFStream(marca_agua['diccionario'], marca_agua['contenido']), nombre_interno)
+    if marca_agua['transparencia']:
+        c._doc.ensureMinPdfVersion('transparency')
+
+    c.saveState()
+    c._code.append(f"/{nombre_interno} Do")
+    c.restoreState()
+    c._formsinuse.append(marca_agua['nombre'])
+
+# Caché de fondos por plantilla
+def obtener_fondo_plantilla(plantilla_key, huella, plantilla_bytes):
+    """Lee y codifica una sola vez por proceso la imagen de fondo de la plantilla (clave + hash del archivo)"""
+    clave = (plantilla_key, huella)
+    if clave not in _cache_fondos:
+        # Si la plantilla se reemplazó, la versión anterior ya no se usa
+        for anterior in [c for c in _cache_fondos if c[0] == plantilla_key]:
+            del _cache_fondos[anterior]
+        fondo = pdfdoc.PDFImageXObject(f"{plantilla_key}_{huella}", ImageReader(BytesIO(plantilla_bytes)))
+        # El stream queda en bytes para no re-codificarlo al guardar cada PDF
+        if isinstance(fondo.streamContent, str):
+            fondo.streamContent = fondo.streamContent.encode('latin-1')
+        _cache_fondos[clave] = fondo
+    return _cache_fondos[clave]
+
+def huella_archivo(ruta):
+    return huella_recurso(ruta)
+
+# Dibuja el fondo cacheado sin archivos temporales ni volver a decodificar la imagen
+def dibujar_fondo(c, fondo, page_width, page_height):
+    # Equivale a canvas.drawImage, pero reutiliza el stream ya codificado. reportlab marca cada
+    # objeto con el documento que lo registra, por eso se usa una copia ligera por cada PDF.
+    nombre_interno = c._doc.getXObjectName(fondo.name)
+    if nombre_interno not in c._doc.idToObject:
+        imagen = copy.copy(fondo)
+        c._setXObjects(imagen)
+        c._doc.Reference(imagen, nombre_interno)
+
+    c._currentPageHasImages = 1
+    c.saveState()
+    c.scale(page_width, page_height)
+    c._code.append(f"/{nombre_interno} Do")
+    c.restoreState()
+    c._formsinuse.append(fondo.name)
+
+# Acomodar el texto en múltiples líneas para que se ajuste al ancho máximo
+MM_A_PUNTOS = 2.83465
+
+
+class _TablaAnchos(dict):
+    """Ancho de cada carácter (en milésimas del tamaño de fuente), medido la primera vez que aparece"""
+
+    def __init__(self, font_name):
+        super().__init__()
+        self.font_name = font_name
+
+    def __missing__(self, caracter):
+        ancho = self[caracter] = pdfmetrics.stringWidth(caracter, self.font_name, 1000)
+        return ancho
+
+
+_tablas_anchos = {}
+
+def tabla_anchos(font_name):
+    if font_name not in _tablas_anchos:
+        _tablas_anchos[font_name] = _TablaAnchos(font_name)
+    return _tablas_anchos[font_name]
+
+# Ancho de un texto en puntos, sumando los anchos por glifo (mismo resultado que pdfmetrics.stringWidth)
+def ancho_texto(text, font_name, font_size):
+    return 0.001 * font_size * sum(map(tabla_anchos(font_name).__getitem__, text))
+
+# Parte el texto en líneas que no superen el ancho máximo. Cada palabra se mide una sola vez
+@lru_cache(maxsize=4096)
+def partir_lineas(text, font_name, font_size, max_width_points):
+    anchos = tabla_anchos(font_name)
+    ancho_espacio = anchos[' ']
+    limite = max_width_points / (0.001 * font_size)
+    lines = []
+    current_line = []
+    ancho_linea = 0
+
+    for word in text.split():
+        ancho_palabra = sum(map(anchos.__getitem__, word))
+        ancho_prueba = ancho_linea + ancho_espacio + ancho_palabra if current_line else ancho_palabra
+
+        if ancho_prueba <= limite:
+            current_line.append(word)
+            ancho_linea = ancho_prueba
+        else:
+            if current_line:
+                lines.append(' '.join(current_line))
+                current_line = [word]
+                ancho_linea = ancho_palabra
+            else:
+                lines.append(word)
+
+    if current_line:
+        lines.append(' '.join(current_line))
+
+    return tuple(lines)
+
+_fuentes_disponibles = {}
+
+def fuente_disponible(font_name):
+    if font_name not in _fuentes_disponibles:
+        try:
+            pdfmetrics.getFont(font_name)
+            _fuentes_disponibles[font_name] = True
+        except Exception:
+            _fuentes_disponibles[font_name] = False
+    return _fuentes_disponibles[font_name]
+
+# Fuente efectiva de un estilo: la variante -Bold sólo si está registrada
+def resolver_fuente(style):
+    font_name = style['font_family'] if TREBUCHET_AVAILABLE else 'Helvetica'
+    if style.get('bold', False) and fuente_disponible(f"{font_name}-Bold"):
+        return f"{font_name}-Bold"
+    return font_name
+
+# Resuelve una sola vez por plantilla la fuente, el color, la posición en puntos y el centrado de cada estilo
+def compilar_estilos(styles_config):
+    estilos = {}
+    for style_key, style in styles_config.items():
+        if not isinstance(style, dict):
+            continue
+        font_size = style['font_size']
+        ajustar = style.get('max_width') is not None
+        color = HexColor(style['color'])
+        estilos[style_key] = {
+            'font_name': resolver_fuente(style),
+            'font_size': font_size,
+            'color': color,
+            'rgb': color.rgb(),
+            'x': style['x'] * MM_A_PUNTOS,
+            'y': style['y'] * MM_A_PUNTOS,
+            'centrado': style['x'] == 148 or style['x'] == 105,
+            'ancho_maximo': style['max_width'] * MM_A_PUNTOS if ajustar else None,
+            'interlineado': font_size * 1.2 if ajustar else font_size,
+        }
+    return estilos
+
+# Calcula la posición (en puntos, origen abajo a la izquierda) de cada línea de un texto con un estilo compilado.
+# Lo usan todos los backends de render para que el diseño sea el mismo.
+def posicionar_texto(text, estilo, page_width):
+    font_name = estilo['font_name']
+    font_size = estilo['font_size']
+
+    if estilo['ancho_maximo'] is None:
+        lines = (text,)
+    else:
+        lines = partir_lineas(text, font_name, font_size, estilo['ancho_maximo'])
+
+    posiciones = []
+    for i, line in enumerate(lines):
+        line_y = estilo['y'] - (i * estilo['interlineado'])
+        if estilo['centrado']:
+            line_x = (page_width - ancho_texto(line, font_name, font_size)) / 2
+        else:
+            line_x = estilo['x']
+        posiciones.append((line_x, line_y, line))
+
+    return posiciones
+
+# Dibuja texto multilínea con un estilo compilado
+def draw_multiline_text(canvas, text, estilo, page_width):
+    posiciones = posicionar_texto(text, estilo, page_width)
+
+    canvas.setFont(estilo['font_name'], estilo['font_size'])
+    canvas.setFillColor(estilo['color'])
+    for line_x, line_y, line in posiciones:
+        canvas.drawString(line_x, line_y, line)
+
+    return estilo['interlineado'] * len(posiciones)
+
+# Configuración de estilos por plantilla
+styles_config_by_template = {
+    "fondo_1": {
+        'curso': {
+            'font_family': 'Trebuchet',
+            'font_size': 32,
+            'color': '#000000', #11959f
+            'x': 52,
+            'y': 129,
+            'max_width': 220,
+            'bold': True
+        },
+        'nombre': {
+            'font_family': 'Trebuchet',
+            'font_size': 25,
+            'color': '#000000', #004064
+            'x': 52,
+            'y': 85,
+            'max_width': 210
+        },
+        'fecha': {
+            'font_family': 'Trebuchet',
+            'font_size': 18,
+            'color': '#004064',
+            'x': 52,
+            'y': 36,
+            'max_width': None,
+            'bold': True
+        },
+        'numero': {
+            'font_family': 'Trebuchet',
+            'font_size': 15.5,
+            'color': '#004064',
+            'x': 52,
+            'y': 27,
+            'max_width': None
+        },
+        'horas': {
+            'font_family': 'Trebuchet',
+            'font_size': 15.5,
+            'color': '#004064',
+            'x': 132.5,
+            'y': 65.2,
+            'max_width': None
+        },
+        'orientation': 'landscape'  # Orientación horizontal
+    },
+    "fondo_2": {  # Vertical
+        'curso': {
+            'font_family': 'Trebuchet',
+            'font_size': 30.5,
+            'color': '#000000',
+            'x': 105,
+            'y': 185,
+            'max_width': 160,
+            'bold': True
+        },
+        'nombre': {
+            'font_family': 'Trebuchet',
+            'font_size': 29,
+            'color': '#000000',
+            'x': 105,
+            'y': 133,
+            'max_width': 160,
+            'bold': True
+        },
+        'fecha': {
+            'font_family': 'Trebuchet',
+            'font_size': 18,
+            'color': '#004064',
+            'x': 105,
+            'y': 78,
+            'max_width': None
+        },
+        # No aparece en el certificado, sólo está para evitar errores en f()
+        'numero': {
+            'font_family': 'Trebuchet',
+            'font_size': 1,
+            'color': '#ffffff',
+            'x': 0,
+            'y': 0,
+            'max_width': None
+        },
+        'orientation': 'portrait'  # Orientación vertical
+    },
+    "fondo_3": {
+        'curso': {
+            'font_family': 'Trebuchet',
+            'font_size': 30.5,
+            'color': '#000000',
+            'x': 148,
+            'y': 117,
+            'max_width': 245,
+            'bold': True
+        },
+        'nombre': {
+            'font_family': 'Trebuchet',
+            'font_size': 29,
+            'color': '#000000',
+            'x': 148,
+            'y': 75,
+            'max_width': 245,
+            'bold': True
+        },
+        'fecha': {
+            'font_family': 'Trebuchet',
+            'font_size': 18,
+            'color': '#004064',
+            'x': 20,
+            'y': 41,
+            'max_width': None,
+            'bold': True
+        },
+        'numero': {
+            'font_family': 'Trebuchet',
+            'font_size': 15.5,
+            'color': '#004064',
+            'x': 20,
+            'y': 32,
+            'max_width': None
+        },
+        'orientation': 'landscape'
+    },
+    "fondo_4": {
+        'curso': {
+            'font_family': 'Trebuchet',
+            'font_size': 30.5,
+            'color': '#000000',
+            'x': 148,
+            'y': 117,
+            'max_width': 245,
+            'bold': True
+        },
+        'nombre': {
+            'font_family': 'Trebuchet',
+            'font_size': 29,
+            'color': '#000000',
+            'x': 148,
+            'y': 75,
+            'max_width': 245,
+            'bold': True
+        },
+        'fecha': {
+            'font_family': 'Trebuchet',
+            'font_size': 18,
+            'color': '#004064',
+            'x': 20,
+            'y': 41,
+            'max_width': None,
+            'bold': True
+        },
+        'numero': {
+            'font_family': 'Trebuchet',
+            'font_size': 15.5,
+            'color': '#004064',
+            'x': 20,
+            'y': 32,
+            'max_width': None
+        },
+        'orientation': 'landscape'
+    }
+}
+
+# Mapeo de grupos a plantillas
+mapeo_plantillas = {
+    'grupo_1': 'fondo_1',  # Progresiva
+    'grupo_2': 'fondo_2',  # Participación Nota < 13
+    'grupo_3': 'fondo_3',  # Base - Nota ≥ 13 y Grado = 1P-3P
+    'grupo_4': 'fondo_4'   # Base - Nota ≥ 13 y Grado = 4P-5S
+}
+
+# Contexto común a todos los certificados de un grupo; se envía tal cual a los workers
+# Con determinista=True el mismo certificado produce siempre los mismos bytes (sin fecha de creación ni ID aleatorio)
+def crear_contexto_grupo(plantilla_key, plantilla_bytes, styles_config_by_template, ruta_marca_agua=None, fecha=None,
+    backend='reportlab', determinista=False):
+    return {
+        'backend': backend,
+        'determinista': determinista,
+        'plantilla_key': plantilla_key,
+        'plantilla_bytes': plantilla_bytes,
+        'huella_plantilla': huella_contenido(plantilla_bytes),
+        'styles_config': styles_config_by_template[plantilla_key],
+        'estilos': compilar_estilos(styles_config_by_template[plantilla_key]),
+        'ruta_marca_agua': ruta_marca_agua,
+        'huella_marca_agua': huella_archivo(ruta_marca_agua) if ruta_marca_agua else None,
+        'fecha': fecha or mes_en_espanol(datetime.today()),
+    }
+
+# Extrae de cada fila del grupo los textos que se dibujan y el nombre de su entrada en el ZIP.
+# Todo se calcula por columnas; el render recibe tuplas (nombre, curso, numero, horas_progresivo, pdf_name)
+def preparar_filas(grupo_df, plantilla_key):
+    if grupo_df.empty:
+        return []
+
+    nombres = grupo_df["nombre_certificado"].astype(str).str.strip().str.upper()
+    cursos = grupo_df["curso"].astype(str).str.strip().str.upper()
+
+    # Numeración del Excel o, si falta, una generada a partir de la fila
+    numeros_generados = pd.Series(grupo_df.index + 1, index=grupo_df.index).astype(str).str.zfill(3).radd("GEN-")
+    if "numeración" in grupo_df.columns:
+        numeracion = grupo_df["numeración"]
+        numeros = numeracion.astype(str).str.strip().where(numeracion.notna(), numeros_generados)
+    else:
+        numeros = numeros_generados
+
+    # Extraer valores para la variable de horas, sólo si es para "Progresivos" (fondo_1)
+    horas = "horas_progresivo"
+    if plantilla_key == 'fondo_1' and horas in grupo_df.columns:
+        horas_progresivo = grupo_df[horas].astype(str).where(grupo_df[horas].notna(), "")
+    else:
+        horas_progresivo = pd.Series("", index=grupo_df.index)
+
+    pdf_names = nombres.str.replace(' ', '_', regex=False) + '_' + cursos.str[0:11].str.replace(' ', '_', regex=False)
+    if plantilla_key == 'fondo_2':
+        pdf_names = "Constancias/" + pdf_names + ".pdf"
+    else:
+        pdf_names = pdf_names + ".pdf"
+
+    return list(zip(nombres, cursos, numeros, horas_progresivo, pdf_names))
+
+# La misma tupla de preparar_filas para un solo certificado, sin pasar por pandas
+def preparar_fila(plantilla_key, nombre_certificado, curso, numero, horas_progresivo=None):
+    nombre = str(nombre_certificado).strip().upper()
+    curso = str(curso).strip().upper()
+    horas = str(horas_progresivo) if plantilla_key == 'fondo_1' and horas_progresivo is not None else ""
+
+    pdf_name = nombre.replace(' ', '_') + '_' + curso[0:11].replace(' ', '_') + ".pdf"
+    if plantilla_key == 'fondo_2':
+        pdf_name = "Constancias/" + pdf_name
+    return nombre, curso, str(numero).strip(), horas, pdf_name
+
+# Tamaño de página según la orientación de la plantilla
+def tamano_pagina(styles_config):
+    if styles_config.get('orientation') == 'portrait':
+        return A4
+    return landscape(A4)
+
+# Textos variables de un certificado como (texto, clave de estilo), en orden de dibujo
+def textos_certificado(contexto, nombre, curso, numero, horas_progresivo):
+    plantilla_key = contexto['plantilla_key']
+
+    textos = [
+        (nombre, 'nombre'),
+        (curso, 'curso'),
+        (f"Lima, {contexto['fecha']}", 'fecha'),
+    ]
+
+    # Se considera la variable horas si es para el fondo_1
+    if plantilla_key == 'fondo_1' and horas_progresivo:
+        textos.append((horas_progresivo, 'horas'))
+
+    if plantilla_key != 'fondo_2':
+        textos.append((f"Certificado Nº {numero}", 'numero'))
+
+    return textos
+
+# Dibuja un certificado en la página actual del canvas. El fondo y la marca de agua se registran una sola vez
+# por documento, así en un PDF de varias páginas todas las páginas los comparten.
+# Devuelve la marca de agua dibujada, o None si no lleva o no se pudo convertir a Form XObject
+def dibujar_certificado(c, contexto, nombre, curso, numero, horas_progresivo):
+    plantilla_key = contexto['plantilla_key']
+    page_width, page_height = tamano_pagina(contexto['styles_config'])
+
+    # Fondo y marca de agua salen de las cachés del proceso
+    fondo = obtener_fondo_plantilla(plantilla_key, contexto['huella_plantilla'], contexto['plantilla_bytes'])
+    marca_agua = None
+    if contexto['ruta_marca_agua']:
+        marca_agua = cargar_marca_agua(contexto['ruta_marca_agua'], contexto['huella_marca_agua'])
+
+    # Insertar imagen de fondo
+    dibujar_fondo(c, fondo, page_width, page_height)
+
+    # Dibujar texto usando los estilos específicos de la plantilla
+    estilos = contexto['estilos']
+    for texto, style_key in textos_certificado(contexto, nombre, curso, numero, horas_progresivo):
+        draw_multiline_text(c, texto, estilos[style_key], page_width)
+
+    if marca_agua:
+        dibujar_marca_agua(c, marca_agua)
+    return marca_agua
+
+# Dibuja un certificado y devuelve los bytes del PDF
+def renderizar_certificado(contexto, nombre, curso, numero, horas_progresivo):
+    # Crear PDF con orientación específica
+    pdf_buffer = BytesIO()
+    c = canvas.Canvas(pdf_buffer, pagesize=tamano_pagina(contexto['styles_config']),
+                      invariant=1 if contexto['determinista'] else None)
+    marca_agua = dibujar_certificado(c, contexto, nombre, curso, numero, horas_progresivo)
+    c.save()
+    pdf_bytes = pdf_buffer.getvalue()
+
+    # Marcas de agua que no se pueden convertir a Form XObject: fusión con PyPDF2
+    if contexto['ruta_marca_agua'] and not marca_agua:
+        pdf_bytes = agregar_marca_agua(BytesIO(pdf_bytes), contexto['ruta_marca_agua']).getvalue()
+
+    return pdf_bytes
+
+# PDF de varias páginas a partir de (contexto, fila, seccion): una página por fila, en orden, con un marcador
+# por estudiante. Si las páginas traen seccion, los marcadores se agrupan bajo un marcador por sección
+def renderizar_pdf_combinado(paginas, determinista=False):
+    pdf_buffer = BytesIO()
+    c = canvas.Canvas(pdf_buffer, invariant=1 if determinista else None)
+
+    seccion_actual = None
+    for i, (contexto, fila, seccion) in enumerate(paginas):
+        nombre, curso, numero, horas_progresivo, _pdf_name = fila
+        c.setPageSize(tamano_pagina(contexto['styles_config']))
+        marca_agua = dibujar_certificado(c, contexto, nombre, curso, numero, horas_progresivo)
+        if contexto['ruta_marca_agua'] and not marca_agua:
+            raise ValueError("La marca de agua no se puede incrustar en un PDF combinado")
+
+        clave = f"p{i}"
+        c.bookmarkPage(clave)
+        nivel = 0
+        if seccion is not None:
+            if seccion != seccion_actual:
+                # Cada entrada del índice necesita su propio destino, aunque sea la misma página
+                c.bookmarkPage(f"s{i}")
+                c.addOutlineEntry(seccion, f"s{i}", 0)
+                seccion_actual = seccion
+            nivel = 1
+        c.addOutlineEntry(nombre, clave, nivel)
+        c.showPage()
+
+    c.showOutline()
+    c.save()
+    return pdf_buffer.getvalue()
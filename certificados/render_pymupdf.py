@@ -0,0 +1,102 @@
+"""
+Backend de render con PyMuPDF.
+
+Cada plantilla se compila una sola vez por proceso en una página base (imagen
+de fondo y, si corresponde, la marca de agua). Por certificado sólo se abre esa
+página base y se insertan los textos variables, con las mismas posiciones que
+calcula el backend de reportlab.
+"""
+import fitz
+from reportlab.pdfbase import pdfmetrics
+
+from certificados.recursos import leer_recurso
+from certificados.render import posicionar_texto, tamano_pagina, textos_certificado
+
+# Fuentes estándar de reportlab y su equivalente en PyMuPDF
+FUENTES_BASE14 = {
+    'Helvetica': 'helv',
+    'Helvetica-Bold': 'hebo',
+}
+
+_cache_paginas_base = {}
+_cache_fuentes = {}
+
+
+def obtener_fuente(font_name):
+    """fitz.Font equivalente a una fuente registrada en reportlab, cargada una sola vez por proceso"""
+    if font_name not in _cache_fuentes:
+        if font_name in FUENTES_BASE14:
+            _cache_fuentes[font_name] = fitz.Font(FUENTES_BASE14[font_name])
+        else:
+            _cache_fuentes[font_name] = fitz.Font(fontfile=pdfmetrics.getFont(font_name).face.filename)
+    return _cache_fuentes[font_name]
+
+
+def _compilar_pagina_base(contexto):
+    styles_config = contexto['styles_config']
+    page_width, page_height = tamano_pagina(styles_config)
+
+    doc = fitz.open()
+    page = doc.new_page(width=page_width, height=page_height)
+    page.insert_image(page.rect, stream=contexto['plantilla_bytes'], keep_proportion=False)
+
+    marca_agua_xref = None
+    if contexto['ruta_marca_agua']:
+        with fitz.open("pdf", leer_recurso(contexto['ruta_marca_agua'])) as marca_agua:
+            page.show_pdf_page(page.rect, marca_agua, 0)
+        # La marca de agua es el último stream de contenido de la página
+        marca_agua_xref = page.get_contents()[-1]
+
+    pdf_base = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return {'pdf': pdf_base, 'marca_agua_xref': marca_agua_xref}
+
+
+def obtener_pagina_base(contexto):
+    """Página base compilada para la plantilla (y marca de agua) del contexto, cacheada por proceso"""
+    clave = (contexto['plantilla_key'], contexto['huella_plantilla'], contexto['ruta_marca_agua'],
+             contexto['huella_marca_agua'])
+    if clave not in _cache_paginas_base:
+        # Las versiones anteriores de la misma plantilla ya no se usan
+        for anterior in [c for c in _cache_paginas_base if c[0] == clave[0] and c[2] == clave[2]]:
+            del _cache_paginas_base[anterior]
+        _cache_paginas_base[clave] = _compilar_pagina_base(contexto)
+    return _cache_paginas_base[clave]
+
+
+# Dibuja un certificado sobre la página base y devuelve los bytes del PDF
+def renderizar_certificado(contexto, nombre, curso, numero, horas_progresivo):
+    styles_config = contexto['styles_config']
+    page_width, page_height = tamano_pagina(styles_config)
+    base = obtener_pagina_base(contexto)
+
+    doc = fitz.open("pdf", base['pdf'])
+    page = doc[0]
+
+    # Un TextWriter por color; cada uno se escribe en la página como un solo bloque de texto
+    estilos = contexto['estilos']
+    escritores = {}
+    for texto, style_key in textos_certificado(contexto, nombre, curso, numero, horas_progresivo):
+        estilo = estilos[style_key]
+        if estilo['rgb'] not in escritores:
+            escritores[estilo['rgb']] = fitz.TextWriter(page.rect)
+        escritor = escritores[estilo['rgb']]
+        fuente = obtener_fuente(estilo['font_name'])
+        for line_x, line_y, line in posicionar_texto(texto, estilo, page_width):
+            # PyMuPDF mide y desde arriba; reportlab desde abajo
+            escritor.append((line_x, page_height - line_y), line, font=fuente, fontsize=estilo['font_size'])
+
+    for rgb, escritor in escritores.items():
+        escritor.write_text(page, color=rgb)
+
+    # Igual que con reportlab, la marca de agua queda por encima del texto
+    if base['marca_agua_xref']:
+        contenidos = [xref for xref in page.get_contents() if xref != base['marca_agua_xref']]
+        contenidos.append(base['marca_agua_xref'])
+        doc.xref_set_key(page.xref, "Contents", "[%s]" % " ".join(f"{xref} 0 R" for xref in contenidos))
+
+    # Sólo se embeben los glifos usados, como hace reportlab
+    doc.subset_fonts()
+    pdf_bytes = doc.tobytes(garbage=1, deflate=True, no_new_id=contexto['determinista'])
+    doc.close()
+    return pdf_bytes
@@ -0,0 +1,209 @@
+"""
+Servicio HTTP para generar certificados sueltos (reemisiones), con tornado.
+
+    POST /certificado   JSON con la fila; responde el PDF
+    GET  /metricas      registro del proceso en formato Prometheus (incluye la latencia del servicio)
+    GET  /salud         "ok"
+
+Cuerpo de POST /certificado:
+
+    {"plantilla": "fondo_3", "nombre": "Ana Pérez García", "curso": "Ofimática",
+     "numero": "N-00012", "horas": 40, "archivo": "SI_SECCION_A.xlsx", "fecha": "12 de marzo del 2025"}
+
+`numero` es obligatorio salvo en fondo_2, `horas` sólo se usa en fondo_1, `archivo`
+aplica las mismas reglas de nombre que la planilla (marca de agua) y `fecha`, si
+falta, es la de hoy. Las plantillas, fuentes, marcas de agua y estilos compilados
+quedan cargados en memoria y los PDFs pasan por la misma caché que la generación
+por lotes.
+
+Uso:
+    python -m certificados.servicio [--puerto 8765] [--direccion 127.0.0.1] [--socket /tmp/certificados.sock]
+                                    [--backend pymupdf] [--variante correo] [--limite 8] [--sin-cache]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import quote
+
+import tornado.httpserver
+import tornado.ioloop
+import tornado.netutil
+import tornado.web
+
+from certificados import cache_pdf, metricas
+from certificados.motor import cargar_plantillas, ruta_marca_agua_grupo
+from certificados.paralelo import BACKENDS, renderizar_lote
+from certificados.recursos import huella_recurso
+from certificados.render import crear_contexto_grupo, mes_en_espanol, preparar_fila, styles_config_by_template
+from certificados.variantes import VARIANTES, VARIANTE_POR_DEFECTO
+
+logger = logging.getLogger("certificados.servicio")
+
+# Solicitudes de certificado en curso (en cola o renderizando); las demás reciben 503
+LIMITE_SOLICITUDES = int(os.environ.get('CERTIFICADOS_SERVICIO_LIMITE', 8))
+
+# Contextos de grupo ya armados: (plantilla, marca de agua, backend, usar_cache, variante) -> contexto. La fecha
+# la elige el cliente, así que no va en la clave (cada fecha nueva quedaría en memoria): se pone en cada solicitud
+_contextos = {}
+
+
+def obtener_contexto(plantilla_key, nombre_archivo, fecha, backend, usar_cache=True, variante=VARIANTE_POR_DEFECTO):
+    """
+    (contexto, huella para la caché) del grupo para la solicitud, con su fecha. El contexto se vuelve a armar
+    sólo si cambió la plantilla o la marca de agua
+    """
+    plantillas = cargar_plantillas(variante=variante)
+    if not plantillas:
+        raise RuntimeError("No se encontraron las plantillas")
+    ruta_marca_agua = ruta_marca_agua_grupo(plantilla_key, nombre_archivo, styles_config_by_template)
+
+    clave = (plantilla_key, ruta_marca_agua, backend, usar_cache, variante)
+    guardado = _contextos.get(clave)
+    if (guardado is None or guardado['plantilla_bytes'] is not plantillas[plantilla_key]
+            or (ruta_marca_agua and guardado['huella_marca_agua'] != huella_recurso(ruta_marca_agua))):
+        guardado = _contextos[clave] = crear_contexto_grupo(plantilla_key, plantillas[plantilla_key],
+                                                            styles_config_by_template, ruta_marca_agua,
+                                                            backend=backend, determinista=usar_cache)
+    # Copia superficial: comparte fondos, estilos y tablas de anchos con el contexto guardado
+    contexto = dict(guardado, fecha=fecha)
+    return contexto, cache_pdf.huella_contexto(contexto) if usar_cache else None
+
+
+def validar_solicitud(datos):
+    """Mensaje de error de la solicitud, o None si es válida"""
+    if not isinstance(datos, dict):
+        return "Se esperaba un objeto JSON"
+    if datos.get('plantilla') not in styles_config_by_template:
+        return f"'plantilla' debe ser una de: {', '.join(sorted(styles_config_by_template))}"
+    for campo in ('nombre', 'curso'):
+        if not str(datos.get(campo) or '').strip():
+            return f"Falta '{campo}'"
+    if datos['plantilla'] != 'fondo_2' and not str(datos.get('numero') or '').strip():
+        return "Falta 'numero'"
+    return None
+
+
+def renderizar_solicitud(datos, backend='reportlab', usar_cache=True, variante=VARIANTE_POR_DEFECTO):
+    """Devuelve (pdf_name, pdf_bytes, error) para una solicitud ya validada"""
+    plantilla_key = datos['plantilla']
+    fecha = datos.get('fecha') or mes_en_espanol(datetime.today())
+    contexto, huella_grupo = obtener_contexto(plantilla_key, datos.get('archivo') or '', fecha, backend, usar_cache,
+                                              variante)
+    fila = preparar_fila(plantilla_key, datos['nombre'], datos['curso'], datos.get('numero') or '', datos.get('horas'))
+
+    clave = None
+    if usar_cache:
+        clave = cache_pdf.clave_certificado(huella_grupo, *fila[:4])
+        pdf_bytes = cache_pdf.leer(clave)
+        if pdf_bytes is not None:
+            return fila[4], pdf_bytes, None
+
+    pdf_bytes, error, _segundos = renderizar_lote(contexto, [fila])[0]
+    if usar_cache and not error:
+        cache_pdf.guardar(clave, pdf_bytes)
+    return fila[4], pdf_bytes, error
+
+
+def calentar(backend='reportlab', variante=VARIANTE_POR_DEFECTO):
+    """Renderiza un certificado de cada plantilla para dejar cargados fuentes, fondos y marcas de agua"""
+    for plantilla_key in styles_config_by_template:
+        for nombre_archivo in ('', 'XI'):
+            renderizar_solicitud({'plantilla': plantilla_key, 'nombre': 'CALENTAMIENTO', 'curso': 'CALENTAMIENTO',
+                                  'numero': '0', 'archivo': nombre_archivo}, backend, False, variante)
+
+
+class ManejadorBase(tornado.web.RequestHandler):
+    def on_finish(self):
+        metricas.registrar_solicitud(self.request.path, str(self.get_status()), self.request.request_time())
+
+    def responder_error(self, estado, mensaje):
+        self.set_status(estado)
+        self.finish({'error': mensaje})
+
+
+class ManejadorCertificado(ManejadorBase):
+    async def post(self):
+        try:
+            datos = json.loads(self.request.body or b'null')
+        except ValueError:
+            return self.responder_error(400, "El cuerpo no es un JSON válido")
+        error = validar_solicitud(datos)
+        if error:
+            return self.responder_error(400, error)
+
+        estado = self.settings['estado']
+        if estado['en_curso'] >= self.settings['limite']:
+            self.set_header('Retry-After', '1')
+            return self.responder_error(503, "Demasiadas solicitudes en curso, intenta de nuevo")
+
+        estado['en_curso'] += 1
+        try:
+            pdf_name, pdf_bytes, error = await tornado.ioloop.IOLoop.current().run_in_executor(
+                self.settings['executor'], renderizar_solicitud, datos, self.settings['backend'],
+                self.settings['usar_cache'], self.settings['variante'])
+        finally:
+            estado['en_curso'] -= 1
+
+        if error:
+            return self.responder_error(500, f"Error generando el certificado: {error}")
+        self.set_header('Content-Type', 'application/pdf')
+        self.set_header('Content-Disposition', f"attachment; filename*=UTF-8''{quote(os.path.basename(pdf_name))}")
+        self.finish(pdf_bytes)
+
+
+class ManejadorMetricas(ManejadorBase):
+    def get(self):
+        self.set_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.finish(metricas.texto_prometheus())
+
+
+class ManejadorSalud(ManejadorBase):
+    def get(self):
+        self.finish("ok")
+
+
+def crear_aplicacion(backend='reportlab', limite=LIMITE_SOLICITUDES, usar_cache=True, variante=VARIANTE_POR_DEFECTO):
+    # Un solo hilo de render: el render ocupa el GIL y PyMuPDF no admite varios hilos a la vez.
+    # El límite acota cuántas solicitudes pueden esperar su turno
+    return tornado.web.Application([
+        (r"/certificado", ManejadorCertificado),
+        (r"/metricas", ManejadorMetricas),
+        (r"/salud", ManejadorSalud),
+    ], backend=backend, limite=limite, usar_cache=usar_cache, variante=variante, estado={'en_curso': 0},
+        executor=ThreadPoolExecutor(max_workers=1, thread_name_prefix='render'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m certificados.servicio",
+                                     description="Servicio HTTP para generar certificados sueltos.")
+    parser.add_argument('--puerto', type=int, default=8765)
+    parser.add_argument('--direccion', default='127.0.0.1', help="Dirección donde escucha (por defecto sólo local)")
+    parser.add_argument('--socket', help="Escucha en este socket Unix en lugar de un puerto TCP")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='reportlab', help="Motor de render de los PDFs")
+    parser.add_argument('--variante', choices=sorted(VARIANTES), default=VARIANTE_POR_DEFECTO,
+                        help="Fondos para imprimir (originales) o para correo (150 dpi)")
+    parser.add_argument('--limite', type=int, default=LIMITE_SOLICITUDES, help="Solicitudes en curso como máximo")
+    parser.add_argument('--sin-cache', action='store_true', help="No usa ni actualiza la caché de PDFs")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    calentar(args.backend, args.variante)
+
+    servidor = tornado.httpserver.HTTPServer(crear_aplicacion(args.backend, args.limite, not args.sin_cache,
+                                                              args.variante))
+    if args.socket:
+        servidor.add_socket(tornado.netutil.bind_unix_socket(args.socket))
+        logger.info("Escuchando en %s", args.socket)
+    else:
+        servidor.listen(args.puerto, args.direccion)
+        logger.info("Escuchando en http://%s:%d", args.direccion, args.puerto)
+    tornado.ioloop.IOLoop.current().start()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
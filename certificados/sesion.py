@@ -0,0 +1,81 @@
+"""
+Presupuesto de memoria del estado de cada sesión de la página.
+
+Cada sesión guarda en st.session_state la planilla procesada, los grupos, las plantillas y las
+miniaturas de la vista previa, y cada botón de descarga tiene en memoria el archivo que ofrece
+mientras se muestra. Con varios coordinadores a la vez eso se suma, así que al final de cada
+ejecución de la página se liberan los artefactos grandes (ARTEFACTOS):
+
+    - todos, cuando ya se descargó el ZIP que se generó con ellos
+    - todos, cuando pasaron TTL_SESION segundos desde que se crearon
+    - de a uno y en ese orden, mientras pasen de PRESUPUESTO_SESION_MB
+
+Ninguno hace falta para seguir: la generación corre como trabajo con su propia copia de la
+entrada, y para generar de nuevo hay que volver a subir el archivo.
+"""
+import os
+import sys
+import time
+
+from certificados.empaquetado import TTL_ARCHIVOS
+
+# MB que pueden ocupar los artefactos de una sesión antes de empezar a liberarlos
+PRESUPUESTO_SESION_MB = float(os.environ.get('CERTIFICADOS_SESION_MB', 16))
+
+# Segundos que se guardan los artefactos de una sesión (por defecto, lo mismo que el ZIP)
+TTL_SESION = int(os.environ.get('CERTIFICADOS_SESION_TTL', TTL_ARCHIVOS))
+
+# Claves de st.session_state que se pueden liberar, en el orden en que se liberan
+ARTEFACTOS = ['df_procesado', 'grupos', 'plantillas', 'vista_previa']
+
+
+def tamano_objeto(valor):
+    """Bytes aproximados de un valor del estado: DataFrames con su contenido, bytes, y dicts y listas de ellos"""
+    if hasattr(valor, 'memory_usage'):
+        uso = valor.memory_usage(deep=True)
+        return int(uso.sum()) if hasattr(uso, 'sum') else int(uso)
+    if isinstance(valor, (bytes, bytearray, memoryview)):
+        return len(valor)
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(tamano_objeto(clave) + tamano_objeto(dato) for clave, dato in valor.items())
+    if isinstance(valor, (list, tuple, set)):
+        return sys.getsizeof(valor) + sum(tamano_objeto(dato) for dato in valor)
+    return sys.getsizeof(valor)
+
+
+def tamano_estado(estado):
+    """{clave: bytes} de cada valor del estado de la sesión"""
+    return {clave: tamano_objeto(estado[clave]) for clave in list(estado.keys())}
+
+
+def registrar_artefactos(estado, ahora=None):
+    # Desde cuándo cuenta el TTL de los artefactos recién creados
+    estado['artefactos_desde'] = time.time() if ahora is None else ahora
+
+
+def liberar_artefactos(estado, descargado=False, presupuesto_mb=None, ttl=None, ahora=None):
+    """
+    Pone en None los artefactos de la sesión que ya no conviene guardar (ver arriba) y devuelve sus claves.
+    `descargado` indica si ya se descargó el ZIP generado con ellos
+    """
+    presupuesto = (PRESUPUESTO_SESION_MB if presupuesto_mb is None else presupuesto_mb) * 1024 * 1024
+    ttl = TTL_SESION if ttl is None else ttl
+    ahora = time.time() if ahora is None else ahora
+
+    presentes = [clave for clave in ARTEFACTOS if estado.get(clave) is not None]
+    desde = estado.get('artefactos_desde')
+    if descargado or (desde is not None and ahora - desde >= ttl):
+        liberar = presentes
+    else:
+        tamanos = {clave: tamano_objeto(estado[clave]) for clave in presentes}
+        total = sum(tamanos.values())
+        liberar = []
+        for clave in presentes:
+            if total <= presupuesto:
+                break
+            liberar.append(clave)
+            total -= tamanos[clave]
+
+    for clave in liberar:
+        estado[clave] = None
+    return liberar
@@ -0,0 +1,361 @@
+"""
+Cola de trabajos de generación en segundo plano.
+
+La página envía la generación como un trabajo a un pool de hilos del proceso y
+sólo consulta su estado. Cada trabajo tiene un ID (el mismo nombre del ZIP), su
+estado y avance se guardan en `<id>.trabajo.json` en el directorio de salida,
+se puede cancelar y cada usuario tiene un límite de trabajos activos.
+
+Los grupos de cada trabajo se guardan en `<id>.entrada.json`, así un trabajo que
+se cortó (porque se reinició el proceso, hubo un error o se canceló) o que
+terminó con filas fallidas se puede retomar con reanudar_trabajo: el ZIP sigue
+desde su último punto de control y sólo se generan las filas que faltan.
+"""
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from certificados import metricas
+from certificados.eventos import NIVEL_FIN_ETAPA, NIVEL_INICIO_ETAPA, crear_flujo
+from certificados.empaquetado import (
+    DIRECTORIO_SALIDA, TTL_ARCHIVOS, crear_ruta_zip, opciones_empaque, ruta_resumen_metricas, rutas_volumenes
+)
+from certificados.motor import cargar_plantillas, generar_zip
+from certificados.perfil import PERFIL, ruta_flamegraph, ruta_pstats
+from certificados.reanudacion import ruta_fallidos
+from certificados.variantes import VARIANTE_POR_DEFECTO
+
+# Trabajos que corren a la vez en el proceso (el render de cada uno ya usa el pool de procesos)
+MAX_TRABAJOS = int(os.environ.get('CERTIFICADOS_TRABAJOS', 2))
+
+# Trabajos en cola o en proceso que puede tener cada usuario
+LIMITE_POR_USUARIO = int(os.environ.get('CERTIFICADOS_TRABAJOS_POR_USUARIO', 1))
+
+ESTADOS_ACTIVOS = ('en_cola', 'procesando')
+
+# Estados desde los que se puede retomar un trabajo ('terminado' sólo si quedaron filas fallidas)
+ESTADOS_REANUDABLES = ('interrumpido', 'error', 'cancelado', 'terminado')
+
+# Segundos mínimos entre escrituras del avance a disco
+INTERVALO_GUARDADO = 1.0
+
+# Formato de los IDs que genera crear_ruta_zip (uuid4().hex); cualquier otro se rechaza antes de armar una ruta
+FORMATO_ID = re.compile(r'[0-9a-f]{32}')
+
+_lock = threading.Lock()
+_trabajos = {}
+_executor = None
+
+
+class TrabajoCancelado(Exception):
+    pass
+
+
+def id_valido(trabajo_id):
+    """Si trabajo_id tiene el formato de los IDs de trabajo (viene de la URL, así que puede ser cualquier cosa)"""
+    return isinstance(trabajo_id, str) and FORMATO_ID.fullmatch(trabajo_id) is not None
+
+
+def _ruta_trabajo(trabajo_id, directorio, sufijo):
+    if not id_valido(trabajo_id):
+        raise ValueError(f"ID de trabajo inválido: {trabajo_id!r}")
+    return os.path.join(directorio or DIRECTORIO_SALIDA, f"{trabajo_id}{sufijo}")
+
+
+def ruta_estado(trabajo_id, directorio=None):
+    return _ruta_trabajo(trabajo_id, directorio, '.trabajo.json')
+
+
+def ruta_entrada(trabajo_id, directorio=None):
+    return _ruta_trabajo(trabajo_id, directorio, '.entrada.json')
+
+
+def guardar_entrada(grupos, ruta):
+    # Los grupos como JSON, con el índice (da la fila de la planilla) y el tipo de cada columna para recuperarlos
+    # tal cual: leerlos no puede ejecutar código, como sí pasaría con un pickle
+    datos = {
+        nombre: {'tipos': {columna: str(tipo) for columna, tipo in grupo.dtypes.items()},
+                 **json.loads(grupo.to_json(orient='split', date_format='iso'))}
+        for nombre, grupo in grupos.items()
+    }
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(datos, f, ensure_ascii=False)
+
+
+def leer_entrada(ruta):
+    with open(ruta, encoding='utf-8') as f:
+        datos = json.load(f)
+    grupos = {}
+    for nombre, grupo in datos.items():
+        # Las columnas mezcladas (números y celdas vacías) se dejan como objetos; pandas las pasaría a float
+        df = pd.DataFrame(grupo['data'], index=grupo['index'], columns=grupo['columns'], dtype=object)
+        for columna, tipo in grupo['tipos'].items():
+            if tipo == 'object':
+                df[columna] = df[columna].where(df[columna].notna(), float('nan'))
+            else:
+                df[columna] = df[columna].astype(tipo)
+        grupos[nombre] = df
+    return grupos
+
+
+def _obtener_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MAX_TRABAJOS, thread_name_prefix='certificados')
+    return _executor
+
+
+def _datos_publicos(trabajo):
+    # Lo que se guarda en disco y se entrega a la página: sin el evento de cancelación
+    datos = {clave: valor for clave, valor in trabajo.items() if clave != 'cancelar'}
+    datos['mensajes'] = list(trabajo['mensajes'])
+    return datos
+
+
+def _guardar(trabajo):
+    ruta = ruta_estado(trabajo['id'], os.path.dirname(trabajo['ruta_zip']))
+    ruta_parcial = f"{ruta}.{threading.get_ident()}.part"
+    with open(ruta_parcial, 'w', encoding='utf-8') as f:
+        json.dump(_datos_publicos(trabajo), f, ensure_ascii=False)
+    os.replace(ruta_parcial, ruta)
+    trabajo['guardado'] = time.time()
+
+
+def _actualizar(trabajo, guardar=True, **cambios):
+    with _lock:
+        trabajo.update(cambios, actualizado=datetime.now().isoformat(timespec='seconds'))
+        if guardar:
+            _guardar(trabajo)
+
+
+def _olvidar_vencidos():
+    # Los trabajos terminados hace más del TTL ya no tienen ZIP; se sacan de memoria
+    ahora = time.time()
+    with _lock:
+        for trabajo_id, trabajo in list(_trabajos.items()):
+            if trabajo['estado'] not in ESTADOS_ACTIVOS and ahora - trabajo['guardado'] > TTL_ARCHIVOS:
+                del _trabajos[trabajo_id]
+
+
+def _contar_activos(usuario):
+    return sum(1 for trabajo in _trabajos.values()
+               if trabajo['usuario'] == usuario and trabajo['estado'] in ESTADOS_ACTIVOS)
+
+
+def enviar_trabajo(usuario, nombre_archivo, grupos, plantillas, backend='reportlab', max_workers=None,
+    corrida=None, directorio=None, modo='individual', variante=VARIANTE_POR_DEFECTO, empaque=None, perfil=None):
+    """
+    Encola la generación del ZIP. Devuelve (trabajo_id, mensaje); trabajo_id es None si el usuario
+    ya llegó a su límite de trabajos activos o si no se pudo guardar la entrada. corrida trae las métricas de la ingesta y la clasificación.
+    `variante` es la de las plantillas, para volver a cargarlas si el trabajo se retoma en otro proceso.
+    Al terminar, 'volumenes' tiene las rutas de los ZIP (uno solo salvo que `empaque` pida volúmenes).
+    Con `perfil` ('muestreo' o 'determinista') se perfila la generación y 'perfil_archivos' tiene las rutas
+    del perfil
+    """
+    _olvidar_vencidos()
+    ruta_zip = crear_ruta_zip(directorio)
+    trabajo_id = os.path.splitext(os.path.basename(ruta_zip))[0]
+    trabajo = _nuevo_trabajo(trabajo_id, usuario, nombre_archivo, grupos, ruta_zip, backend, modo, variante,
+                             empaque or opciones_empaque(), PERFIL if perfil is None else perfil)
+
+    error = _registrar(trabajo)
+    if error:
+        return None, error
+    rutas = [ruta_entrada(trabajo_id, os.path.dirname(ruta_zip)), ruta_estado(trabajo_id, os.path.dirname(ruta_zip))]
+    try:
+        guardar_entrada(grupos, rutas[0])
+        _actualizar(trabajo)
+        _obtener_executor().submit(_ejecutar, trabajo, grupos, plantillas, max_workers, corrida)
+    except Exception as e:
+        _descartar(trabajo, rutas)
+        return None, f"No se pudo encolar la generación: {e}"
+    return trabajo_id, "Generación en cola"
+
+
+def _nuevo_trabajo(trabajo_id, usuario, nombre_archivo, grupos, ruta_zip, backend, modo, variante, empaque,
+    perfil=''):
+    return {
+        'id': trabajo_id,
+        'usuario': usuario,
+        'archivo': nombre_archivo,
+        'estado': 'en_cola',
+        'procesados': 0,
+        'total': sum(len(grupo) for grupo in grupos.values() if not grupo.empty),
+        'por_segundo': None,
+        'eta': None,
+        'generados': None,
+        'mensajes': [],
+        # Resumen de los certificados que fallaron mientras corre: {'cantidad', 'ejemplos'}
+        'fallas': None,
+        'error': None,
+        'fallidos': 0,
+        'ruta_zip': ruta_zip,
+        'volumenes': None,
+        'resumen_metricas': None,
+        'backend': backend,
+        'modo': modo,
+        'variante': variante,
+        'empaque': empaque,
+        'perfil': perfil,
+        'perfil_archivos': None,
+        'creado': datetime.now().isoformat(timespec='seconds'),
+        'actualizado': None,
+        'cancelar': threading.Event(),
+    }
+
+
+def _registrar(trabajo):
+    # Contar y registrar bajo el mismo lock: dos envíos a la vez no pueden pasarse del límite,
+    # y un trabajo no se puede retomar dos veces a la vez. Devuelve el mensaje de error, o None
+    with _lock:
+        anterior = _trabajos.get(trabajo['id'])
+        if anterior is not None and anterior['estado'] in ESTADOS_ACTIVOS:
+            return "El trabajo ya está en curso"
+        if _contar_activos(trabajo['usuario']) >= LIMITE_POR_USUARIO:
+            return (f"Ya tienes {LIMITE_POR_USUARIO} generación(es) en curso. "
+                    "Espera a que termine o cancélala antes de subir otro archivo.")
+        _trabajos[trabajo['id']] = trabajo
+    return None
+
+
+def _descartar(trabajo, rutas=()):
+    # Un trabajo registrado que no se llegó a enviar sale de la cola, para no ocupar el cupo de su usuario,
+    # y se borra lo que alcanzó a escribir
+    with _lock:
+        if _trabajos.get(trabajo['id']) is trabajo:
+            del _trabajos[trabajo['id']]
+    for ruta in rutas:
+        try:
+            os.unlink(ruta)
+        except FileNotFoundError:
+            pass
+
+
+def reanudar_trabajo(trabajo_id, usuario, directorio=None, max_workers=None):
+    """
+    Vuelve a encolar un trabajo cortado, o uno terminado con filas fallidas para reintentar sólo esas.
+    Sólo lo puede retomar el mismo usuario que lo envió.
+    Devuelve (trabajo_id, mensaje) como enviar_trabajo; trabajo_id es None si no se puede retomar
+    """
+    datos = estado_trabajo(trabajo_id, directorio)
+    if datos is None or datos['estado'] not in ESTADOS_REANUDABLES:
+        return None, "El trabajo no existe o todavía está en curso"
+    if datos['usuario'] != usuario:
+        return None, "El trabajo es de otro usuario"
+    if datos['estado'] == 'terminado' and not os.path.exists(ruta_fallidos(datos['ruta_zip'])):
+        return None, "El trabajo terminó sin filas fallidas"
+    try:
+        grupos = leer_entrada(ruta_entrada(trabajo_id, os.path.dirname(datos['ruta_zip'])))
+    except (OSError, ValueError):
+        return None, "Ya no están los datos del trabajo; vuelve a subir el archivo"
+    plantillas = cargar_plantillas(variante=datos.get('variante', VARIANTE_POR_DEFECTO))
+    if not plantillas:
+        return None, "No se encontraron las plantillas"
+
+    trabajo = _nuevo_trabajo(trabajo_id, usuario, datos['archivo'], grupos, datos['ruta_zip'],
+                             datos.get('backend', 'reportlab'), datos.get('modo', 'individual'),
+                             datos.get('variante', VARIANTE_POR_DEFECTO), datos.get('empaque') or opciones_empaque(),
+                             datos.get('perfil', ''))
+    trabajo['creado'] = datos['creado']
+    error = _registrar(trabajo)
+    if error:
+        return None, error
+    try:
+        _actualizar(trabajo)
+        _obtener_executor().submit(_ejecutar, trabajo, grupos, plantillas, max_workers, None)
+    except Exception as e:
+        # La entrada y el estado anterior se conservan para poder intentarlo de nuevo
+        _descartar(trabajo)
+        return None, f"No se pudo retomar la generación: {e}"
+    return trabajo_id, "Generación retomada desde el último punto de control"
+
+
+def _ejecutar(trabajo, grupos, plantillas, max_workers, corrida):
+    if trabajo['cancelar'].is_set():
+        _actualizar(trabajo, estado='cancelado')
+        return
+
+    _actualizar(trabajo, estado='procesando')
+    if corrida is None:
+        corrida = metricas.nueva_corrida(trabajo['archivo'])
+
+    # El avance llega por el flujo de eventos, unas pocas veces por segundo; los fallos por fila llegan resumidos
+    def entregar(evento):
+        if evento['tipo'] in ('avance', 'fin'):
+            _actualizar(trabajo, guardar=time.time() - trabajo['guardado'] >= INTERVALO_GUARDADO,
+                        procesados=evento['procesados'], total=evento['total'], por_segundo=evento['por_segundo'],
+                        eta=evento['eta'])
+        elif evento['tipo'] == 'fallas':
+            _actualizar(trabajo, guardar=False, fallas={'cantidad': evento['cantidad'], 'ejemplos': evento['ejemplos']})
+        else:
+            nivel = evento.get('nivel') or (NIVEL_INICIO_ETAPA if evento['estado'] == 'inicio' else NIVEL_FIN_ETAPA)
+            with _lock:
+                trabajo['mensajes'].append((nivel, evento['mensaje']))
+
+    avanzar, avisar, terminar = crear_flujo(entregar)
+
+    def al_avanzar(procesados, total):
+        if trabajo['cancelar'].is_set():
+            raise TrabajoCancelado()
+        avanzar(procesados, total)
+
+    try:
+        try:
+            generados = generar_zip(grupos, plantillas, trabajo['archivo'], trabajo['ruta_zip'], al_avanzar, avisar,
+                                    max_workers, trabajo['backend'], corrida=corrida, modo=trabajo['modo'],
+                                    empaque=trabajo['empaque'], perfil=trabajo['perfil'])
+        finally:
+            terminar()
+            if trabajo['perfil']:
+                _actualizar(trabajo, guardar=False, perfil_archivos=[
+                    ruta for ruta in (ruta_pstats(trabajo['ruta_zip']), ruta_flamegraph(trabajo['ruta_zip']))
+                    if os.path.exists(ruta)])
+        resumen = metricas.cerrar_corrida(corrida)
+        metricas.escribir_resumen(corrida, ruta_resumen_metricas(trabajo['ruta_zip']))
+        _actualizar(trabajo, estado='terminado', generados=generados, fallidos=trabajo['total'] - generados,
+                    volumenes=rutas_volumenes(trabajo['ruta_zip']), resumen_metricas=resumen)
+    except TrabajoCancelado:
+        _actualizar(trabajo, estado='cancelado')
+    except Exception as e:
+        _actualizar(trabajo, estado='error', error=str(e))
+
+
+def cancelar_trabajo(trabajo_id, usuario):
+    """
+    Pide cancelar el trabajo; se detiene antes del siguiente certificado. Devuelve False si ya no está activo
+    o es de otro usuario
+    """
+    with _lock:
+        trabajo = _trabajos.get(trabajo_id)
+        if not trabajo or trabajo['usuario'] != usuario or trabajo['estado'] not in ESTADOS_ACTIVOS:
+            return False
+        trabajo['cancelar'].set()
+    return True
+
+
+def estado_trabajo(trabajo_id, directorio=None):
+    """
+    Estado del trabajo como dict, o None si no existe. Si el proceso se reinició, se lee del disco y
+    un trabajo que había quedado activo se informa como 'interrumpido'
+    """
+    if not id_valido(trabajo_id):
+        return None
+    with _lock:
+        trabajo = _trabajos.get(trabajo_id)
+        if trabajo:
+            return _datos_publicos(trabajo)
+
+    try:
+        with open(ruta_estado(trabajo_id, directorio), encoding='utf-8') as f:
+            datos = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if datos['estado'] in ESTADOS_ACTIVOS:
+        datos['estado'] = 'interrumpido'
+    return datos
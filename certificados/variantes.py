@@ -0,0 +1,90 @@
+"""
+Variantes de las imágenes de fondo según el uso del certificado.
+
+Los fondos de plantillas/ son JPEG de A4 a 300 dpi (~250 KB) y cada PDF lleva
+uno completo. La variante 'correo' los reduce a 150 dpi y los vuelve a codificar
+como JPEG progresivo optimizado, con lo que cada certificado pesa unas tres veces
+menos sin diferencia visible en pantalla. 'impresion' usa el archivo original.
+
+Las variantes se calculan una vez por plantilla y se guardan junto a la caché de
+PDFs, así otros procesos las reutilizan sin volver a codificar la imagen.
+"""
+import os
+import threading
+from io import BytesIO
+
+from PIL import Image
+
+from certificados.cache_pdf import DIRECTORIO_CACHE
+from certificados.recursos import huella_contenido
+
+# Resolución y calidad JPEG de cada variante; None es el archivo original
+VARIANTES = {
+    'impresion': None,
+    'correo': {'dpi': 150, 'calidad': 80},
+}
+
+VARIANTE_POR_DEFECTO = 'impresion'
+
+# Lado mayor de una hoja A4, en pulgadas
+LADO_MAYOR_A4 = 297 / 25.4
+
+_lock = threading.Lock()
+_variantes = {}
+
+
+def optimizar_imagen(contenido, dpi, calidad):
+    """JPEG progresivo con el lado mayor ajustado a `dpi` sobre A4; nunca agranda la imagen"""
+    imagen = Image.open(BytesIO(contenido))
+    imagen = imagen.convert('RGB')
+    lado_mayor = round(LADO_MAYOR_A4 * dpi)
+    escala = lado_mayor / max(imagen.size)
+    if escala < 1:
+        imagen = imagen.resize((round(imagen.width * escala), round(imagen.height * escala)), Image.LANCZOS)
+
+    salida = BytesIO()
+    imagen.save(salida, 'JPEG', quality=calidad, optimize=True, progressive=True, dpi=(dpi, dpi))
+    return salida.getvalue()
+
+
+def _ruta_variante(huella, nombre_variante):
+    return os.path.join(DIRECTORIO_CACHE, 'plantillas', f"{huella}_{nombre_variante}.jpg")
+
+
+def obtener_variante(contenido, nombre_variante):
+    """Bytes del fondo en la variante pedida; los mismos bytes (el mismo objeto) para cada llamada"""
+    parametros = VARIANTES[nombre_variante]
+    if parametros is None:
+        return contenido
+
+    huella = huella_contenido(contenido)
+    clave = (huella, nombre_variante)
+    with _lock:
+        if clave in _variantes:
+            return _variantes[clave]
+
+    ruta = _ruta_variante(huella, nombre_variante)
+    try:
+        with open(ruta, 'rb') as f:
+            optimizado = f.read()
+    except OSError:
+        optimizado = optimizar_imagen(contenido, parametros['dpi'], parametros['calidad'])
+        try:
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            ruta_parcial = f"{ruta}.{os.getpid()}.{threading.get_ident()}.part"
+            with open(ruta_parcial, 'wb') as f:
+                f.write(optimizado)
+            os.replace(ruta_parcial, ruta)
+        except OSError:
+            # Sin disco para guardarla se usa igual desde memoria
+            pass
+
+    with _lock:
+        return _variantes.setdefault(clave, optimizado)
+
+
+def aplicar_variante(plantillas, nombre_variante=VARIANTE_POR_DEFECTO):
+    """Las mismas plantillas de cargar_plantillas, con cada fondo en la variante pedida"""
+    if plantillas is None:
+        return None
+    return {clave: obtener_variante(contenido, nombre_variante) for clave, contenido in plantillas.items()}
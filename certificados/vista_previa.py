@@ -0,0 +1,63 @@
+"""
+Vista previa rápida: unos pocos certificados por grupo rasterizados a PNG.
+
+Por cada grupo se eligen las filas con el nombre y el curso más anchos (medidos
+con la fuente de su estilo), que son las que pueden partirse mal en líneas, y se
+renderizan en el proceso actual con el mismo backend que la corrida completa.
+PyMuPDF convierte la primera página de cada PDF en una miniatura PNG.
+"""
+import fitz
+
+from certificados.render import (
+    ancho_texto, crear_contexto_grupo, mapeo_plantillas, preparar_filas, styles_config_by_template
+)
+from certificados.motor import ruta_marca_agua_grupo, sin_avisos
+from certificados.paralelo import renderizar_lote
+
+# Resolución de las miniaturas: A4 apaisado a 60 dpi queda en unos 700 x 500 px
+DPI_VISTA_PREVIA = 60
+
+
+def filas_muestra(filas, estilos):
+    """Filas con el nombre más ancho y con el curso más ancho (una sola si coinciden)"""
+    if not filas:
+        return []
+    elegidas = []
+    for posicion, style_key in ((0, 'nombre'), (1, 'curso')):
+        estilo = estilos[style_key]
+        indice = max(range(len(filas)),
+                     key=lambda i: ancho_texto(filas[i][posicion], estilo['font_name'], estilo['font_size']))
+        if indice not in elegidas:
+            elegidas.append(indice)
+    return [filas[i] for i in elegidas]
+
+
+def pdf_a_png(pdf_bytes, dpi=DPI_VISTA_PREVIA):
+    with fitz.open("pdf", pdf_bytes) as doc:
+        return doc[0].get_pixmap(dpi=dpi).tobytes("png")
+
+
+def generar_vista_previa(grupos, plantillas, nombre_archivo, backend='reportlab', avisar=sin_avisos,
+    dpi=DPI_VISTA_PREVIA):
+    """
+    Renderiza la muestra de cada grupo no vacío. Devuelve una lista de dicts con 'grupo', 'plantilla_key',
+    'nombre', 'curso' y 'png' (bytes), o con 'error' si el certificado no se pudo generar
+    """
+    miniaturas = []
+    for grupo_nombre, grupo_df in grupos.items():
+        if grupo_df.empty:
+            continue
+        plantilla_key = mapeo_plantillas[grupo_nombre]
+        ruta_marca_agua = ruta_marca_agua_grupo(plantilla_key, nombre_archivo, styles_config_by_template, avisar)
+        contexto = crear_contexto_grupo(plantilla_key, plantillas[plantilla_key], styles_config_by_template,
+                                        ruta_marca_agua, backend=backend)
+        muestra = filas_muestra(preparar_filas(grupo_df, plantilla_key), contexto['estilos'])
+
+        for fila, (pdf_bytes, error, _segundos) in zip(muestra, renderizar_lote(contexto, muestra)):
+            miniatura = {'grupo': grupo_nombre, 'plantilla_key': plantilla_key, 'nombre': fila[0], 'curso': fila[1]}
+            if error:
+                miniatura['error'] = error
+            else:
+                miniatura['png'] = pdf_a_png(pdf_bytes, dpi)
+            miniaturas.append(miniatura)
+    return miniaturas
@@ -0,0 +1,50 @@
+"""
+Lo común a las pruebas: una planilla sintética chica, una caché de PDFs propia de cada prueba y
+`generar`, que corre el lote completo de una planilla en el mismo proceso.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+# Carpetas propias de las pruebas, antes de importar certificados: sus módulos las leen al importarse
+_TEMPORAL = tempfile.mkdtemp(prefix='certificados_pruebas_')
+os.environ['CERTIFICADOS_CACHE'] = os.path.join(_TEMPORAL, 'cache')
+os.environ['CERTIFICADOS_SALIDA'] = os.path.join(_TEMPORAL, 'salida')
+
+from certificados import cache_pdf  # noqa: E402
+from certificados.lote import procesar_lote  # noqa: E402
+from planilla_sintetica import generar_planilla  # noqa: E402
+
+FILAS_PLANILLA = 20
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_TEMPORAL, ignore_errors=True)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """Carpeta de la caché de PDFs, vacía al empezar cada prueba"""
+    directorio = str(tmp_path / 'cache')
+    monkeypatch.setattr(cache_pdf, 'DIRECTORIO_CACHE', directorio)
+    return directorio
+
+
+@pytest.fixture
+def planilla(tmp_path):
+    # El prefijo SI del nombre elige el flujo de clasificación
+    return generar_planilla(str(tmp_path / f"SI_{FILAS_PLANILLA}.xlsx"), FILAS_PLANILLA)
+
+
+@pytest.fixture
+def generar(cache):
+    """Genera los ZIP de `rutas` en `salida` con un solo worker (el render corre en este proceso)"""
+    def generar(rutas, salida, **opciones):
+        return procesar_lote([str(ruta) for ruta in rutas], str(salida), max_workers=1, **opciones)
+    return generar
@@ -0,0 +1,9 @@
+def test_segunda_corrida_sale_toda_de_la_cache(planilla, generar, tmp_path):
+    primera, = generar([planilla], tmp_path / 'primera')
+    segunda, = generar([planilla], tmp_path / 'segunda')
+
+    assert primera['generados'] == segunda['generados'] > 0
+    assert primera['corrida']['cache'] == {'aciertos': 0, 'fallos': primera['generados']}
+    assert segunda['corrida']['cache'] == {'aciertos': segunda['generados'], 'fallos': 0}
+    # Nada se vuelve a renderizar
+    assert 'render' not in segunda['corrida']['etapas']
@@ -0,0 +1,36 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from certificados.cli import main
+
+
+@pytest.fixture
+def repetidas(planilla, tmp_path):
+    # La misma planilla en dos carpetas
+    rutas = []
+    for carpeta in ('a', 'b'):
+        os.makedirs(tmp_path / carpeta)
+        rutas.append(shutil.copy(planilla, tmp_path / carpeta))
+    return rutas
+
+
+def test_metricas_de_planillas_con_el_mismo_nombre(repetidas, tmp_path, cache):
+    salida = tmp_path / 'salida'
+
+    assert main([*repetidas, '-o', str(salida), '--workers', '1', '--metricas', '-q']) == 0
+
+    assert sorted(os.listdir(salida)) == ['SI_20.metricas.json', 'SI_20.zip', 'SI_20_2.metricas.json', 'SI_20_2.zip']
+    for nombre in ('SI_20.metricas.json', 'SI_20_2.metricas.json'):
+        with open(salida / nombre, encoding='utf-8') as f:
+            assert json.load(f)['etapas']['zip']['cantidad'] == 20
+
+
+def test_metricas_en_el_combinado(repetidas, tmp_path, cache):
+    salida = tmp_path / 'salida'
+
+    assert main([*repetidas, '-o', str(salida), '--combinado', 'TODO.zip', '--workers', '1', '--metricas', '-q']) == 0
+
+    assert sorted(os.listdir(salida)) == ['SI_20.metricas.json', 'SI_20_2.metricas.json', 'TODO.zip']
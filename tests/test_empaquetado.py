@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import zipfile
+
+import pytest
+
+from certificados.empaquetado import (
+    NOMBRE_MANIFIESTO, EscritorZip, ZipVolumenes, comprimir_entrada, opciones_empaque
+)
+
+
+def datos_de(i):
+    # Mitad comprimible y mitad no, para que haya entradas en deflate y guardadas tal cual
+    return f"certificado {i} ".encode('utf-8') * 20 if i % 2 else hashlib.sha512(str(i).encode('utf-8')).digest()
+
+
+def escribir(escritor, cantidad):
+    for i in range(cantidad):
+        datos = datos_de(i)
+        escritor.agregar(f"grupo/{i}.pdf", datos, *(comprimir_entrada(datos, 6) or ()))
+
+
+def test_zip64_por_cantidad_de_entradas(tmp_path):
+    ruta = tmp_path / 'muchas.zip'
+    escritor = EscritorZip(str(ruta))
+    escribir(escritor, 70000)
+    escritor.close()
+
+    with zipfile.ZipFile(ruta) as archivo:
+        assert archivo.testzip() is None
+        infos = archivo.infolist()
+        assert len(infos) == 70000
+        assert {info.compress_type for info in infos} == {zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED}
+        for i in (0, 1, 65535, 65536, 69999):
+            assert archivo.read(f"grupo/{i}.pdf") == datos_de(i)
+
+
+def test_zip64_por_offset(tmp_path):
+    # Las entradas empiezan después de los 4 GB: el archivo es disperso y no ocupa ese espacio en disco
+    ruta = tmp_path / 'grande.zip'
+    ruta.write_bytes(b'')
+    escritor = EscritorZip(str(ruta), [], tamano=5 * 2 ** 30)
+    esperado = {f"grupo/{i}.pdf": datos_de(i) for i in range(4)}
+    for nombre, datos in esperado.items():
+        escritor.agregar(nombre, datos, *(comprimir_entrada(datos, 6) or ()))
+    escritor.close()
+
+    with zipfile.ZipFile(ruta) as archivo:
+        assert archivo.testzip() is None
+        assert all(info.header_offset >= 2 ** 32 for info in archivo.infolist())
+        assert {nombre: archivo.read(nombre) for nombre in archivo.namelist()} == esperado
+
+
+@pytest.mark.parametrize('compresion', [0, 6])
+def test_los_volumenes_no_pasan_el_limite(tmp_path, compresion):
+    # El peor caso: nombres largos con acentos y muchos certificados por entrada, que inflan el manifiesto
+    limite = 1024 * 1024
+    empaque = dict(opciones_empaque(), volumen_mb=1, compresion=compresion, por_carpeta=True)
+    zip_volumenes = ZipVolumenes(str(tmp_path / 'SALIDA.zip'), empaque)
+    esperado = {}
+    for i in range(300):
+        nombre = f"grupo_ñ/{'CERTIFICADO_ÁÉÍÓÚ_' * 8}{i}.pdf"
+        esperado[nombre] = os.urandom(3000) + b'a' * 3000
+        certificados = [{'fila': i, 'numeracion': f"N-{i:05d}", 'nombre': 'JOSÉ ÑANDÚ ' * 6,
+                         'nombre_normalizado': 'JOSE_NANDU_' * 6, 'curso': 'GESTIÓN DE PROYECTOS ' * 8,
+                         'plantilla': 'fondo_3', 'grupo': 'grupo_ñ', 'pagina': pagina} for pagina in range(30)]
+        if i % 100 == 0:
+            zip_volumenes.writestr(nombre.rsplit('/', 1)[0] + '/', b'')
+        zip_volumenes.writestr(nombre, esperado[nombre], certificados)
+    rutas = zip_volumenes.cerrar()
+
+    leidos = {}
+    assert len(rutas) > 3
+    for ruta in rutas:
+        assert os.path.getsize(ruta) <= limite
+        with zipfile.ZipFile(ruta) as archivo:
+            assert archivo.testzip() is None
+            manifiesto = json.loads(archivo.read(NOMBRE_MANIFIESTO))
+            assert manifiesto['volumen'] == os.path.basename(ruta)
+            assert len(manifiesto['certificados']) == 30 * len(manifiesto['entradas'])
+            leidos.update((nombre, archivo.read(nombre)) for nombre in archivo.namelist()
+                          if nombre != NOMBRE_MANIFIESTO and not nombre.endswith('/'))
+    assert leidos == esperado
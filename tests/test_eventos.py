@@ -0,0 +1,79 @@
+from certificados.eventos import (
+    EJEMPLOS_FALLAS, NIVEL_FALLO, NIVEL_FIN_ETAPA, NIVEL_INICIO_ETAPA, crear_flujo, describir_avance,
+    describir_fallas, formato_duracion
+)
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 100.0
+
+    def __call__(self):
+        return self.ahora
+
+
+def flujo(eventos_por_segundo=4):
+    eventos, reloj = [], Reloj()
+    return eventos, reloj, crear_flujo(eventos.append, eventos_por_segundo, reloj)
+
+
+def test_el_avance_sale_como_mucho_a_la_tasa_pedida():
+    eventos, reloj, (al_avanzar, _avisar, terminar) = flujo(eventos_por_segundo=4)
+    # 10.000 filas en 10 segundos: una cada milisegundo
+    for procesados in range(1, 10001):
+        reloj.ahora += 0.001
+        al_avanzar(procesados, 10000)
+    fin = terminar()
+
+    avances = [evento for evento in eventos if evento['tipo'] == 'avance']
+    assert 40 <= len(avances) <= 41
+    assert all(b['segundos'] - a['segundos'] >= 0.25 - 1e-9 for a, b in zip(avances, avances[1:]))
+    assert eventos[-1] is fin and fin['tipo'] == 'fin' and fin['procesados'] == fin['total'] == 10000
+    assert round(fin['por_segundo']) == 1000
+
+
+def test_velocidad_y_tiempo_restante_de_la_ventana_reciente():
+    eventos, reloj, (al_avanzar, _avisar, _terminar) = flujo(eventos_por_segundo=1)
+    # 500 filas retomadas de un punto de control de golpe, después 10 por segundo durante 30 s
+    al_avanzar(500, 1000)
+    for segundo in range(1, 31):
+        reloj.ahora += 1
+        al_avanzar(500 + 10 * segundo, 1000)
+
+    ultimo = eventos[-1]
+    assert ultimo['procesados'] == 800
+    assert abs(ultimo['por_segundo'] - 10) < 1e-9
+    assert abs(ultimo['eta'] - 20) < 1e-9
+
+
+def test_las_fallas_salen_resumidas():
+    eventos, reloj, (al_avanzar, avisar, terminar) = flujo(eventos_por_segundo=1)
+    for i in range(1, 101):
+        reloj.ahora += 0.01
+        avisar(NIVEL_FALLO, f"Error {i}")
+        al_avanzar(i, 100)
+    terminar()
+
+    fallas = [evento for evento in eventos if evento['tipo'] == 'fallas']
+    assert len(fallas) <= 3
+    assert fallas[-1]['cantidad'] == 100
+    assert fallas[-1]['ejemplos'] == [f"Error {i}" for i in range(1, EJEMPLOS_FALLAS + 1)]
+    assert eventos[-1]['fallas']['cantidad'] == 100
+
+
+def test_etapas_y_avisos_salen_en_el_momento():
+    eventos, _reloj, (_al_avanzar, avisar, _terminar) = flujo()
+    avisar(NIVEL_INICIO_ETAPA, "Procesando grupo_1")
+    avisar('warning', "Falta la marca de agua")
+    avisar(NIVEL_FIN_ETAPA, "grupo_1 listo")
+
+    assert [(evento['tipo'], evento.get('estado') or evento.get('nivel')) for evento in eventos] == [
+        ('etapa', 'inicio'), ('aviso', 'warning'), ('etapa', 'fin')]
+
+
+def test_descripciones():
+    assert [formato_duracion(segundos) for segundos in (45, 200, 3900)] == ['45 s', '3 min 20 s', '1 h 05 min']
+    assert describir_avance({'procesados': 1200, 'total': 4000, 'por_segundo': 85.25, 'eta': 33}) == \
+        "1200 de 4000 certificados · 85.2/s · faltan ~33 s"
+    assert describir_fallas({'cantidad': 7, 'ejemplos': ['a', 'b']}) == \
+        "❌ 7 certificados no se pudieron generar. Por ejemplo: a; b; ..."
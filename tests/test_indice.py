@@ -0,0 +1,36 @@
+from zipfile import ZipFile
+
+import pytest
+
+from certificados.empaquetado import opciones_empaque, rutas_volumenes
+from certificados.indice import buscar_certificados, leer_entrada, leer_manifiesto
+
+
+@pytest.mark.parametrize('empaque', [
+    opciones_empaque(compresion=0, volumen_mb=0, por_carpeta=False),
+    opciones_empaque(compresion=6, volumen_mb=0, por_carpeta=True),
+])
+def test_cada_certificado_se_encuentra_y_se_lee_desde_el_indice(planilla, generar, tmp_path, empaque):
+    resultado, = generar([planilla], tmp_path, empaque=empaque)
+    rutas = rutas_volumenes(resultado['ruta_zip'])
+    certificados = [certificado for ruta in rutas for certificado in leer_manifiesto(ruta)['certificados']]
+    assert sorted(certificado['fila'] for certificado in certificados) == list(range(1, resultado['generados'] + 1))
+
+    for certificado in certificados:
+        encontrados = buscar_certificados([resultado['ruta_zip']], nombre=certificado['nombre'].lower(),
+                                          fila=certificado['fila'])
+        assert [encontrado['entrada'] for encontrado in encontrados] == [certificado['entrada']]
+        encontrado = encontrados[0]
+        with ZipFile(encontrado['ruta_zip']) as zip_file:
+            assert leer_entrada(encontrado['ruta_zip'], encontrado['datos_entrada']) == \
+                zip_file.read(certificado['entrada'])
+
+
+def test_buscar_por_numeracion(planilla, generar, tmp_path):
+    resultado, = generar([planilla], tmp_path)
+    certificado = next(certificado for certificado in leer_manifiesto(resultado['ruta_zip'])['certificados']
+                       if certificado['numeracion'])
+
+    encontrados = buscar_certificados([resultado['ruta_zip']], numeracion=certificado['numeracion'])
+
+    assert [encontrado['entrada'] for encontrado in encontrados] == [certificado['entrada']]
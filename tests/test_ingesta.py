@@ -0,0 +1,72 @@
+import csv
+import math
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from openpyxl import load_workbook
+
+from certificados.ingesta import FILA_CABECERA, leer_planilla, procesar_excel_inicial
+
+
+def filas_excel(ruta):
+    libro = load_workbook(ruta, read_only=True)
+    filas = [list(fila) for fila in libro.worksheets[0].iter_rows(values_only=True)]
+    libro.close()
+    return filas
+
+
+def como_texto(df):
+    # CSV trae todo como texto: se compara el contenido, no el tipo
+    return df.map(lambda valor: '' if isinstance(valor, float) and math.isnan(valor) else str(valor))
+
+
+@pytest.mark.parametrize('delimitador', [',', ';', '\t'])
+@pytest.mark.parametrize('con_encabezado', [True, False])
+@pytest.mark.parametrize('codificacion', ['utf-8-sig', 'cp1252'])
+def test_csv_da_la_misma_tabla_que_el_excel(planilla, tmp_path, delimitador, con_encabezado, codificacion):
+    filas = filas_excel(planilla)
+    if not con_encabezado:
+        # Un CSV exportado sin el encabezado del reporte empieza por la cabecera
+        filas = filas[FILA_CABECERA:]
+    ruta_csv = tmp_path / 'SI_20.csv'
+    with open(ruta_csv, 'w', newline='', encoding=codificacion) as f:
+        csv.writer(f, delimiter=delimitador).writerows(filas)
+
+    esperado = leer_planilla(planilla)[0]
+    df, _vista_previa, dimensiones = leer_planilla(str(ruta_csv))
+
+    assert len(df) == 20 and dimensiones[0] == len(filas) - 1
+    pd.testing.assert_frame_equal(como_texto(df), como_texto(esperado))
+
+
+def test_parquet_lee_sólo_las_columnas_requeridas(planilla, tmp_path):
+    filas = filas_excel(planilla)
+    # Cabecera en mayúsculas y con columnas de más, como la exporta otro sistema
+    cabecera, datos = filas[FILA_CABECERA], filas[FILA_CABECERA + 1:]
+    columnas = {nombre: [str(fila[i]) if fila[i] is not None and nombre == 'NOTA FINAL' else fila[i] for fila in datos]
+                for i, nombre in enumerate(cabecera)}
+    ruta_parquet = tmp_path / 'SI_20.parquet'
+    pq.write_table(pa.table(columnas), ruta_parquet)
+
+    esperado = leer_planilla(planilla)[0]
+    df, vista_previa, dimensiones = leer_planilla(str(ruta_parquet))
+
+    assert dimensiones == (20, len(cabecera)) and len(vista_previa) == 15
+    pd.testing.assert_frame_equal(como_texto(df), como_texto(esperado))
+    assert df['horas_progresivo'].dropna().map(type).eq(int).all()
+
+
+def test_excel_con_nombre_y_curso_en_la_primera_fila(planilla, tmp_path):
+    # En un Excel la primera fila es el título del reporte aunque tenga esas palabras: la cabecera es la fila 12
+    libro = load_workbook(planilla)
+    libro.worksheets[0]['A1'], libro.worksheets[0]['B1'] = 'Nombre', 'Curso'
+    ruta = tmp_path / 'SI_TITULO.xlsx'
+    libro.save(ruta)
+
+    df, exito, mensaje = procesar_excel_inicial(str(ruta), 'SI_TITULO.xlsx')
+
+    assert exito, mensaje
+    assert len(df) == 20
+    pd.testing.assert_frame_equal(df, procesar_excel_inicial(planilla, 'SI_20.xlsx')[0])
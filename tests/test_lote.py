@@ -0,0 +1,40 @@
+import os
+import shutil
+from zipfile import ZipFile
+
+from certificados.lote import _nombres_unicos, expandir_entradas
+
+
+def test_nombres_unicos_numera_los_repetidos():
+    assert _nombres_unicos(['SI_A.zip', 'SI_B.zip', 'SI_A.zip', 'SI_A.zip']) == \
+        ['SI_A.zip', 'SI_B.zip', 'SI_A_2.zip', 'SI_A_3.zip']
+
+
+def test_expandir_entradas_lee_carpetas_y_zip(planilla, tmp_path):
+    carpeta = tmp_path / 'carpeta'
+    carpeta.mkdir()
+    shutil.copy(planilla, carpeta / 'SI_CARPETA.xlsx')
+    (carpeta / 'notas.txt').write_text('no es una planilla')
+    with ZipFile(tmp_path / 'planillas.zip', 'w') as zip_file:
+        zip_file.write(planilla, 'sub/SI_ZIP.xlsx')
+        zip_file.writestr('__MACOSX/sub/._SI_ZIP.xlsx', b'')
+
+    nombres = [nombre for nombre, _archivo in expandir_entradas([str(carpeta), str(tmp_path / 'planillas.zip')])]
+
+    assert nombres == ['SI_CARPETA.xlsx', 'SI_ZIP.xlsx']
+
+
+def test_lote_con_planillas_del_mismo_nombre(planilla, generar, tmp_path):
+    # La misma planilla en dos carpetas: cada una va a su propio ZIP
+    rutas = []
+    for carpeta in ('a', 'b'):
+        os.makedirs(tmp_path / carpeta)
+        rutas.append(shutil.copy(planilla, tmp_path / carpeta))
+
+    resultados = generar(rutas, tmp_path / 'salida')
+
+    assert [os.path.basename(resultado['ruta_zip']) for resultado in resultados] == ['SI_20.zip', 'SI_20_2.zip']
+    assert [resultado['generados'] for resultado in resultados] == [20, 20]
+    for resultado in resultados:
+        with ZipFile(resultado['ruta_zip']) as zip_file:
+            assert len([nombre for nombre in zip_file.namelist() if nombre.endswith('.pdf')]) == 20
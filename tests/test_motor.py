@@ -0,0 +1,36 @@
+from certificados.motor import desduplicar_nombres
+
+
+def _fila(nombre, pdf_name):
+    return (nombre, 'Ofimática', 'N-00001', 40, pdf_name)
+
+
+def test_desduplicar_nombres_numera_los_repetidos():
+    planes = [
+        {'filas': [_fila('ANA', 'ANA_OFIMÁTICA.pdf'), _fila('ANA', 'ANA_OFIMÁTICA.pdf')]},
+        # Un nombre con el sufijo que tocaría ya existe: se saltea
+        {'filas': [_fila('ANA', 'ANA_OFIMÁTICA.pdf'), _fila('ANA B', 'ANA_OFIMÁTICA_2.pdf')]},
+    ]
+    avisos = []
+
+    renombrados = desduplicar_nombres(planes, lambda nivel, mensaje: avisos.append((nivel, mensaje)))
+
+    assert [[fila[4] for fila in plan['filas']] for plan in planes] == [
+        ['ANA_OFIMÁTICA.pdf', 'ANA_OFIMÁTICA_3.pdf'],
+        ['ANA_OFIMÁTICA_4.pdf', 'ANA_OFIMÁTICA_2.pdf'],
+    ]
+    assert planes[0]['filas'][1] == _fila('ANA', 'ANA_OFIMÁTICA_3.pdf')
+    assert renombrados == [
+        ('ANA_OFIMÁTICA.pdf', 'ANA_OFIMÁTICA_3.pdf'),
+        ('ANA_OFIMÁTICA.pdf', 'ANA_OFIMÁTICA_4.pdf'),
+    ]
+    assert [nivel for nivel, _mensaje in avisos] == ['warning']
+
+
+def test_desduplicar_nombres_sin_repetidos_no_cambia_nada():
+    planes = [{'filas': [_fila('ANA', 'ANA_OFIMÁTICA.pdf'), _fila('ROSA', 'ROSA_OFIMÁTICA.pdf')]}]
+    avisos = []
+
+    assert desduplicar_nombres(planes, lambda nivel, mensaje: avisos.append(mensaje)) == []
+    assert [fila[4] for fila in planes[0]['filas']] == ['ANA_OFIMÁTICA.pdf', 'ROSA_OFIMÁTICA.pdf']
+    assert avisos == []
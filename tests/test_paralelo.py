@@ -0,0 +1,44 @@
+import os
+import pickle
+
+from certificados import paralelo, perfil
+from certificados.motor import cargar_plantillas
+from certificados.render import crear_contexto_grupo, styles_config_by_template
+
+
+def tareas():
+    plantillas = cargar_plantillas()
+    resultado = []
+    for plantilla_key in ('fondo_2', 'fondo_3'):
+        contexto = crear_contexto_grupo(plantilla_key, plantillas[plantilla_key], styles_config_by_template,
+                                        fecha='marzo del 2025', determinista=True)
+        filas = [(f"ALUMNO {i}", "OFIMÁTICA", f"N-{i:05d}", None, f"ALUMNO_{i}.pdf") for i in range(40)]
+        resultado.append((contexto, filas))
+    return resultado
+
+
+def test_los_lotes_llevan_la_ruta_del_contexto_y_no_la_plantilla(monkeypatch):
+    enviados = []
+    enviar_tarea = perfil.enviar_tarea
+
+    def enviar_y_medir(pool, funcion, *args):
+        enviados.append(len(pickle.dumps(args)))
+        return enviar_tarea(pool, funcion, *args)
+
+    monkeypatch.setattr(perfil, 'enviar_tarea', enviar_y_medir)
+    en_el_pool = list(paralelo.renderizar_tareas(tareas(), max_workers=2))
+    serial = list(paralelo.renderizar_tareas(tareas(), max_workers=1))
+
+    # 80 filas en lotes de 16 por grupo: 3 lotes de cada uno, de unos pocos KB aunque la plantilla pese cientos
+    assert len(enviados) == 6 and max(enviados) < 5000
+    assert [(fila, pdf_bytes, error) for fila, pdf_bytes, error, _segundos in en_el_pool] == \
+        [(fila, pdf_bytes, error) for fila, pdf_bytes, error, _segundos in serial]
+    assert all(pdf_bytes.startswith(b'%PDF') for _fila, pdf_bytes, _error, _segundos in serial)
+
+
+def test_un_contexto_se_publica_una_sola_vez():
+    contexto, _filas = tareas()[0]
+    ruta = paralelo.publicar_contexto(contexto)
+    assert paralelo.publicar_contexto(dict(contexto)) == ruta
+    assert paralelo._cargar_contexto(ruta)['huella_plantilla'] == contexto['huella_plantilla']
+    assert os.path.dirname(ruta) == paralelo._directorio_contextos
@@ -0,0 +1,52 @@
+import json
+import os
+from zipfile import ZipFile
+
+import pytest
+
+from certificados import cache_pdf, reanudacion
+from certificados.empaquetado import NOMBRE_MANIFIESTO, opciones_empaque
+from certificados.reanudacion import ruta_control
+
+
+class Corte(Exception):
+    pass
+
+
+def contenido(ruta_zip):
+    # Entradas en orden con su contenido, y los certificados del índice
+    with ZipFile(ruta_zip) as zip_file:
+        assert zip_file.testzip() is None
+        entradas = [(nombre, zip_file.read(nombre)) for nombre in zip_file.namelist() if nombre != NOMBRE_MANIFIESTO]
+        certificados = json.loads(zip_file.read(NOMBRE_MANIFIESTO))['certificados']
+    return entradas, certificados
+
+
+@pytest.mark.parametrize('compresion', [0, 6])
+def test_corrida_cortada_y_retomada_da_el_mismo_zip(planilla, generar, tmp_path, monkeypatch, compresion):
+    monkeypatch.setattr(reanudacion, 'FILAS_POR_PUNTO_CONTROL', 3)
+    empaque = opciones_empaque(compresion=compresion, volumen_mb=0, por_carpeta=False)
+
+    def cortar(procesados, total):
+        if procesados == 8:
+            raise Corte
+
+    salida = tmp_path / 'cortada'
+    with pytest.raises(Corte):
+        generar([planilla], salida, al_avanzar=cortar, empaque=empaque)
+    ruta_zip = os.path.join(salida, 'SI_20.zip')
+    with open(ruta_control(ruta_zip), encoding='utf-8') as f:
+        hechas = json.load(f)['hechas']
+    assert 0 < len(hechas) < 20
+
+    avisos = []
+    retomada, = generar([planilla], salida, avisar=lambda nivel, mensaje: avisos.append(mensaje), empaque=empaque)
+    assert retomada['ruta_zip'] == ruta_zip and retomada['generados'] == 20
+    assert sum(int(aviso.split(': ')[1].split()[0]) for aviso in avisos if aviso.startswith('⏩')) == len(hechas)
+    assert not os.path.exists(ruta_control(ruta_zip))
+
+    # La corrida sin cortes, con una caché aparte para que todo se renderice de nuevo
+    monkeypatch.setattr(cache_pdf, 'DIRECTORIO_CACHE', str(tmp_path / 'otra_cache'))
+    completa, = generar([planilla], tmp_path / 'completa', empaque=empaque)
+    assert completa['corrida']['cache']['aciertos'] == 0
+    assert contenido(retomada['ruta_zip']) == contenido(completa['ruta_zip'])
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import threading
+from unittest import mock
+
+import tornado.testing
+
+from certificados import servicio
+
+SOLICITUD = {'plantilla': 'fondo_3', 'nombre': 'Ana Pérez García', 'curso': 'Ofimática', 'numero': 'N-00012',
+             'archivo': 'SI_SECCION_A.xlsx', 'fecha': '12 de marzo del 2025'}
+
+
+class PruebaServicio(tornado.testing.AsyncHTTPTestCase):
+    def get_app(self):
+        return servicio.crear_aplicacion(limite=1)
+
+    def pedir(self, datos):
+        cuerpo = datos if isinstance(datos, bytes) else json.dumps(datos)
+        return self.fetch('/certificado', method='POST', body=cuerpo, raise_error=False)
+
+    def test_certificado(self):
+        respuesta = self.pedir(SOLICITUD)
+
+        self.assertEqual(respuesta.code, 200)
+        self.assertEqual(respuesta.headers['Content-Type'], 'application/pdf')
+        self.assertIn("filename*=UTF-8''ANA_P%C3%89REZ", respuesta.headers['Content-Disposition'])
+        self.assertTrue(respuesta.body.startswith(b'%PDF'))
+        # La segunda vez sale de la caché, igual
+        self.assertEqual(self.pedir(SOLICITUD).body, respuesta.body)
+
+    def test_la_fecha_no_queda_en_los_contextos_guardados(self):
+        for dia in range(1, 4):
+            self.assertEqual(self.pedir(dict(SOLICITUD, fecha=f"{dia} de marzo del 2025")).code, 200)
+        # Un solo contexto guardado para las tres fechas, y sin ninguna de ellas
+        guardados = [contexto for clave, contexto in servicio._contextos.items() if clave[0] == 'fondo_3']
+        self.assertEqual(len(guardados), 1)
+        self.assertNotIn('del 2025', str(guardados[0]['fecha']))
+
+    def test_solicitudes_invalidas(self):
+        casos = [
+            (b'{no es json', "JSON"),
+            ([1, 2], "objeto"),
+            (dict(SOLICITUD, plantilla='fondo_9'), "'plantilla'"),
+            ({clave: valor for clave, valor in SOLICITUD.items() if clave != 'nombre'}, "'nombre'"),
+            (dict(SOLICITUD, curso='  '), "'curso'"),
+            (dict(SOLICITUD, numero=''), "'numero'"),
+        ]
+        for datos, mensaje in casos:
+            respuesta = self.pedir(datos)
+            self.assertEqual(respuesta.code, 400, datos)
+            self.assertIn(mensaje, json.loads(respuesta.body)['error'])
+
+    @tornado.testing.gen_test
+    async def test_503_con_el_limite_ocupado(self):
+        liberar = threading.Event()
+
+        def renderizar_detenido(*args):
+            liberar.wait(10)
+            return 'A.pdf', b'%PDF-1.4', None
+
+        with mock.patch.object(servicio, 'renderizar_solicitud', renderizar_detenido):
+            primera = self.http_client.fetch(self.get_url('/certificado'), method='POST',
+                                             body=json.dumps(SOLICITUD), raise_error=False)
+            while self._app.settings['estado']['en_curso'] < 1:
+                await asyncio.sleep(0.01)
+
+            segunda = await self.http_client.fetch(self.get_url('/certificado'), method='POST',
+                                                   body=json.dumps(SOLICITUD), raise_error=False)
+            self.assertEqual(segunda.code, 503)
+            self.assertEqual(segunda.headers['Retry-After'], '1')
+
+            liberar.set()
+            self.assertEqual((await primera).code, 200)
+        self.assertEqual(self._app.settings['estado']['en_curso'], 0)
+
+    def test_salud_y_metricas(self):
+        self.assertEqual(self.fetch('/salud').body, b'ok')
+        self.pedir(dict(SOLICITUD, plantilla='fondo_9'))
+
+        respuesta = self.fetch('/metricas')
+        self.assertEqual(respuesta.code, 200)
+        self.assertTrue(respuesta.headers['Content-Type'].startswith('text/plain'))
+        texto = respuesta.body.decode('utf-8')
+        self.assertIn('certificados_servicio_solicitudes_total{estado="200",ruta="/salud"}', texto)
+        self.assertIn('certificados_servicio_solicitudes_total{estado="400",ruta="/certificado"}', texto)
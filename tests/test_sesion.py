@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from certificados.sesion import ARTEFACTOS, liberar_artefactos, registrar_artefactos, tamano_objeto
+
+MB = 1024 * 1024
+
+
+def estado_con(tamanos_mb, desde=1000.0):
+    # Un artefacto de cada tamaño (en MB), en el orden de ARTEFACTOS
+    estado = {clave: b'x' * int(mb * MB) for clave, mb in zip(ARTEFACTOS, tamanos_mb)}
+    estado['nombre_archivo'] = 'SI_20.xlsx'
+    registrar_artefactos(estado, desde)
+    return estado
+
+
+def test_tamano_objeto():
+    df = pd.DataFrame({'nombre': ['ANA PÉREZ'] * 1000})
+    assert tamano_objeto(df) >= 1000 * len('ANA PÉREZ')
+    assert tamano_objeto(b'x' * 5000) == 5000
+    anidado = {'miniaturas': [b'x' * 3000, b'x' * 2000], 'df': df}
+    assert tamano_objeto(anidado) > 5000 + tamano_objeto(df)
+
+
+def test_dentro_del_presupuesto_no_libera_nada():
+    estado = estado_con([2, 2, 2, 2])
+    assert liberar_artefactos(estado, presupuesto_mb=16, ttl=60, ahora=1010.0) == []
+    assert all(estado[clave] is not None for clave in ARTEFACTOS)
+
+
+def test_pasado_el_presupuesto_libera_en_orden_hasta_entrar():
+    estado = estado_con([6, 6, 3, 3])
+
+    assert liberar_artefactos(estado, presupuesto_mb=10, ttl=60, ahora=1010.0) == ['df_procesado', 'grupos']
+
+    assert estado['df_procesado'] is None and estado['grupos'] is None
+    assert estado['plantillas'] is not None and estado['vista_previa'] is not None
+    assert estado['nombre_archivo'] == 'SI_20.xlsx'
+
+
+@pytest.mark.parametrize('descargado, ahora', [(True, 1010.0), (False, 1060.0)])
+def test_descargado_o_vencido_libera_todo(descargado, ahora):
+    estado = estado_con([1, 1, 1, 1])
+    assert liberar_artefactos(estado, descargado, presupuesto_mb=16, ttl=60, ahora=ahora) == ARTEFACTOS
+    assert all(estado[clave] is None for clave in ARTEFACTOS)
+    # Lo ya liberado no se vuelve a informar
+    assert liberar_artefactos(estado, descargado, presupuesto_mb=16, ttl=60, ahora=ahora) == []
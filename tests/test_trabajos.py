@@ -0,0 +1,121 @@
+import os
+import time
+
+import pytest
+
+from certificados import trabajos
+from certificados.clasificacion import clasificar_estudiantes_por_nota
+from certificados.ingesta import procesar_excel_inicial
+from certificados.motor import cargar_plantillas
+
+
+class ExecutorDetenido:
+    # Guarda los trabajos enviados sin correrlos, para verlos en cola
+    def __init__(self):
+        self.enviados = []
+
+    def submit(self, funcion, *args):
+        self.enviados.append((funcion, args))
+
+    def correr(self):
+        for funcion, args in self.enviados:
+            funcion(*args)
+        self.enviados = []
+
+
+@pytest.fixture
+def cola(monkeypatch, cache):
+    monkeypatch.setattr(trabajos, '_trabajos', {})
+    monkeypatch.setattr(trabajos, 'LIMITE_POR_USUARIO', 1)
+    executor = ExecutorDetenido()
+    monkeypatch.setattr(trabajos, '_obtener_executor', lambda: executor)
+    return executor
+
+
+@pytest.fixture
+def salida(tmp_path):
+    return tmp_path / 'salida'
+
+
+@pytest.fixture
+def entrada(planilla):
+    df, exito, mensaje = procesar_excel_inicial(planilla, os.path.basename(planilla))
+    assert exito, mensaje
+    return clasificar_estudiantes_por_nota(df, os.path.basename(planilla)), cargar_plantillas()
+
+
+def enviar(usuario, entrada, directorio):
+    grupos, plantillas = entrada
+    return trabajos.enviar_trabajo(usuario, 'SI_20.xlsx', grupos, plantillas, max_workers=1,
+                                   directorio=str(directorio))
+
+
+def test_trabajo_en_cola_corre_y_queda_en_disco(cola, entrada, salida):
+    trabajo_id, _mensaje = enviar('ana', entrada, salida)
+    assert trabajos.estado_trabajo(trabajo_id)['estado'] == 'en_cola'
+    assert os.path.exists(trabajos.ruta_entrada(trabajo_id, str(salida)))
+
+    cola.correr()
+
+    estado = trabajos.estado_trabajo(trabajo_id)
+    assert (estado['estado'], estado['generados'], estado['fallidos']) == ('terminado', 20, 0)
+    assert estado['volumenes'] == [os.path.join(str(salida), f"{trabajo_id}.zip")]
+    # Sin el trabajo en memoria (otro proceso) el estado se lee del disco
+    trabajos._trabajos.clear()
+    assert trabajos.estado_trabajo(trabajo_id, str(salida))['generados'] == 20
+
+
+def test_limite_de_trabajos_por_usuario(cola, entrada, salida):
+    primero, _mensaje = enviar('ana', entrada, salida)
+    segundo, mensaje = enviar('ana', entrada, salida)
+    assert primero is not None and segundo is None and 'en curso' in mensaje
+    assert enviar('luis', entrada, salida)[0] is not None
+
+    cola.correr()
+    assert enviar('ana', entrada, salida)[0] is not None
+
+
+def test_si_no_se_puede_guardar_la_entrada_el_usuario_no_queda_bloqueado(cola, entrada, salida, monkeypatch):
+    def guardar_entrada_fallida(grupos, ruta):
+        with open(ruta, 'w') as f:
+            f.write('{')
+        raise OSError("disco lleno")
+
+    with monkeypatch.context() as parche:
+        parche.setattr(trabajos, 'guardar_entrada', guardar_entrada_fallida)
+        trabajo_id, mensaje = enviar('ana', entrada, salida)
+    assert trabajo_id is None and 'disco lleno' in mensaje
+    assert trabajos._trabajos == {} and os.listdir(salida) == [] and cola.enviados == []
+
+    assert enviar('ana', entrada, salida)[0] is not None
+
+
+def test_solo_el_dueno_cancela_y_retoma(cola, entrada, salida):
+    trabajo_id, _mensaje = enviar('ana', entrada, salida)
+    assert not trabajos.cancelar_trabajo(trabajo_id, 'luis')
+    assert trabajos.cancelar_trabajo(trabajo_id, 'ana')
+    cola.correr()
+    assert trabajos.estado_trabajo(trabajo_id)['estado'] == 'cancelado'
+
+    assert trabajos.reanudar_trabajo(trabajo_id, 'luis', str(salida)) == (None, "El trabajo es de otro usuario")
+    assert trabajos.reanudar_trabajo(trabajo_id, 'ana', str(salida), max_workers=1)[0] == trabajo_id
+    cola.correr()
+    assert trabajos.estado_trabajo(trabajo_id)['generados'] == 20
+
+
+@pytest.mark.parametrize('trabajo_id', ['../../etc/passwd', 'A' * 32, '0' * 31, None])
+def test_ids_invalidos(cola, salida, trabajo_id):
+    assert trabajos.estado_trabajo(trabajo_id, str(salida)) is None
+    assert trabajos.reanudar_trabajo(trabajo_id, 'ana', str(salida))[0] is None
+    assert not trabajos.cancelar_trabajo(trabajo_id, 'ana')
+    with pytest.raises(ValueError):
+        trabajos.ruta_entrada(trabajo_id, str(salida))
+
+
+def test_con_el_executor_real_el_trabajo_termina(entrada, salida, monkeypatch, cache):
+    monkeypatch.setattr(trabajos, '_trabajos', {})
+    trabajo_id, _mensaje = enviar('ana', entrada, salida)
+    limite = time.time() + 60
+    while trabajos.estado_trabajo(trabajo_id)['estado'] in trabajos.ESTADOS_ACTIVOS and time.time() < limite:
+        time.sleep(0.05)
+    assert trabajos.estado_trabajo(trabajo_id)['estado'] == 'terminado'